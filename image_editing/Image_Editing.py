@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, colorchooser
-from PIL import Image, ImageTk, ImageEnhance, ImageFilter, ImageDraw, ImageFont, ImageOps
+from PIL import Image, ImageTk, ImageDraw, ImageFont, ImageOps
 import cv2
 import numpy as np
 import os
@@ -8,6 +8,17 @@ from datetime import datetime
 import copy
 import threading
 import random
+import time
+
+from image_editing import (analysis, capture, derived, filter_chain, filters, frame_governor,
+                           frame_sources, presets, tracing, watermark)
+from image_editing.batch import save_edit
+from image_editing.history import EditHistory
+from image_editing.ingest import MemmapImageCache
+from image_editing.pipeline import EditPipeline, DEFAULT_ADJUSTMENTS, DEFAULT_FILTER_VALUES
+from image_editing.presets import PRESETS
+from image_editing.render_scheduler import RenderScheduler
+from image_editing.tone import enhance_image
 
 
 class ImageEditorApp:
@@ -36,27 +47,49 @@ class ImageEditorApp:
 
         self.image = None
         self.edited_image = None
-        self.undo_stack = []
+        # Lịch sử hoàn tác: lưu tham số, chỉ lưu ảnh cho thao tác phá hủy
+        self.history = EditHistory(max_bytes=256 * 1024 * 1024)
+        # Ảnh kết quả render đầy đủ gần nhất (tái tạo được từ tham số)
+        self.rendered_image = None
         self.webcam_capture = None
         self.webcam_active = False
         self.webcam_cap = None
+        # Nguồn khung của chế độ webcam: camera, file video, thư mục ảnh hoặc 'synthetic'
+        self.webcam_source_spec = frame_sources.default_spec()
+        self.webcam_source_size = frame_sources.default_size()
+        # Luồng đọc webcam và seq của khung đã hiển thị gần nhất
+        self.webcam_reader = None
+        self.webcam_seq = 0
+        # Bộ đệm và item canvas dùng lại giữa các khung webcam
+        self.webcam_buffers = capture.FrameBuffers()
+        self.webcam_item = None
+        # Điều tiết độ phân giải/kernel/tần suất lọc theo ngân sách thời gian mỗi khung
+        self.webcam_governor = frame_governor.FrameGovernor()
+        self.webcam_chain = None
+        self.webcam_status_time = 0.0
         self.captured_images_list = []
         self.original_canvas_state = None  # Lưu trạng thái canvas gốc
         self.current_filter = "Không"
         self.view_zoom = 1.0
-        self.filter_values_defaults = {
-            "Viền": 1.0,
-            "Làm Mờ": 2.0,
-            "Đen Trắng": 1.0,
-            "Chi Tiết": 1.0,
-            "Tăng Cạnh": 1.0,
-            "Làm Mịn": 1.0,
-            "Làm Nổi": 1.0,
-        }
+        self.filter_values_defaults = DEFAULT_FILTER_VALUES.copy()
         self.filter_values = self.filter_values_defaults.copy()
         self.adjustments = {}
         self.suspend_slider_commands = False
         self.current_operation = None
+        # Pipeline xử lý ảnh (không phụ thuộc Tk), cache kết quả từng công đoạn
+        # để kéo slider không phải chạy lại toàn bộ pipeline
+        self.pipeline = EditPipeline(cache_bytes=512 * 1024 * 1024)
+        self.image_cache = MemmapImageCache()
+        self.stage_cache = self.pipeline.stage_cache
+        # Chế độ render: "proxy" = render ảnh thu nhỏ khi kéo slider, "full" = luôn render đầy đủ
+        self.render_mode = "proxy"
+        # Cạnh dài tối đa của ảnh proxy (None = theo kích thước khung ảnh chỉnh sửa)
+        self.proxy_max_size = None
+        self.proxy_result = None
+        # Render khi kéo slider trên thread nền, chỉ giữ yêu cầu mới nhất
+        self.background_render = True
+        self.render_scheduler = RenderScheduler(root, self.render_job, self.apply_render_result,
+                                                on_error=self.on_render_error)
         
         # Tạo folder lưu ảnh
         self.webcam_folder = "captured_images"
@@ -178,7 +211,7 @@ class ImageEditorApp:
         self.color_slider = self.add_slider(basic_frame, "Màu Sắc", 0, 2, 1, self.adjust_color)
         self.contrast_slider = self.add_slider(basic_frame, "Độ Tương Phản", 0, 2, 1, self.adjust_contrast)
         self.sharpen_slider = self.add_slider(basic_frame, "Độ Sắc Nét", 0, 2, 1, self.adjust_sharpen)
-        self.blur_slider = self.add_slider(basic_frame, "Làm Mờ", 0, 5, 0, self.apply_blur)
+        self.blur_slider = self.add_slider(basic_frame, "Làm Mờ", 0, 50, 0, self.apply_blur)
         
         # Phần xoay ảnh với slider
         rotate_frame = tk.LabelFrame(self.tools_panel, text="Xoay Ảnh", 
@@ -227,6 +260,27 @@ class ImageEditorApp:
         self.zoom_slider.set(100)
         self.zoom_slider.pack(fill=tk.X)
         
+        # Xem trước độ phân giải thấp khi kéo slider
+        self.proxy_mode_var = tk.BooleanVar(value=self.render_mode == "proxy")
+        tk.Checkbutton(transform_frame, text="Xem trước nhanh khi kéo slider",
+                       variable=self.proxy_mode_var,
+                       command=self.on_render_mode_change,
+                       bg=self.colors['bg_panel'],
+                       fg=self.colors['text_light'],
+                       selectcolor=self.colors['bg_main'],
+                       activebackground=self.colors['bg_panel']).pack(anchor=tk.W, pady=(8, 2))
+        self.proxy_size_combo = ttk.Combobox(transform_frame,
+                                             values=["Theo khung ảnh", "1024", "2048", "4096"],
+                                             state="readonly", width=25)
+        self.proxy_size_combo.set("Theo khung ảnh")
+        self.proxy_size_combo.pack(pady=2)
+        self.proxy_size_combo.bind("<<ComboboxSelected>>", self.on_proxy_size_change)
+        self.render_latency_label = tk.Label(transform_frame, text="",
+                                             bg=self.colors['bg_panel'],
+                                             fg=self.colors['text_light'],
+                                             font=("Arial", 8))
+        self.render_latency_label.pack(pady=(2, 0))
+        
         # Phần bộ lọc
         filter_frame = tk.LabelFrame(self.tools_panel, text="Bộ Lọc", 
                                      font=("Arial", 11, "bold"),
@@ -236,44 +290,57 @@ class ImageEditorApp:
         filter_frame.pack(fill=tk.X, padx=15, pady=10)
         
         self.filter_combo = ttk.Combobox(filter_frame, 
-                                        values=["Không", "Đen Trắng", "Làm Mờ", "Viền", "Chi Tiết", "Tăng Cạnh", "Làm Mịn", "Làm Nổi"],
+                                        values=[filters.NO_FILTER] + list(filters.listed_filters()),
                                         state="readonly", width=25)
         self.filter_combo.set("Không")
         self.filter_combo.pack(pady=5)
         self.filter_combo.bind("<<ComboboxSelected>>", self.on_filter_change)
         
-        # Slider riêng cho từng bộ lọc - Tăng phạm vi để hiệu ứng rõ hơn
-        # Slider cho Viền (Contour)
-        self.contour_slider, self.contour_slider_frame = self.add_slider_with_frame(
-            filter_frame, "Viền (Đậm/Nhẹ)", 0.1, 5.0, 1.0, self.on_contour_change)
-        
-        # Slider cho Làm Mờ (Blur)
-        self.blur_filter_slider, self.blur_filter_slider_frame = self.add_slider_with_frame(
-            filter_frame, "Làm Mờ (Đậm/Nhẹ)", 0.5, 15.0, 2.0, self.on_blur_filter_change)
-        
-        # Slider cho Đen Trắng
-        self.bw_slider, self.bw_slider_frame = self.add_slider_with_frame(
-            filter_frame, "Đen Trắng (Đậm/Nhẹ)", 0.1, 1.0, 1.0, self.on_bw_change)
-        
-        # Slider cho Chi Tiết
-        self.detail_slider, self.detail_slider_frame = self.add_slider_with_frame(
-            filter_frame, "Chi Tiết (Đậm/Nhẹ)", 0.1, 5.0, 1.0, self.on_detail_change)
-        
-        # Slider cho Tăng Cạnh
-        self.edge_slider, self.edge_slider_frame = self.add_slider_with_frame(
-            filter_frame, "Tăng Cạnh (Đậm/Nhẹ)", 0.1, 5.0, 1.0, self.on_edge_change)
-        
-        # Slider cho Làm Mịn
-        self.smooth_slider, self.smooth_slider_frame = self.add_slider_with_frame(
-            filter_frame, "Làm Mịn (Đậm/Nhẹ)", 0.1, 5.0, 1.0, self.on_smooth_change)
-        
-        # Slider cho Làm Nổi
-        self.emboss_slider, self.emboss_slider_frame = self.add_slider_with_frame(
-            filter_frame, "Làm Nổi (Đậm/Nhẹ)", 0.1, 5.0, 1.0, self.on_emboss_change)
+        # Slider riêng cho từng bộ lọc trong registry: tên -> (slider, frame)
+        self.filter_sliders = {}
+        for name, spec in filters.listed_filters().items():
+            low, high = spec.intensity_range
+            self.filter_sliders[name] = self.add_slider_with_frame(
+                filter_frame, f"{name} (Đậm/Nhẹ)", low, high, spec.default_intensity,
+                lambda value, name=name: self.on_filter_value_change(name, value))
         
         # Ẩn các slider ban đầu, chỉ hiện khi chọn bộ lọc tương ứng
         self.hide_filter_sliders()
         
+        # Chuỗi bộ lọc áp dụng sau bộ lọc đang chọn
+        stack_frame = tk.LabelFrame(self.tools_panel, text="Chuỗi Bộ Lọc", 
+                                    font=("Arial", 11, "bold"),
+                                    bg=self.colors['bg_panel'], 
+                                    fg=self.colors['text_light'],
+                                    padx=10, pady=10)
+        stack_frame.pack(fill=tk.X, padx=15, pady=10)
+        
+        self.stack_listbox = tk.Listbox(stack_frame, height=5,
+                                        bg=self.colors['bg_main'], fg=self.colors['text_light'],
+                                        selectbackground=self.colors['bg_button'],
+                                        highlightthickness=0)
+        self.stack_listbox.pack(fill=tk.X, pady=5)
+        
+        # Chỉ các bộ lọc có cường độ là một số mới chỉnh được bằng slider
+        self.stack_filter_combo = ttk.Combobox(
+            stack_frame, state="readonly", width=25,
+            values=[name for name, spec in filters.FILTERS.items() if spec.intensity_range])
+        self.stack_filter_combo.set("Độ Sáng")
+        self.stack_filter_combo.pack(pady=5)
+        self.stack_filter_combo.bind("<<ComboboxSelected>>", self.on_stack_filter_select)
+        self.stack_intensity_slider, _ = self.add_slider_with_frame(
+            stack_frame, "Cường độ", 0.1, 3.0, 1.0, None)
+        self.on_stack_filter_select()
+        
+        stack_buttons = tk.Frame(stack_frame, bg=self.colors['bg_panel'])
+        stack_buttons.pack(fill=tk.X, pady=5)
+        for text, command in (("Thêm", self.add_stack_filter), ("Xóa", self.remove_stack_filter),
+                              ("Lên", lambda: self.move_stack_filter(-1)),
+                              ("Xuống", lambda: self.move_stack_filter(1)),
+                              ("Xóa Hết", self.clear_stack_filters)):
+            tk.Button(stack_buttons, text=text, bg=self.colors['bg_secondary'], fg='white',
+                      command=command, padx=4).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=1)
+        
         # ========== PHẦN TÍNH NĂNG NÂNG CAO ==========
         # Phần tính năng nâng cao
         advanced_frame = tk.LabelFrame(self.tools_panel, text="Tính Năng Nâng Cao", 
@@ -312,6 +379,9 @@ class ImageEditorApp:
         tk.Button(action_frame, text="Lưu Nhanh", 
                  bg=self.colors['bg_button'], fg='white',
                  command=self.quick_save_image, **btn_style).pack(fill=tk.X, pady=3)
+        tk.Button(action_frame, text="Lưu Thông Số Chỉnh Sửa", 
+                 bg=self.colors['bg_button'], fg='white',
+                 command=self.save_edit_settings, **btn_style).pack(fill=tk.X, pady=3)
         tk.Button(action_frame, text="Hoàn Tác", 
                  bg=self.colors['warning'], fg='white',
                  command=self.undo_last_change, **btn_style).pack(fill=tk.X, pady=3)
@@ -387,10 +457,11 @@ class ImageEditorApp:
         
         # Tạo khung webcam lớn (sẽ hiện khi mở webcam)
         self.webcam_frame = tk.Frame(self.img_display_frame, bg=self.colors['bg_panel'], relief=tk.RAISED, bd=2)
-        tk.Label(self.webcam_frame, text="📷 Webcam", 
+        self.webcam_title_label = tk.Label(self.webcam_frame, text="📷 Webcam", 
                 font=("Arial", 16, "bold"), 
                 bg=self.colors['bg_panel'], 
-                fg=self.colors['text_light']).pack(pady=10)
+                fg=self.colors['text_light'])
+        self.webcam_title_label.pack(pady=10)
         
         # Container chính chia làm 2 bên
         self.webcam_main_container = tk.Frame(self.webcam_frame, bg=self.colors['bg_panel'])
@@ -473,6 +544,13 @@ class ImageEditorApp:
         # Ẩn gallery webcam ban đầu
         self.webcam_gallery_frame.pack_forget()
         
+        # Thiết lập xử lý hiện tại và FPS của webcam - dưới canvas
+        self.webcam_status_label = tk.Label(self.webcam_left_frame, text="",
+                                            font=("Arial", 9),
+                                            bg=self.colors['bg_panel'],
+                                            fg=self.colors['text_light'])
+        self.webcam_status_label.pack(side=tk.BOTTOM, fill=tk.X, padx=5)
+        
         # Canvas webcam lớn - bên trái (giảm padding để mở rộng)
         self.webcam_canvas = tk.Canvas(self.webcam_left_frame, 
                                       bg='#1A1A1A', highlightthickness=0)
@@ -492,157 +570,38 @@ class ImageEditorApp:
     
     def apply_filter_contour_optimized(self, img_array, intensity):
         """Bộ lọc viền tối ưu sử dụng OpenCV"""
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
-        
-        # Sử dụng Canny edge detection với threshold động
-        low_threshold = max(1, int(50 * (1 / intensity)))
-        high_threshold = max(2, int(150 * (1 / intensity)))
-        edges = cv2.Canny(gray, low_threshold, high_threshold)
-        
-        # Chuyển đổi edges thành RGB
-        if len(img_array.shape) == 3:
-            edges_rgb = cv2.cvtColor(edges, cv2.COLOR_GRAY2RGB)
-        else:
-            edges_rgb = edges
-        
-        # Blend với ảnh gốc
-        blend_ratio = min(1.0, intensity / 3.0)
-        result = cv2.addWeighted(img_array, 1 - blend_ratio, edges_rgb, blend_ratio, 0)
-        return result
+        return filters.apply_filter_contour_optimized(img_array, intensity)
     
     def apply_filter_blur_optimized(self, img_array, intensity):
-        """Bộ lọc làm mờ tối ưu sử dụng OpenCV GaussianBlur"""
-        kernel_size = int(intensity * 2) * 2 + 1  # Đảm bảo số lẻ
-        kernel_size = max(3, min(kernel_size, 31))  # Giới hạn từ 3 đến 31
-        return cv2.GaussianBlur(img_array, (kernel_size, kernel_size), 0)
+        """Bộ lọc làm mờ, chi phí không tăng theo cường độ"""
+        return filters.apply_filter_blur_optimized(img_array, intensity)
     
     def apply_filter_bw_optimized(self, img_array, intensity):
         """Bộ lọc đen trắng tối ưu"""
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            gray_rgb = cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
-        else:
-            gray_rgb = img_array
-        
-        # Blend với ảnh gốc
-        result = cv2.addWeighted(img_array, 1 - intensity, gray_rgb, intensity, 0)
-        return result
+        return filters.apply_filter_bw_optimized(img_array, intensity)
     
     def apply_filter_detail_optimized(self, img_array, intensity):
         """Bộ lọc chi tiết tối ưu sử dụng Unsharp Masking"""
-        # Chuyển sang grayscale để tính toán
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
-        
-        # Tạo unsharp mask với sigma động
-        sigma = max(0.5, intensity * 1.5)
-        kernel_size = int(sigma * 4) * 2 + 1  # Đảm bảo số lẻ
-        kernel_size = max(3, min(kernel_size, 21))  # Giới hạn từ 3 đến 21
-        blurred = cv2.GaussianBlur(gray, (kernel_size, kernel_size), sigma)
-        
-        # Unsharp masking
-        unsharp_mask = cv2.addWeighted(gray, 1.0 + intensity * 0.5, blurred, -intensity * 0.5, 0)
-        unsharp_mask = np.clip(unsharp_mask, 0, 255).astype(np.uint8)
-        
-        # Áp dụng cho từng kênh màu
-        if len(img_array.shape) == 3:
-            result = img_array.copy().astype(np.float32)
-            gray_float = gray.astype(np.float32) + 1e-5  # Tránh chia cho 0
-            unsharp_float = unsharp_mask.astype(np.float32)
-            enhancement = unsharp_float / gray_float
-            
-            for i in range(3):
-                channel = img_array[:, :, i].astype(np.float32)
-                result[:, :, i] = np.clip(channel * enhancement, 0, 255)
-            return result.astype(np.uint8)
-        else:
-            return unsharp_mask
+        return filters.apply_filter_detail_optimized(img_array, intensity)
     
     def apply_filter_edge_enhance_optimized(self, img_array, intensity):
         """Bộ lọc tăng cạnh tối ưu sử dụng Laplacian"""
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
-        
-        # Laplacian edge detection
-        laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-        laplacian = np.absolute(laplacian)
-        laplacian = np.uint8(np.clip(laplacian, 0, 255))
-        
-        # Chuyển sang RGB
-        if len(img_array.shape) == 3:
-            laplacian_rgb = cv2.cvtColor(laplacian, cv2.COLOR_GRAY2RGB)
-        else:
-            laplacian_rgb = laplacian
-        
-        # Blend với ảnh gốc
-        blend_ratio = min(1.0, intensity / 3.0)
-        result = cv2.addWeighted(img_array, 1.0, laplacian_rgb, blend_ratio, 0)
-        return result
+        return filters.apply_filter_edge_enhance_optimized(img_array, intensity)
     
     def apply_filter_smooth_optimized(self, img_array, intensity):
         """Bộ lọc làm mịn tối ưu sử dụng Bilateral Filter"""
-        if len(img_array.shape) == 3:
-            d = int(intensity * 5)  # Diameter
-            d = max(1, min(d, 15))  # Giới hạn từ 1 đến 15
-            return cv2.bilateralFilter(img_array, d, 80, 80)
-        else:
-            return cv2.GaussianBlur(img_array, (5, 5), intensity)
+        return filters.apply_filter_smooth_optimized(img_array, intensity)
     
     def apply_filter_emboss_optimized(self, img_array, intensity):
         """Bộ lọc làm nổi tối ưu sử dụng Sobel operator - chỉ dùng Sobel x và Sobel y"""
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
-        
-        # Tính toán Sobel gradients theo cả hai hướng với ksize=5
-        sobel_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=5)  # Sobel x
-        sobel_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=5)  # Sobel y
-        
-        # Kết hợp gradients và chuyển về uint8
-        sobel_combined = np.sqrt(sobel_x**2 + sobel_y**2)
-        sobel_normalized = np.clip(sobel_combined, 0, 255).astype(np.uint8)
-        
-        # Chuyển sang RGB
-        if len(img_array.shape) == 3:
-            embossed_rgb = cv2.cvtColor(sobel_normalized, cv2.COLOR_GRAY2RGB)
-        else:
-            embossed_rgb = sobel_normalized
-        
-        # Blend với ảnh gốc theo intensity
-        blend_ratio = min(1.0, intensity / 3.0)
-        result = cv2.addWeighted(img_array, 1 - blend_ratio, embossed_rgb, blend_ratio, 0)
-        return result
+        return filters.apply_filter_emboss_optimized(img_array, intensity)
     
     def apply_filter_to_frame(self, frame_rgb):
-        """Áp dụng bộ lọc hiện tại lên frame webcam"""
-        intensity_lookup = lambda key, default=1.0: self.filter_values.get(key, default)
-
-        if self.current_filter == "Không":
-            return frame_rgb
-        elif self.current_filter == "Viền":
-            return self.apply_filter_contour_optimized(frame_rgb, intensity_lookup("Viền"))
-        elif self.current_filter == "Làm Mờ":
-            return self.apply_filter_blur_optimized(frame_rgb, intensity_lookup("Làm Mờ", 2.0))
-        elif self.current_filter == "Đen Trắng":
-            return self.apply_filter_bw_optimized(frame_rgb, intensity_lookup("Đen Trắng"))
-        elif self.current_filter == "Chi Tiết":
-            return self.apply_filter_detail_optimized(frame_rgb, intensity_lookup("Chi Tiết"))
-        elif self.current_filter == "Tăng Cạnh":
-            return self.apply_filter_edge_enhance_optimized(frame_rgb, intensity_lookup("Tăng Cạnh"))
-        elif self.current_filter == "Làm Mịn":
-            return self.apply_filter_smooth_optimized(frame_rgb, intensity_lookup("Làm Mịn"))
-        elif self.current_filter == "Làm Nổi":
-            return self.apply_filter_emboss_optimized(frame_rgb, intensity_lookup("Làm Nổi"))
-        else:
+        """Áp dụng bộ lọc hiện tại và chuỗi bộ lọc lên frame webcam"""
+        chain = filter_chain.build_chain(self.adjustments, self.filter_values)
+        if not chain:
             return frame_rgb
+        return filter_chain.apply_chain(frame_rgb, chain)
     
     def add_slider(self, parent, label, from_val, to_val, default, command):
         frame = tk.Frame(parent, bg=self.colors['bg_panel'])
@@ -697,14 +656,17 @@ class ImageEditorApp:
     
     def open_watermark_dialog(self):
         """Mở dialog thêm watermark"""
+        self.ensure_full_resolution()
         self.watermark_manager.open_watermark_dialog()
     
     def open_ai_assistant(self):
         """Mở AI assistant"""
+        self.ensure_full_resolution()
         self.ai_assistant.open_assistant_panel()
     
     def open_preset_panel(self):
         """Mở panel preset filters"""
+        self.ensure_full_resolution()
         self.preset_manager.open_preset_panel()
     
     # ========== CÁC PHƯƠNG THỨC CŨ ==========
@@ -714,8 +676,9 @@ class ImageEditorApp:
             filetypes=[("Image files", "*.jpg *.jpeg *.png *.bmp *.gif")])
         if file_path:
             try:
-                self.image = Image.open(file_path)
-                self.undo_stack = []
+                # Ảnh lớn chỉ giải mã một lần, các lần mở sau đọc từ cache memmap
+                self.image = self.image_cache.open_image(file_path)
+                self.history.clear()
                 self.reset_adjustments()
             except Exception as e:
                 messagebox.showerror("Lỗi", f"Không thể mở ảnh: {str(e)}")
@@ -727,9 +690,13 @@ class ImageEditorApp:
             return
         
         
-        self.webcam_cap = cv2.VideoCapture(0)
+        # realtime chỉ giãn nhịp file/thư mục ảnh/ảnh tổng hợp, camera tự giữ nhịp
+        self.webcam_cap = frame_sources.open_source(self.webcam_source_spec,
+                                                    self.webcam_source_size, realtime=True)
         
-        if not self.webcam_cap.isOpened():
+        if not self.webcam_cap.opened:
+            self.webcam_cap.release()
+            self.webcam_cap = None
             messagebox.showerror("Lỗi", "Không thể mở webcam!")
             return
         
@@ -738,6 +705,10 @@ class ImageEditorApp:
         
         # Đánh dấu webcam đang hoạt động
         self.webcam_active = True
+        if isinstance(self.webcam_cap, frame_sources.DeviceSource):
+            self.webcam_title_label.config(text="📷 Webcam")
+        else:
+            self.webcam_title_label.config(text=f"📷 Webcam ({self.webcam_cap.name})")
         
         # Ẩn hai frame ảnh gốc và chỉnh sửa
         self.original_frame.pack_forget()
@@ -782,48 +753,105 @@ class ImageEditorApp:
         # Pack container nút điều khiển - bên phải, dưới gallery, sát bên phải
         self.webcam_control_container.pack(fill=tk.X, pady=2, padx=(0, 0), anchor=tk.E)
         
+        # Đọc camera trên luồng nền; luồng giao diện chỉ lấy khung mới nhất
+        self.webcam_seq = 0
+        self.webcam_buffers = capture.FrameBuffers()
+        self.webcam_canvas.delete("all")
+        self.webcam_item = None
+        self.webcam_governor.reset()
+        self.webcam_chain = None
+        self.webcam_status_label.config(text="")
+        self.webcam_reader = capture.CaptureThread(self.webcam_cap).start()
+        
         # Bắt đầu cập nhật frame
         self.update_webcam_frame()
     
+    @tracing.traced('update_webcam_frame')
     def update_webcam_frame(self):
-        """Cập nhật frame webcam trên canvas lớn duy nhất - phóng to gấp đôi"""
-        if not self.webcam_active or self.webcam_cap is None:
+        """Hiển thị khung webcam mới nhất theo nhịp làm tươi màn hình (bỏ qua khung cũ)"""
+        if not self.webcam_active or self.webcam_reader is None:
             return
         
-        ret, frame = self.webcam_cap.read()
-        if ret:
-            # Chuyển BGR sang RGB
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Lưu frame hiện tại
-            self.webcam_capture = frame_rgb.copy()
-            
-            # Áp dụng bộ lọc nếu có
-            frame_display = self.apply_filter_to_frame(frame_rgb.copy())
-            
-            # Chuyển sang PIL Image
-            frame_pil = Image.fromarray(frame_display)
-            
-            # Cập nhật canvas webcam
-            self.webcam_canvas.update_idletasks()
-            canvas_width = self.webcam_canvas.winfo_width()
-            canvas_height = self.webcam_canvas.winfo_height()
-            
-            if canvas_width > 1 and canvas_height > 1:
-                # Phóng to gấp đôi - scale để fill toàn bộ canvas
-                scaled_frame = self.scale_image_to_canvas_fill(frame_pil, self.webcam_canvas)
-                frame_tk = ImageTk.PhotoImage(scaled_frame)
+        started = time.perf_counter()
+        ring = self.webcam_reader.ring
+        latest = ring.acquire_latest(self.webcam_seq)
+        if latest is None:
+            if self.webcam_reader.failed:
+                messagebox.showerror("Lỗi", "Không thể đọc từ webcam!")
+                self.close_webcam()
+                return
+            # Chưa có khung mới
+            self.root.after(capture.DISPLAY_INTERVAL_MS, self.update_webcam_frame)
+            return
+        
+        self.webcam_seq, frame = latest
+        buffers = self.webcam_buffers
+        allocations = buffers.allocations
+        try:
+            # Chuyển BGR sang RGB vào bộ đệm dùng lại, không giữ khung của vòng đệm
+            frame_rgb = capture.to_rgb(frame, buffers)
+        finally:
+            ring.release()
+        
+        # Frame hiện tại ở độ phân giải đầy đủ (capture_photo sao chép rồi lọc lại từ ảnh này)
+        self.webcam_capture = frame_rgb
+        
+        # Cập nhật canvas webcam
+        self.webcam_canvas.update_idletasks()
+        canvas_width = self.webcam_canvas.winfo_width()
+        canvas_height = self.webcam_canvas.winfo_height()
+        
+        governor = self.webcam_governor
+        chain = filter_chain.build_chain(self.adjustments, self.filter_values)
+        if chain != self.webcam_chain:
+            # Đổi bộ lọc: đo lại từ bậc chất lượng cao nhất
+            self.webcam_chain = chain
+            governor.reset()
+        
+        # Khi quá tải chỉ lọc một trong N khung, các khung khác giữ kết quả đang hiển thị
+        if canvas_width > 1 and canvas_height > 1 and governor.should_process():
+            # Cắt phần nhìn thấy và thu nhỏ về kích thước canvas trước, rồi chỉ lọc
+            # các pixel được hiển thị
+            size = (canvas_width, canvas_height)
+            chain = filter_chain.scale_kernels(chain, governor.kernel_scale)
+            frame_display = capture.render_frame(frame_rgb, canvas_width, canvas_height, chain,
+                                                 buffers, governor.scale)
+            with tracing.span('webcam/blit') as span:
+                # Chép pixel vào ảnh PIL và PhotoImage có sẵn thay vì tạo mới mỗi khung
+                frame_pil = buffers.get('pil', size, lambda: Image.new('RGB', size))
+                frame_pil.frombytes(np.ascontiguousarray(frame_display))
+                frame_tk = buffers.get('photo', size, lambda: ImageTk.PhotoImage('RGB', size))
+                frame_tk.paste(frame_pil)
                 
-                self.webcam_canvas.delete("all")
-                # Vẽ ảnh từ góc trên bên trái để fill toàn bộ canvas
-                self.webcam_canvas.create_image(0, 0, image=frame_tk, anchor=tk.NW)
+                if self.webcam_item is None:
+                    # Vẽ ảnh từ góc trên bên trái để fill toàn bộ canvas
+                    self.webcam_item = self.webcam_canvas.create_image(0, 0, image=frame_tk,
+                                                                       anchor=tk.NW)
+                elif self.webcam_canvas.image is not frame_tk:
+                    # Canvas đổi kích thước: gắn PhotoImage mới vào item cũ
+                    self.webcam_canvas.itemconfigure(self.webcam_item, image=frame_tk)
                 self.webcam_canvas.image = frame_tk  # Giữ reference
-            
-            # Lên lịch cập nhật tiếp theo
-            self.root.after(30, self.update_webcam_frame)
-        else:
-            messagebox.showerror("Lỗi", "Không thể đọc từ webcam!")
-            self.close_webcam()
+                buffers.frames += 1
+                span.set(allocations=buffers.allocations - allocations)
+            
+            governor.record((time.perf_counter() - started) * 1000)
+            governor.frame_shown()
+            if started - self.webcam_status_time >= 0.5:
+                self.webcam_status_time = started
+                self.webcam_status_label.config(text=governor.status_text())
+        
+        # Lên lịch lần tiếp theo, trừ thời gian đã xử lý khung này
+        elapsed_ms = int((time.perf_counter() - started) * 1000)
+        self.root.after(max(1, capture.DISPLAY_INTERVAL_MS - elapsed_ms), self.update_webcam_frame)
+    
+    def stop_webcam_capture(self):
+        """Dừng luồng đọc rồi giải phóng webcam"""
+        if self.webcam_reader is not None:
+            self.webcam_reader.stop()
+            self.webcam_reader = None
+        if self.webcam_cap is not None:
+            self.webcam_cap.release()
+            self.webcam_cap = None
     
     def capture_photo(self):
         """Chụp ảnh từ webcam và lưu vào folder (lưu cả ảnh gốc và ảnh đã áp dụng bộ lọc)"""
@@ -836,8 +864,9 @@ class ImageEditorApp:
             image_pil_original = Image.fromarray(self.webcam_capture)
             image_pil_original.save(filename_original)
             
-            # Lưu ảnh đã áp dụng bộ lọc (nếu có)
-            if self.current_filter != "Không":
+            # Lưu ảnh đã áp dụng bộ lọc và chuỗi bộ lọc (nếu có), cùng chuỗi với khung xem trực tiếp
+            chain = filter_chain.build_chain(self.adjustments, self.filter_values)
+            if chain:
                 frame_filtered = self.apply_filter_to_frame(self.webcam_capture.copy())
                 filename_filtered = f"{self.webcam_folder}/capture_filtered_{timestamp}.jpg"
                 image_pil_filtered = Image.fromarray(frame_filtered)
@@ -977,9 +1006,7 @@ class ImageEditorApp:
             
             # Thoát webcam mode (sẽ không khôi phục trạng thái cũ)
             self.webcam_active = False
-            if self.webcam_cap is not None:
-                self.webcam_cap.release()
-                self.webcam_cap = None
+            self.stop_webcam_capture()
             
             # Ẩn khung webcam lớn
             self.webcam_frame.pack_forget()
@@ -993,7 +1020,7 @@ class ImageEditorApp:
             
             # Đặt ảnh mới
             self.image = new_image
-            self.undo_stack = []
+            self.history.clear()
             self.original_canvas_state = None
             self.reset_adjustments()
         except Exception as e:
@@ -1007,9 +1034,7 @@ class ImageEditorApp:
         self.webcam_active = False
         
         # Giải phóng webcam
-        if self.webcam_cap is not None:
-            self.webcam_cap.release()
-            self.webcam_cap = None
+        self.stop_webcam_capture()
         
         # Ẩn khung webcam lớn và gallery webcam
         self.webcam_frame.pack_forget()
@@ -1032,10 +1057,13 @@ class ImageEditorApp:
             self.edited_canvas.delete("all")
         
         self.webcam_capture = None
+        self.webcam_buffers.clear()
         self.current_operation = None
 
+    @tracing.traced('save_image')
     def save_image(self):
         """Lưu ảnh với dialog chọn folder và tên file"""
+        self.ensure_full_resolution()
         if self.edited_image:
             # Chọn folder để lưu
             folder_path = filedialog.askdirectory(title="Chọn thư mục để lưu ảnh")
@@ -1085,7 +1113,8 @@ class ImageEditorApp:
                     file_path = os.path.join(folder_path, f"{filename}.{file_format}")
                     
                     try:
-                        self.edited_image.save(file_path)
+                        with tracing.span('save_image/write', format=file_format):
+                            self.edited_image.save(file_path)
                         messagebox.showinfo("Thành công", f"Ảnh đã được lưu thành công!\n{file_path}")
                         save_window.destroy()
                     except Exception as e:
@@ -1103,8 +1132,10 @@ class ImageEditorApp:
         else:
             messagebox.showwarning("Cảnh báo", "Không có ảnh để lưu!")
     
+    @tracing.traced('quick_save_image')
     def quick_save_image(self):
         """Lưu ảnh nhanh vào folder saved_images"""
+        self.ensure_full_resolution()
         if self.edited_image:
             try:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -1116,12 +1147,31 @@ class ImageEditorApp:
         else:
             messagebox.showwarning("Cảnh báo", "Không có ảnh để lưu!")
 
+    def save_edit_settings(self):
+        """Lưu thông số chỉnh sửa hiện tại ra file JSON để xử lý hàng loạt"""
+        if not self.adjustments:
+            messagebox.showwarning("Cảnh báo", "Chưa có thông số chỉnh sửa để lưu!")
+            return
+        path = filedialog.asksaveasfilename(title="Lưu thông số chỉnh sửa",
+                                            defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            save_edit(path, self.adjustments, self.filter_values)
+            messagebox.showinfo("Thành công",
+                                f"Đã lưu thông số vào:\n{path}\n\n"
+                                f"Dùng: python -m image_editing.batch <thư mục ảnh> -o <thư mục đích> --edit {os.path.basename(path)}")
+        except Exception as e:
+            messagebox.showerror("Lỗi", f"Không thể lưu thông số: {str(e)}")
+
     def reset_image(self):
         if self.image:
-            self.undo_stack = []
+            self.history.clear()
             self.reset_adjustments()
 
     def crop_image(self):
+        self.ensure_full_resolution()
         if not self.edited_image:
             messagebox.showwarning("Cảnh báo", "Vui lòng mở ảnh trước!")
             return
@@ -1232,6 +1282,7 @@ class ImageEditorApp:
         self.current_operation = None
 
     def resize_image(self):
+        self.ensure_full_resolution()
         if not self.edited_image:
             messagebox.showwarning("Cảnh báo", "Vui lòng mở ảnh trước!")
             return
@@ -1300,18 +1351,7 @@ class ImageEditorApp:
 
     def reset_adjustments(self):
         """Đặt lại tất cả tham số chỉnh sửa về mặc định và đồng bộ UI."""
-        self.adjustments = {
-            'brightness': 1.0,
-            'color': 1.0,
-            'contrast': 1.0,
-            'sharpen': 1.0,
-            'blur': 0.0,
-            'rotation': 0.0,
-            'flip_horizontal': False,
-            'flip_vertical': False,
-            'filter': "Không",
-            'crop_box': None,
-        }
+        self.adjustments = dict(DEFAULT_ADJUSTMENTS)
         self.filter_values = self.filter_values_defaults.copy()
         self.current_filter = "Không"
 
@@ -1323,15 +1363,10 @@ class ImageEditorApp:
             self.sharpen_slider.set(self.adjustments['sharpen'])
             self.blur_slider.set(self.adjustments['blur'])
             self.rotation_slider.set(self.adjustments['rotation'])
-            self.contour_slider.set(self.filter_values["Viền"])
-            self.blur_filter_slider.set(self.filter_values["Làm Mờ"])
-            self.bw_slider.set(self.filter_values["Đen Trắng"])
-            self.detail_slider.set(self.filter_values["Chi Tiết"])
-            self.edge_slider.set(self.filter_values["Tăng Cạnh"])
-            self.smooth_slider.set(self.filter_values["Làm Mịn"])
-            self.emboss_slider.set(self.filter_values["Làm Nổi"])
+            self.sync_filter_sliders()
             self.filter_combo.set("Không")
             self.hide_filter_sliders()
+            self.sync_stack_listbox()
             if hasattr(self, 'zoom_slider'):
                 self.zoom_slider.set(100)
             self.suspend_slider_commands = False
@@ -1355,6 +1390,8 @@ class ImageEditorApp:
     def commit_current_operation(self, event=None):
         """Kết thúc thao tác sau khi thả slider hoặc hoàn thành hành động."""
         self.current_operation = None
+        if self.image and (self.is_edited_proxy() or self.render_scheduler.is_busy()):
+            self.reapply_adjustments(full_resolution=True, background=True)
 
     def sync_sliders_with_adjustments(self):
         """Đưa slider về đúng trạng thái theo adjustments."""
@@ -1366,83 +1403,126 @@ class ImageEditorApp:
         self.blur_slider.set(self.adjustments['blur'])
         self.rotation_slider.set(self.adjustments['rotation'])
         self.filter_combo.set(self.adjustments['filter'])
-        self.contour_slider.set(self.filter_values["Viền"])
-        self.blur_filter_slider.set(self.filter_values["Làm Mờ"])
-        self.bw_slider.set(self.filter_values["Đen Trắng"])
-        self.detail_slider.set(self.filter_values["Chi Tiết"])
-        self.edge_slider.set(self.filter_values["Tăng Cạnh"])
-        self.smooth_slider.set(self.filter_values["Làm Mịn"])
-        self.emboss_slider.set(self.filter_values["Làm Nổi"])
+        self.sync_filter_sliders()
         self.current_filter = self.adjustments.get('filter', "Không")
         self.update_filter_slider_visibility()
+        self.sync_stack_listbox()
         if hasattr(self, 'zoom_slider'):
             self.zoom_slider.set(100)
         self.view_zoom = 1.0
         self.suspend_slider_commands = False
 
-    def reapply_adjustments(self):
+    @tracing.traced('reapply_adjustments')
+    def reapply_adjustments(self, full_resolution=False, background=None):
         """Áp dụng lại toàn bộ chỉnh sửa từ ảnh gốc để đảm bảo mượt mà."""
         if not self.image:
             return
 
-        result = self.image.copy()
         adj = self.adjustments
+        self.current_filter = adj['filter']
+
+        # Trong lúc kéo slider chỉ render ảnh proxy, bản đầy đủ được render khi thả chuột
+        interactive = self.current_operation is not None and not full_resolution
+        if background is None:
+            background = interactive
+        use_proxy = interactive and self.render_mode == "proxy"
+        job = {
+            'image': self.image,
+            'adjustments': copy.deepcopy(adj),
+            'filter_values': dict(self.filter_values),
+            'proxy_target': self.get_proxy_target_size() if use_proxy else None,
+        }
 
-        if adj['brightness'] != 1.0:
-            result = ImageEnhance.Brightness(result).enhance(adj['brightness'])
-        if adj['color'] != 1.0:
-            result = ImageEnhance.Color(result).enhance(adj['color'])
-        if adj['contrast'] != 1.0:
-            result = ImageEnhance.Contrast(result).enhance(adj['contrast'])
-        if adj['sharpen'] != 1.0:
-            result = ImageEnhance.Sharpness(result).enhance(adj['sharpen'])
-        if adj['blur'] > 0:
-            result = result.filter(ImageFilter.GaussianBlur(radius=adj['blur']))
-
-        filter_name = adj['filter']
-        self.current_filter = filter_name
-        if filter_name != "Không":
-            filter_intensity = self.filter_values.get(filter_name, 1.0)
-            img_array = np.array(result)
-            if filter_name == "Làm Mờ":
-                filtered_array = self.apply_filter_blur_optimized(img_array, filter_intensity)
-            elif filter_name == "Viền":
-                filtered_array = self.apply_filter_contour_optimized(img_array, filter_intensity)
-            elif filter_name == "Chi Tiết":
-                filtered_array = self.apply_filter_detail_optimized(img_array, filter_intensity)
-            elif filter_name == "Tăng Cạnh":
-                filtered_array = self.apply_filter_edge_enhance_optimized(img_array, filter_intensity)
-            elif filter_name == "Đen Trắng":
-                filtered_array = self.apply_filter_bw_optimized(img_array, filter_intensity)
-            elif filter_name == "Làm Mịn":
-                filtered_array = self.apply_filter_smooth_optimized(img_array, filter_intensity)
-            elif filter_name == "Làm Nổi":
-                filtered_array = self.apply_filter_emboss_optimized(img_array, filter_intensity)
-            else:
-                filtered_array = img_array
-            result = Image.fromarray(filtered_array)
+        if background and self.background_render:
+            self.render_scheduler.request(job)
+            return
+
+        self.render_scheduler.cancel()
+        self.apply_render_result(self.render_job(job))
+
+    @tracing.traced('render_job')
+    def render_job(self, job, is_cancelled=None):
+        """Render một bản chụp tham số; có thể chạy trên thread nền nên không gọi Tk"""
+        image = job['image']
+        if is_cancelled is not None and is_cancelled():
+            return None
+        self.stage_cache.bind_source(image)
+
+        target = job['proxy_target']
+        source = self.pipeline.make_proxy(image, target) if target else image
+        if source is image:
+            variant = ('full',)
+        else:
+            variant = ('proxy', source.size)
+        # Blur và kernel bộ lọc thu nhỏ theo proxy để bản xem trước giống bản đầy đủ
+        kernel_scale = source.size[0] / image.size[0]
+        result = self.pipeline.render_stages(source, job['adjustments'], job['filter_values'],
+                                             variant, is_cancelled, kernel_scale)
+        if result is None:
+            return None
+        # Ranh giới hiển thị: chỉ chuyển sang PIL một lần ở cuối pipeline
+        return self.pipeline.to_image(result), source is not image
+
+    def on_render_error(self, error):
+        """Báo lỗi render nền (luôn chạy trên main thread)"""
+        messagebox.showerror("Lỗi", f"Không thể render ảnh: {str(error)}")
+
+    @tracing.traced('apply_render_result')
+    def apply_render_result(self, render_result):
+        """Hiển thị kết quả render (luôn chạy trên main thread)"""
+        if render_result is None:
+            return
+        result, is_proxy = render_result
+        self.edited_image = result
+        self.proxy_result = result if is_proxy else None
+        self.rendered_image = None if is_proxy else result
+        self.update_images()
 
-        if adj['rotation'] != 0.0:
-            result = result.rotate(-adj['rotation'], expand=True, fillcolor='white')
+        stats = self.render_scheduler.latency_stats()
+        if stats and hasattr(self, 'render_latency_label'):
+            self.render_latency_label.config(
+                text=f"Độ trễ kéo slider: {stats[0]:.0f} ms (p95 {stats[1]:.0f} ms)")
 
-        if adj['flip_horizontal']:
-            result = result.transpose(Image.FLIP_LEFT_RIGHT)
-        if adj['flip_vertical']:
-            result = result.transpose(Image.FLIP_TOP_BOTTOM)
+    def is_edited_proxy(self):
+        """Ảnh đang hiển thị có phải là bản proxy độ phân giải thấp không"""
+        return self.proxy_result is not None and self.edited_image is self.proxy_result
 
-        crop_box = adj.get('crop_box')
-        if crop_box:
-            left_norm, top_norm, right_norm, bottom_norm = crop_box
-            left = max(0, min(int(result.width * left_norm), result.width - 1))
-            top = max(0, min(int(result.height * top_norm), result.height - 1))
-            right = max(left + 1, min(int(result.width * right_norm), result.width))
-            bottom = max(top + 1, min(int(result.height * bottom_norm), result.height))
-            if right - left >= 2 and bottom - top >= 2:
-                result = result.crop((left, top, right, bottom))
+    def ensure_full_resolution(self):
+        """Render lại bản đầy đủ nếu ảnh chỉnh sửa hiện tại chỉ là proxy"""
+        if self.image and (self.is_edited_proxy() or self.render_scheduler.is_busy()):
+            self.reapply_adjustments(full_resolution=True, background=False)
 
-        self.edited_image = result
-        self.update_images()
+    def get_proxy_target_size(self):
+        """Tính cạnh dài của ảnh proxy sao cho đủ nét khi hiển thị trên canvas"""
+        if self.proxy_max_size:
+            return int(self.proxy_max_size)
 
+        canvas_width = self.edited_canvas.winfo_width()
+        canvas_height = self.edited_canvas.winfo_height()
+        if canvas_width <= 1 or canvas_height <= 1:
+            canvas_width, canvas_height = 480, 360
+        target = max(canvas_width, canvas_height) * max(1.0, self.view_zoom)
+
+        # Vùng cắt nhỏ được phóng to khi hiển thị nên cần proxy lớn hơn tương ứng
+        crop_box = self.adjustments.get('crop_box')
+        if crop_box:
+            left_norm, top_norm, right_norm, bottom_norm = crop_box
+            crop_fraction = max(right_norm - left_norm, bottom_norm - top_norm, 0.05)
+            target /= crop_fraction
+        return int(target)
+
+    def on_render_mode_change(self):
+        """Bật/tắt chế độ render proxy khi kéo slider"""
+        self.render_mode = "proxy" if self.proxy_mode_var.get() else "full"
+        self.ensure_full_resolution()
+
+    def on_proxy_size_change(self, event=None):
+        """Thay đổi kích thước ảnh proxy"""
+        value = self.proxy_size_combo.get()
+        self.proxy_max_size = int(value) if value.isdigit() else None
+        self.pipeline.clear_proxy()
+
+    @tracing.traced('scale_image_to_canvas')
     def scale_image_to_canvas(self, image, canvas):
         """Scale ảnh để vừa với canvas, giữ tỷ lệ"""
         canvas.update_idletasks()  # Đảm bảo canvas đã được render
@@ -1464,6 +1544,7 @@ class ImageEditorApp:
         scaled_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
         return scaled_image
     
+    @tracing.traced('scale_image_to_canvas_fill')
     def scale_image_to_canvas_fill(self, image, canvas):
         """Scale ảnh để fill toàn bộ canvas, có thể crop để phóng to"""
         canvas.update_idletasks()  # Đảm bảo canvas đã được render
@@ -1502,6 +1583,7 @@ class ImageEditorApp:
                 # Delay một chút để canvas có thời gian resize
                 self.root.after(100, self.update_images)
 
+    @tracing.traced('update_images')
     def update_images(self):
         """Cập nhật hiển thị ảnh trên canvas"""
         # Không cập nhật nếu đang ở chế độ webcam
@@ -1623,13 +1705,8 @@ class ImageEditorApp:
 
     def hide_filter_sliders(self):
         """Ẩn tất cả slider bộ lọc"""
-        self.contour_slider_frame.pack_forget()
-        self.blur_filter_slider_frame.pack_forget()
-        self.bw_slider_frame.pack_forget()
-        self.detail_slider_frame.pack_forget()
-        self.edge_slider_frame.pack_forget()
-        self.smooth_slider_frame.pack_forget()
-        self.emboss_slider_frame.pack_forget()
+        for _, slider_frame in self.filter_sliders.values():
+            slider_frame.pack_forget()
     
     def show_filter_slider(self, slider_frame):
         """Hiện slider bộ lọc cụ thể"""
@@ -1638,22 +1715,16 @@ class ImageEditorApp:
     
     def update_filter_slider_visibility(self):
         """Hiển thị đúng slider dựa trên bộ lọc đang chọn"""
-        if self.current_filter == "Viền":
-            self.show_filter_slider(self.contour_slider_frame)
-        elif self.current_filter == "Làm Mờ":
-            self.show_filter_slider(self.blur_filter_slider_frame)
-        elif self.current_filter == "Đen Trắng":
-            self.show_filter_slider(self.bw_slider_frame)
-        elif self.current_filter == "Chi Tiết":
-            self.show_filter_slider(self.detail_slider_frame)
-        elif self.current_filter == "Tăng Cạnh":
-            self.show_filter_slider(self.edge_slider_frame)
-        elif self.current_filter == "Làm Mịn":
-            self.show_filter_slider(self.smooth_slider_frame)
-        elif self.current_filter == "Làm Nổi":
-            self.show_filter_slider(self.emboss_slider_frame)
+        slider = self.filter_sliders.get(self.current_filter)
+        if slider is not None:
+            self.show_filter_slider(slider[1])
         else:
             self.hide_filter_sliders()
+    
+    def sync_filter_sliders(self):
+        """Đưa slider cường độ của các bộ lọc về giá trị trong filter_values"""
+        for name, (slider, _) in self.filter_sliders.items():
+            slider.set(self.filter_values.get(name, filters.FILTERS[name].default_intensity))
         
     def on_filter_change(self, event=None):
         """Khi thay đổi bộ lọc"""
@@ -1671,144 +1742,88 @@ class ImageEditorApp:
         self.reapply_adjustments()
         self.current_operation = None
     
-    def on_contour_change(self, value=None):
-        """Khi thay đổi slider viền"""
-        new_value = float(value) if value is not None else float(self.contour_slider.get())
-        self.filter_values["Viền"] = new_value
-        if (self.current_filter != "Viền" or self.webcam_active or
+    def on_filter_value_change(self, filter_name, value=None):
+        """Khi thay đổi slider cường độ của một bộ lọc"""
+        slider = self.filter_sliders[filter_name][0]
+        new_value = float(value) if value is not None else float(slider.get())
+        self.filter_values[filter_name] = new_value
+        if (self.current_filter != filter_name or self.webcam_active or
                 self.suspend_slider_commands or not self.image):
             return
-        self.start_operation("filter_Viền")
+        self.start_operation(f"filter_{filter_name}")
         self.reapply_adjustments()
     
-    def on_blur_filter_change(self, value=None):
-        """Khi thay đổi slider làm mờ"""
-        new_value = float(value) if value is not None else float(self.blur_filter_slider.get())
-        self.filter_values["Làm Mờ"] = new_value
-        if (self.current_filter != "Làm Mờ" or self.webcam_active or
-                self.suspend_slider_commands or not self.image):
-            return
-        self.start_operation("filter_Làm Mờ")
-        self.reapply_adjustments()
+    # ========== CHUỖI BỘ LỌC ==========
     
-    def on_bw_change(self, value=None):
-        """Khi thay đổi slider đen trắng"""
-        new_value = float(value) if value is not None else float(self.bw_slider.get())
-        self.filter_values["Đen Trắng"] = new_value
-        if (self.current_filter != "Đen Trắng" or self.webcam_active or
-                self.suspend_slider_commands or not self.image):
+    def on_stack_filter_select(self, event=None):
+        """Đặt khoảng và giá trị slider cường độ theo bộ lọc sẽ thêm vào chuỗi"""
+        spec = filters.get_filter(self.stack_filter_combo.get())
+        if spec is None:
             return
-        self.start_operation("filter_Đen Trắng")
-        self.reapply_adjustments()
+        low, high = spec.intensity_range
+        self.stack_intensity_slider.config(from_=low, to=high)
+        self.stack_intensity_slider.set(spec.default_intensity)
+    
+    def sync_stack_listbox(self):
+        """Hiển thị adjustments['filter_stack'] trong danh sách"""
+        self.stack_listbox.delete(0, tk.END)
+        for name, intensity in self.adjustments.get('filter_stack', ()):
+            if isinstance(intensity, (tuple, list)):
+                label = ", ".join(f"{value:.2f}" for value in intensity)
+            else:
+                label = f"{intensity:.1f}"
+            self.stack_listbox.insert(tk.END, f"{name} ({label})")
     
-    def on_detail_change(self, value=None):
-        """Khi thay đổi slider chi tiết"""
-        new_value = float(value) if value is not None else float(self.detail_slider.get())
-        self.filter_values["Chi Tiết"] = new_value
-        if (self.current_filter != "Chi Tiết" or self.webcam_active or
-                self.suspend_slider_commands or not self.image):
-            return
-        self.start_operation("filter_Chi Tiết")
-        self.reapply_adjustments()
+    def set_filter_stack(self, stack, selected=None):
+        """Cập nhật chuỗi bộ lọc (lưu hoàn tác) rồi render lại"""
+        self.save_state_for_undo()
+        self.adjustments['filter_stack'] = tuple(stack)
+        self.current_operation = None
+        self.sync_stack_listbox()
+        if selected is not None:
+            self.stack_listbox.selection_set(selected)
+        if self.image:
+            self.reapply_adjustments()
     
-    def on_edge_change(self, value=None):
-        """Khi thay đổi slider tăng cạnh"""
-        new_value = float(value) if value is not None else float(self.edge_slider.get())
-        self.filter_values["Tăng Cạnh"] = new_value
-        if (self.current_filter != "Tăng Cạnh" or self.webcam_active or
-                self.suspend_slider_commands or not self.image):
-            return
-        self.start_operation("filter_Tăng Cạnh")
-        self.reapply_adjustments()
+    def selected_stack_index(self):
+        selection = self.stack_listbox.curselection()
+        return selection[0] if selection else None
     
-    def on_smooth_change(self, value=None):
-        """Khi thay đổi slider làm mịn"""
-        new_value = float(value) if value is not None else float(self.smooth_slider.get())
-        self.filter_values["Làm Mịn"] = new_value
-        if (self.current_filter != "Làm Mịn" or self.webcam_active or
-                self.suspend_slider_commands or not self.image):
+    def add_stack_filter(self):
+        name = self.stack_filter_combo.get()
+        if filters.get_filter(name) is None:
             return
-        self.start_operation("filter_Làm Mịn")
-        self.reapply_adjustments()
+        stack = list(self.adjustments.get('filter_stack', ()))
+        stack.append((name, float(self.stack_intensity_slider.get())))
+        self.set_filter_stack(stack, len(stack) - 1)
     
-    def on_emboss_change(self, value=None):
-        """Khi thay đổi slider làm nổi"""
-        new_value = float(value) if value is not None else float(self.emboss_slider.get())
-        self.filter_values["Làm Nổi"] = new_value
-        if (self.current_filter != "Làm Nổi" or self.webcam_active or
-                self.suspend_slider_commands or not self.image):
+    def remove_stack_filter(self):
+        index = self.selected_stack_index()
+        if index is None:
             return
-        self.start_operation("filter_Làm Nổi")
-        self.reapply_adjustments()
+        stack = list(self.adjustments.get('filter_stack', ()))
+        del stack[index]
+        self.set_filter_stack(stack)
+    
+    def move_stack_filter(self, offset):
+        index = self.selected_stack_index()
+        stack = list(self.adjustments.get('filter_stack', ()))
+        if index is None or not 0 <= index + offset < len(stack):
+            return
+        stack[index], stack[index + offset] = stack[index + offset], stack[index]
+        self.set_filter_stack(stack, index + offset)
     
+    def clear_stack_filters(self):
+        if self.adjustments.get('filter_stack'):
+            self.set_filter_stack(())
+    
+    @tracing.traced('ai_auto_edit')
     def ai_auto_edit(self):
         """Tự động chỉnh sửa ảnh bằng AI - áp dụng nhiều cải tiến tự động thông minh"""
         if self.image:
             self.save_state_for_undo()
             
-            # Chuyển sang numpy array để xử lý
-            img_array = np.array(self.image)
-            original_img = self.image.copy()
-            
-            # 1. Tự động điều chỉnh độ sáng và độ tương phản (Auto Levels)
-            img_array = img_array.astype(np.float32)
-            
-            # Tính toán histogram để tự động điều chỉnh
-            if len(img_array.shape) == 3:
-                # Ảnh màu - xử lý từng kênh
-                for i in range(3):
-                    channel = img_array[:, :, i]
-                    # Auto contrast với percentile
-                    p2, p98 = np.percentile(channel, (2, 98))
-                    if p98 > p2:
-                        channel = np.clip((channel - p2) / (p98 - p2) * 255, 0, 255)
-                        img_array[:, :, i] = channel
-            else:
-                # Ảnh grayscale
-                p2, p98 = np.percentile(img_array, (2, 98))
-                if p98 > p2:
-                    img_array = np.clip((img_array - p2) / (p98 - p2) * 255, 0, 255)
-            
-            img_array = img_array.astype(np.uint8)
-            
-            # Chuyển lại sang PIL Image
-            self.edited_image = Image.fromarray(img_array)
-            
-            # 2. Tự động cân bằng màu sắc (Color Balance)
-            # Tính toán độ lệch màu và điều chỉnh
-            enhancer = ImageEnhance.Color(self.edited_image)
-            # Tự động tăng độ bão hòa nhẹ nếu ảnh có vẻ nhạt màu
-            self.edited_image = enhancer.enhance(1.15)
-            
-            # 3. Tăng độ sắc nét thông minh (Smart Sharpening)
-            enhancer = ImageEnhance.Sharpness(self.edited_image)
-            self.edited_image = enhancer.enhance(1.25)
-            
-            # 4. Tự động điều chỉnh độ tương phản (Auto Contrast)
-            enhancer = ImageEnhance.Contrast(self.edited_image)
-            self.edited_image = enhancer.enhance(1.12)
-            
-            # 5. Tự động điều chỉnh độ sáng (Auto Brightness)
-            # Tính toán độ sáng trung bình
-            gray = self.edited_image.convert('L')
-            brightness = np.array(gray).mean() / 255.0
-            
-            # Nếu ảnh quá tối (< 0.4) hoặc quá sáng (> 0.7), điều chỉnh
-            if brightness < 0.4:
-                enhancer = ImageEnhance.Brightness(self.edited_image)
-                self.edited_image = enhancer.enhance(1.2)
-            elif brightness > 0.7:
-                enhancer = ImageEnhance.Brightness(self.edited_image)
-                self.edited_image = enhancer.enhance(0.9)
-            
-            # 6. Giảm nhiễu nhẹ (Noise Reduction)
-            # Áp dụng làm mịn nhẹ để giảm nhiễu
-            temp_img = self.edited_image.filter(ImageFilter.SMOOTH_MORE)
-            self.edited_image = Image.blend(self.edited_image, temp_img, 0.2)
-            
-            # 7. Tăng cường chi tiết (Detail Enhancement)
-            detail_enhanced = self.edited_image.filter(ImageFilter.DETAIL)
-            self.edited_image = Image.blend(self.edited_image, detail_enhanced, 0.15)
+            self.edited_image = analysis.auto_edit(self.image)
             
             self.update_images()
             messagebox.showinfo("Hoàn thành", 
@@ -1823,28 +1838,29 @@ class ImageEditorApp:
             messagebox.showwarning("Cảnh báo", "Vui lòng mở ảnh trước!")
 
     def save_state_for_undo(self):
+        self.ensure_full_resolution()
         if self.edited_image:
-            state = {
-                'edited_image': self.edited_image.copy(),
-                'base_image': self.image.copy() if self.image else None,
-                'adjustments': copy.deepcopy(self.adjustments),
-                'filter_values': copy.deepcopy(self.filter_values),
-            }
-            self.undo_stack.append(state)
-            if len(self.undo_stack) > 20:
-                self.undo_stack.pop(0)
+            # Ảnh do pipeline render thì hoàn tác bằng cách render lại từ tham số;
+            # ảnh bị sửa trực tiếp (AI, preset, watermark...) mới cần lưu pixel
+            parametric = self.edited_image is self.rendered_image
+            self.history.push(self.image, self.adjustments, self.filter_values,
+                              None if parametric else self.edited_image)
 
     def undo_last_change(self):
-        if self.undo_stack:
-            state = self.undo_stack.pop()
+        self.render_scheduler.cancel()
+        state = self.history.pop()
+        if state:
             if state.get('base_image') is not None:
                 self.image = state['base_image']
             self.adjustments = state.get('adjustments', self.adjustments)
             self.filter_values = state.get('filter_values', self.filter_values_defaults.copy())
-            self.edited_image = state.get('edited_image', self.edited_image)
             self.sync_sliders_with_adjustments()
-            self.update_images()
             self.current_operation = None
+            if state.get('edited_image') is not None:
+                self.edited_image = state['edited_image']
+                self.update_images()
+            else:
+                self.reapply_adjustments(full_resolution=True, background=False)
         else:
             messagebox.showinfo("Thông tin", "Không có thao tác nào để hoàn tác!")
 
@@ -1858,124 +1874,7 @@ class PresetManager:
         self.parent = parent
         
         # Định nghĩa các preset
-        self.presets = {
-            'Vintage': {
-                'description': 'Hiệu ứng cổ điển với tone màu vàng nâu',
-                'brightness': 0.95,
-                'contrast': 1.1,
-                'saturation': 0.85,
-                'color': (1.0, 0.9, 0.8),  # RGB multipliers
-                'vignette': 0.3,
-                'grain': 0.1,
-                'sepia': 0.3
-            },
-            'Noir': {
-                'description': 'Ảnh đen trắng cổ điển film noir',
-                'brightness': 0.9,
-                'contrast': 1.3,
-                'saturation': 0.0,  # Black & white
-                'color': (1.0, 1.0, 1.0),
-                'vignette': 0.4,
-                'grain': 0.15,
-                'high_contrast': True
-            },
-            'Cinematic': {
-                'description': 'Hiệu ứng điện ảnh với màu xanh đặc trưng',
-                'brightness': 0.9,
-                'contrast': 1.25,
-                'saturation': 1.1,
-                'color': (0.9, 1.0, 1.2),  # Tăng blue, giảm red
-                'vignette': 0.25,
-                'blacks': 0.1,  # Tăng màu đen
-                'cinematic_lut': True
-            },
-            'Warm Sunshine': {
-                'description': 'Ánh nắng ấm áp vàng cam',
-                'brightness': 1.15,
-                'contrast': 1.1,
-                'saturation': 1.2,
-                'color': (1.3, 1.1, 0.9),  # Tăng đỏ và vàng
-                'vignette': 0.1,
-                'glow': 0.2
-            },
-            'Cool Blue': {
-                'description': 'Tone màu xanh mát lạnh',
-                'brightness': 1.05,
-                'contrast': 1.15,
-                'saturation': 0.95,
-                'color': (0.8, 0.9, 1.3),  # Tăng xanh dương
-                'vignette': 0.2,
-                'temperature': -20  # Lạnh hơn
-            },
-            'Retro 80s': {
-                'description': 'Phong cách những năm 80 với màu neon',
-                'brightness': 1.1,
-                'contrast': 1.3,
-                'saturation': 1.4,
-                'color': (1.2, 0.9, 1.3),  # Tăng hồng và xanh
-                'grain': 0.08,
-                'glitch': 0.05,
-                'vibrant': True
-            },
-            'Moody Dark': {
-                'description': 'Tâm trạng u tối với tone tối',
-                'brightness': 0.7,
-                'contrast': 1.4,
-                'saturation': 0.8,
-                'color': (0.9, 0.9, 1.0),
-                'vignette': 0.5,
-                'shadows': 0.3,
-                'moody': True
-            },
-            'Spring Bloom': {
-                'description': 'Mùa xuân với màu pastel và hoa',
-                'brightness': 1.2,
-                'contrast': 1.0,
-                'saturation': 1.3,
-                'color': (1.1, 1.3, 0.9),  # Tăng xanh lá
-                'vibrance': 0.3,
-                'bloom': 0.15
-            },
-            'Autumn Gold': {
-                'description': 'Mùa thu vàng rực',
-                'brightness': 1.05,
-                'contrast': 1.2,
-                'saturation': 1.25,
-                'color': (1.4, 1.1, 0.7),  # Vàng cam
-                'vignette': 0.15,
-                'warmth': 0.4
-            },
-            'Urban Grunge': {
-                'description': 'Hiệu ứng đô thị với tone xám và hạt',
-                'brightness': 0.85,
-                'contrast': 1.35,
-                'saturation': 0.7,
-                'color': (1.0, 0.95, 0.9),
-                'grain': 0.2,
-                'texture': 0.1,
-                'grunge': True
-            },
-            'Dreamy Soft': {
-                'description': 'Hiệu ứng mơ màng nhẹ nhàng',
-                'brightness': 1.1,
-                'contrast': 0.9,
-                'saturation': 0.8,
-                'color': (1.05, 1.0, 1.1),
-                'blur': 0.05,
-                'glow': 0.3,
-                'soft_focus': True
-            },
-            'HDR Pro': {
-                'description': 'HDR mạnh với chi tiết cao',
-                'brightness': 1.0,
-                'contrast': 1.5,
-                'saturation': 1.15,
-                'color': (1.0, 1.0, 1.0),
-                'clarity': 0.4,
-                'sharpen': 1.3,
-                'hdr': True
-            }
-        }
+        self.presets = PRESETS
         
     def open_preset_panel(self):
         """Mở panel chọn preset"""
@@ -2142,68 +2041,9 @@ class PresetManager:
     def apply_preset_effects(self, preset):
         """Áp dụng các hiệu ứng của preset"""
         try:
-            # Chuyển ảnh sang numpy array
-            img_array = np.array(self.parent.image)
-            
-            # 1. Điều chỉnh brightness, contrast, saturation
-            brightness = preset.get('brightness', 1.0)
-            contrast = preset.get('contrast', 1.0)
-            saturation = preset.get('saturation', 1.0)
-            
-            # Áp dụng bằng PIL
-            pil_image = self.parent.image.copy()
-            
-            if brightness != 1.0:
-                enhancer = ImageEnhance.Brightness(pil_image)
-                pil_image = enhancer.enhance(brightness)
-            
-            if contrast != 1.0:
-                enhancer = ImageEnhance.Contrast(pil_image)
-                pil_image = enhancer.enhance(contrast)
-            
-            if saturation != 1.0:
-                enhancer = ImageEnhance.Color(pil_image)
-                pil_image = enhancer.enhance(saturation)
-            
-            # Chuyển lại sang array
-            img_array = np.array(pil_image)
-            
-            # 2. Điều chỉnh màu sắc (color balance)
-            color_mult = preset.get('color', (1.0, 1.0, 1.0))
-            if len(img_array.shape) == 3:
-                img_array = img_array.astype(np.float32)
-                img_array[:, :, 0] = np.clip(img_array[:, :, 0] * color_mult[0], 0, 255)
-                img_array[:, :, 1] = np.clip(img_array[:, :, 1] * color_mult[1], 0, 255)
-                img_array[:, :, 2] = np.clip(img_array[:, :, 2] * color_mult[2], 0, 255)
-                img_array = img_array.astype(np.uint8)
-            
-            # 3. Vignette effect
-            vignette = preset.get('vignette', 0.0)
-            if vignette > 0 and len(img_array.shape) == 3:
-                img_array = self.apply_vignette(img_array, vignette)
-            
-            # 4. Grain effect
-            grain = preset.get('grain', 0.0)
-            if grain > 0:
-                img_array = self.apply_grain(img_array, grain)
-            
-            # 5. Sepia (cho vintage)
-            sepia = preset.get('sepia', 0.0)
-            if sepia > 0 and len(img_array.shape) == 3:
-                img_array = self.apply_sepia(img_array, sepia)
-            
-            # 6. Hiệu ứng đặc biệt theo preset
-            if preset.get('cinematic_lut', False):
-                img_array = self.apply_cinematic_lut(img_array)
-            
-            if preset.get('soft_focus', False):
-                img_array = self.apply_soft_focus(img_array)
-            
-            if preset.get('grunge', False):
-                img_array = self.apply_grunge_effect(img_array)
-            
-            if preset.get('hdr', False):
-                img_array = self.apply_hdr_effect(img_array)
+            pipeline = self.parent.pipeline
+            img_array = presets.apply_preset_effects(self.parent.image, preset, pipeline.workers,
+                                                     pipeline.processes)
             
             # Cập nhật ảnh
             self.parent.edited_image = Image.fromarray(img_array)
@@ -2215,134 +2055,31 @@ class PresetManager:
     
     def apply_vignette(self, img_array, strength=0.3):
         """Áp dụng hiệu ứng vignette (tối góc ảnh)"""
-        h, w = img_array.shape[:2]
-        
-        # Tạo mask vignette (ellipse)
-        X, Y = np.ogrid[:h, :w]
-        center_x, center_y = w // 2, h // 2
-        radius_x, radius_y = w / 2, h / 2
-        
-        # Tính khoảng cách từ mỗi pixel đến tâm
-        mask = ((X - center_y) / radius_y) ** 2 + ((Y - center_x) / radius_x) ** 2
-        mask = np.clip(1 - mask * strength, 0, 1)
-        
-        # Áp dụng mask cho từng channel
-        if len(img_array.shape) == 3:
-            mask = mask[:, :, np.newaxis]
-            result = (img_array.astype(np.float32) * mask).astype(np.uint8)
-        else:
-            result = (img_array.astype(np.float32) * mask).astype(np.uint8)
-        
-        return result
+        return presets.apply_vignette(img_array, strength)
     
     def apply_grain(self, img_array, strength=0.1):
         """Thêm grain/film noise"""
-        noise = np.random.randn(*img_array.shape) * 255 * strength
-        result = np.clip(img_array.astype(np.float32) + noise, 0, 255).astype(np.uint8)
-        return result
+        return presets.apply_grain(img_array, strength)
     
     def apply_sepia(self, img_array, strength=0.5):
         """Áp dụng hiệu ứng sepia"""
-        if len(img_array.shape) != 3:
-            return img_array
-        
-        # Sepia matrix
-        sepia_filter = np.array([
-            [0.393, 0.769, 0.189],
-            [0.349, 0.686, 0.168],
-            [0.272, 0.534, 0.131]
-        ])
-        
-        # Blend với ảnh gốc theo strength
-        sepia_result = img_array.dot(sepia_filter.T)
-        sepia_result = np.clip(sepia_result, 0, 255)
-        
-        result = (img_array * (1 - strength) + sepia_result * strength).astype(np.uint8)
-        return result
+        return presets.apply_sepia(img_array, strength)
     
     def apply_cinematic_lut(self, img_array):
         """Áp dụng LUT cinematic (teal & orange)"""
-        if len(img_array.shape) != 3:
-            return img_array
-        
-        # Tăng contrast và saturation
-        lab = cv2.cvtColor(img_array, cv2.COLOR_RGB2LAB)
-        l, a, b = cv2.split(lab)
-        
-        # Tăng contrast cho L channel
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        l = clahe.apply(l)
-        
-        # Điều chỉnh màu teal & orange
-        a = a.astype(np.float32)
-        b = b.astype(np.float32)
-        
-        # Tăng màu cam (giảm xanh dương, tăng vàng)
-        b = np.clip(b * 1.1, 0, 255)
-        a = np.clip(a * 0.9, 0, 255)
-        
-        lab = cv2.merge((l, a.astype(np.uint8), b.astype(np.uint8)))
-        result = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
-        
-        return result
+        return presets.apply_cinematic_lut(img_array)
     
     def apply_soft_focus(self, img_array):
         """Hiệu ứng soft focus/dreamy"""
-        if len(img_array.shape) != 3:
-            return img_array
-        
-        # Làm mờ nhẹ
-        blurred = cv2.GaussianBlur(img_array, (0, 0), 3)
-        
-        # Blend với ảnh gốc
-        alpha = 0.7
-        result = cv2.addWeighted(img_array, alpha, blurred, 1 - alpha, 0)
-        
-        return result
+        return presets.apply_soft_focus(img_array)
     
     def apply_grunge_effect(self, img_array):
         """Hiệu ứng urban grunge"""
-        if len(img_array.shape) != 3:
-            return img_array
-        
-        # Giảm saturation
-        hsv = cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV)
-        hsv[:, :, 1] = hsv[:, :, 1] * 0.7
-        
-        # Tăng contrast
-        lab = cv2.cvtColor(img_array, cv2.COLOR_RGB2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-        l = clahe.apply(l)
-        lab = cv2.merge((l, a, b))
-        
-        result = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
-        result = cv2.cvtColor(result, cv2.COLOR_RGB2HSV)
-        result = cv2.cvtColor(result, cv2.COLOR_HSV2RGB)
-        
-        return result
+        return presets.apply_grunge_effect(img_array)
     
     def apply_hdr_effect(self, img_array):
         """Hiệu ứng HDR mạnh"""
-        if len(img_array.shape) != 3:
-            return img_array
-        
-        # Tone mapping để tăng dynamic range
-        lab = cv2.cvtColor(img_array, cv2.COLOR_RGB2LAB)
-        l, a, b = cv2.split(lab)
-        
-        # CLAHE mạnh
-        clahe = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(8,8))
-        l = clahe.apply(l)
-        
-        # Tăng saturation
-        lab = cv2.merge((l, a, b))
-        result = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
-        
-        # Local contrast enhancement
-        result = cv2.detailEnhance(result, sigma_s=10, sigma_r=0.15)
-        
-        return result
+        return presets.apply_hdr_effect(img_array)
     
     def preview_preset(self, preset_name):
         """Xem trước preset trên ảnh nhỏ"""
@@ -2366,19 +2103,9 @@ class PresetManager:
         contrast = preset.get('contrast', 1.0)
         saturation = preset.get('saturation', 1.0)
         
-        pil_preview = Image.fromarray(img_array)
-        
-        if brightness != 1.0:
-            enhancer = ImageEnhance.Brightness(pil_preview)
-            pil_preview = enhancer.enhance(brightness)
-        
-        if contrast != 1.0:
-            enhancer = ImageEnhance.Contrast(pil_preview)
-            pil_preview = enhancer.enhance(contrast)
-        
-        if saturation != 1.0:
-            enhancer = ImageEnhance.Color(pil_preview)
-            pil_preview = enhancer.enhance(saturation)
+        pil_preview = enhance_image(Image.fromarray(img_array), [('brightness', brightness),
+                                                                  ('contrast', contrast),
+                                                                  ('color', saturation)])
         
         # Hiển thị preview popup
         preview_window = tk.Toplevel(self.parent.root)
@@ -2640,137 +2367,25 @@ class WatermarkManager:
     
     def apply_watermark(self, image, params):
         """Áp dụng watermark lên ảnh"""
-        if params['type'] == "text":
-            return self.apply_text_watermark(image, params)
-        else:
-            return self.apply_image_watermark(image, params)
+        if params['type'] != "text":
+            if not getattr(self, 'watermark_image_path', None):
+                return image
+            params = dict(params, image_path=self.watermark_image_path)
+        return watermark.apply_watermark(image, params)
     
     def apply_text_watermark(self, image, params):
         """Áp dụng text watermark"""
-        from PIL import ImageDraw, ImageFont
-        
-        # Tạo bản copy
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-        
-        overlay = Image.new('RGBA', image.size, (0,0,0,0))
-        draw = ImageDraw.Draw(overlay)
-        
-        # Tìm font
-        try:
-            font = ImageFont.truetype("arial.ttf", params['font_size'])
-        except:
-            try:
-                font = ImageFont.truetype("DejaVuSans.ttf", params['font_size'])
-            except:
-                font = ImageFont.load_default()
-        
-        # Tính toán text size
-        text_bbox = draw.textbbox((0, 0), params['text'], font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
-        
-        # Tính toán vị trí
-        positions = self.calculate_position(image.size, (text_width, text_height), params['position'])
-        
-        # Chuyển hex color sang RGBA với opacity
-        hex_color = params['color'].lstrip('#')
-        rgb = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-        rgba = rgb + (int(255 * params['opacity']),)
-        
-        # Vẽ text ở tất cả vị trí
-        for pos in positions:
-            draw.text(pos, params['text'], font=font, fill=rgba)
-        
-        # Composite với ảnh gốc
-        return Image.alpha_composite(image, overlay)
+        return watermark.apply_text_watermark(image, params)
     
     def apply_image_watermark(self, image, params):
         """Áp dụng image watermark"""
-        if not hasattr(self, 'watermark_image_path') or not self.watermark_image_path:
+        if not getattr(self, 'watermark_image_path', None):
             return image
-        
-        # Mở watermark image
-        watermark = Image.open(self.watermark_image_path)
-        
-        # Convert to RGBA nếu cần
-        if watermark.mode != 'RGBA':
-            watermark = watermark.convert('RGBA')
-        
-        # Scale watermark
-        scale = params.get('scale', 0.5)
-        new_width = int(image.width * scale)
-        new_height = int(image.height * scale)
-        watermark.thumbnail((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        # Apply opacity
-        if params.get('image_opacity', 1.0) < 1.0:
-            alpha = watermark.split()[3]
-            alpha = alpha.point(lambda p: p * params['image_opacity'])
-            watermark.putalpha(alpha)
-        
-        # Tính toán vị trí
-        positions = self.calculate_position(image.size, watermark.size, params['position'])
-        
-        # Tạo overlay
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-        
-        overlay = Image.new('RGBA', image.size, (0,0,0,0))
-        
-        # Paste watermark vào các vị trí
-        for pos in positions:
-            overlay.paste(watermark, pos, watermark)
-        
-        # Composite với ảnh gốc
-        return Image.alpha_composite(image, overlay)
+        return watermark.apply_image_watermark(image, dict(params, image_path=self.watermark_image_path))
     
     def calculate_position(self, image_size, watermark_size, position):
         """Tính toán vị trí đặt watermark"""
-        img_width, img_height = image_size
-        wm_width, wm_height = watermark_size
-        
-        positions = []
-        
-        if position == "top-right":
-            positions.append((img_width - wm_width - 10, 10))
-        elif position == "top-center":
-            positions.append(((img_width - wm_width) // 2, 10))
-        elif position == "top-left":
-            positions.append((10, 10))
-        elif position == "middle-left":
-            positions.append((10, (img_height - wm_height) // 2))
-        elif position == "center":
-            positions.append(((img_width - wm_width) // 2, 
-                            (img_height - wm_height) // 2))
-        elif position == "middle-right":
-            positions.append((img_width - wm_width - 10, 
-                            (img_height - wm_height) // 2))
-        elif position == "bottom-left":
-            positions.append((10, img_height - wm_height - 10))
-        elif position == "bottom-center":
-            positions.append(((img_width - wm_width) // 2, 
-                            img_height - wm_height - 10))
-        elif position == "bottom-right":
-            positions.append((img_width - wm_width - 10, 
-                            img_height - wm_height - 10))
-        elif position == "tiled":
-            # Tiled pattern
-            spacing_x = wm_width + 20
-            spacing_y = wm_height + 20
-            for x in range(0, img_width, spacing_x):
-                for y in range(0, img_height, spacing_y):
-                    positions.append((x, y))
-        elif position == "diagonal":
-            # Diagonal pattern
-            spacing = max(wm_width, wm_height) + 50
-            for i in range(0, max(img_width, img_height) * 2, spacing):
-                x = i - wm_width
-                y = i - wm_height
-                if x < img_width and y < img_height:
-                    positions.append((x, y))
-        
-        return positions
+        return watermark.calculate_position(image_size, watermark_size, position)
     
     def update_preview(self, image):
         """Cập nhật preview trên canvas"""
@@ -2810,13 +2425,8 @@ class AIAssistant:
     def load_ai_models(self):
         """Load các model AI (có thể là pretrained models)"""
         # Có thể load từ thư mục models/
-        try:
-            # Ví dụ: Face detection model
-            self.face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            )
-        except:
-            self.face_cascade = None
+        # Ví dụ: Face detection model
+        self.face_cascade = analysis.load_face_cascade()
     
     def open_assistant_panel(self):
         """Mở panel AI Assistant"""
@@ -2934,51 +2544,40 @@ class AIAssistant:
         thread = threading.Thread(target=self._perform_analysis)
         thread.start()
     
+    @tracing.traced('ai/perform_analysis')
     def _perform_analysis(self):
         """Thực hiện phân tích"""
         try:
-            # Chuyển sang numpy array
-            img_array = np.array(self.parent.edited_image)
+            stats = analysis.analyze_image(derived.array_of(self.parent.edited_image), self.face_cascade)
             
             # 1. Basic image stats
-            height, width = img_array.shape[:2]
-            channels = 3 if len(img_array.shape) == 3 else 1
-            image_mode = "Color" if channels == 3 else "Grayscale"
+            width, height = stats['width'], stats['height']
+            image_mode = "Color" if stats['channels'] == 3 else "Grayscale"
             
             # 2. Brightness analysis
-            if channels == 3:
-                gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            else:
-                gray = img_array
-            
-            brightness = np.mean(gray)
+            brightness = stats['brightness']
             brightness_status = "Tối" if brightness < 85 else "Sáng" if brightness > 170 else "Bình thường"
             
             # 3. Contrast analysis
-            contrast = np.std(gray)
+            contrast = stats['contrast']
             contrast_status = "Thấp" if contrast < 40 else "Cao" if contrast > 80 else "Tốt"
             
             # 4. Color analysis (nếu là ảnh màu)
-            if channels == 3:
-                # Tính độ bão hòa màu
-                hsv = cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV)
-                saturation = np.mean(hsv[:, :, 1])
+            saturation = stats['saturation']
+            if saturation is not None:
                 color_status = "Nhạt màu" if saturation < 50 else "Đậm màu" if saturation > 150 else "Cân bằng"
             else:
                 color_status = "Ảnh đen trắng"
             
             # 5. Face detection
-            face_count = 0
-            if self.face_cascade and channels == 3:
-                faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-                face_count = len(faces)
+            face_count = stats['face_count']
             
             # 6. Blur detection
-            blur_value = cv2.Laplacian(gray, cv2.CV_64F).var()
+            blur_value = stats['blur_value']
             blur_status = "Mờ" if blur_value < 100 else "Nét"
             
             # 7. Noise estimation
-            noise = np.std(cv2.blur(gray, (3, 3)) - gray)
+            noise = stats['noise']
             noise_status = "Nhiều nhiễu" if noise > 15 else "Ít nhiễu"
             
             # Hiển thị kết quả
@@ -3062,10 +2661,11 @@ class AIAssistant:
         thread = threading.Thread(target=self._generate_suggestions)
         thread.start()
     
+    @tracing.traced('ai/generate_suggestions')
     def _generate_suggestions(self):
         """Tạo đề xuất thông minh"""
         try:
-            img_array = np.array(self.parent.edited_image)
+            img_array = derived.array_of(self.parent.edited_image)
             
             # Phân loại ảnh đơn giản dựa trên màu sắc và histogram
             if len(img_array.shape) == 3:
@@ -3221,6 +2821,7 @@ class AIAssistant:
         thread = threading.Thread(target=self._perform_auto_enhance, args=(smart,))
         thread.start()
     
+    @tracing.traced('ai/perform_auto_enhance')
     def _perform_auto_enhance(self, smart=False):
         """Thực hiện auto enhance"""
         try:
@@ -3228,12 +2829,12 @@ class AIAssistant:
             
             if smart:
                 # Smart enhance dựa trên phân tích
-                img_array = np.array(self.parent.edited_image)
+                img_array = derived.array_of(self.parent.edited_image)
                 
                 # Adaptive enhancement based on image content
                 if len(img_array.shape) == 3:
-                    # Màu sắc
-                    hsv = cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV)
+                    # Màu sắc (HSV dùng chung với phân tích ảnh nên sao chép trước khi sửa)
+                    hsv = derived.hsv(img_array).copy()
                     
                     # Tăng saturation thông minh
                     saturation = np.mean(hsv[:, :, 1])
@@ -3250,8 +2851,7 @@ class AIAssistant:
                     img_array = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
                 
                 # Adaptive sharpening
-                gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY) if len(img_array.shape) == 3 else img_array
-                blur_value = cv2.Laplacian(gray, cv2.CV_64F).var()
+                blur_value = derived.laplacian(img_array).var()
                 
                 if blur_value < 150:
                     # Apply smart sharpening
@@ -0,0 +1,313 @@
+"""
+Xử lý hàng loạt: áp dụng một bộ chỉnh sửa đã lưu cho mọi ảnh trong thư mục
+
+Cách dùng:
+    python -m image_editing.batch INPUT -o OUTPUT_DIR --edit edit.json
+    python -m image_editing.batch "photos/*.jpg" -o out --preset Vintage --format webp
+
+INPUT là thư mục hoặc glob. File chỉnh sửa (JSON) có dạng
+{"adjustments": {...}, "filter_values": {...}, "preset": "Vintage"}, giống
+self.adjustments / self.filter_values của giao diện; mọi khóa đều tùy chọn.
+Ảnh đã có ở thư mục đích được bỏ qua nên chạy lại sau khi bị dừng giữa chừng
+sẽ tiếp tục từ chỗ cũ.
+
+Mặc định mỗi process xử lý trọn một ảnh. Với ít ảnh nhưng rất lớn, dùng
+--strip-processes N để xử lý lần lượt từng ảnh, chia dải của bộ lọc/preset trên
+N process qua shared memory (xem image_editing.process_pool).
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from PIL import Image
+
+from image_editing.ingest import IMAGE_EXTENSIONS
+from image_editing.pipeline import EditPipeline
+from image_editing.presets import PRESETS
+
+# Định dạng đầu ra hỗ trợ (theo phần mở rộng)
+OUTPUT_FORMATS = ('jpg', 'png', 'webp', 'tif', 'bmp')
+
+# Mỗi worker chỉ giữ một ảnh tại một thời điểm nên không cần cache công đoạn
+_WORKER_CACHE_BYTES = 0
+# Khởi động lại worker sau số ảnh này để giới hạn phân mảnh bộ nhớ
+_TASKS_PER_WORKER = 200
+
+_worker_state = {}
+
+
+# ========== FILE CHỈNH SỬA ==========
+
+def save_edit(path, adjustments=None, filter_values=None, preset=None):
+    """Lưu bộ chỉnh sửa ra file JSON để dùng cho xử lý hàng loạt"""
+    edit = {}
+    if adjustments:
+        edit['adjustments'] = dict(adjustments)
+    if filter_values:
+        edit['filter_values'] = dict(filter_values)
+    if preset:
+        edit['preset'] = preset
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(edit, f, ensure_ascii=False, indent=2)
+
+
+def load_edit(path):
+    """Đọc file chỉnh sửa, trả về (adjustments, filter_values, preset)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        edit = json.load(f)
+    adjustments = dict(edit.get('adjustments') or {})
+    # JSON không có tuple, nhưng tham số công đoạn phải hashable
+    if adjustments.get('crop_box') is not None:
+        adjustments['crop_box'] = tuple(adjustments['crop_box'])
+    if adjustments.get('filter_stack'):
+        adjustments['filter_stack'] = tuple(
+            (name, tuple(intensity) if isinstance(intensity, list) else intensity)
+            for name, intensity in adjustments['filter_stack'])
+    filter_values = dict(edit.get('filter_values') or {})
+    return adjustments, filter_values, edit.get('preset')
+
+
+# ========== DANH SÁCH FILE ==========
+
+def collect_inputs(pattern, recursive=False):
+    """Danh sách file ảnh từ một thư mục hoặc một glob, đã sắp xếp"""
+    if os.path.isdir(pattern):
+        if recursive:
+            pattern = os.path.join(pattern, '**', '*')
+        else:
+            pattern = os.path.join(pattern, '*')
+    paths = glob.glob(pattern, recursive=recursive)
+    return sorted(p for p in paths
+                  if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def common_root(paths):
+    """Thư mục cha chung của các file (gốc để giữ cấu trúc thư mục con khi INPUT là glob)"""
+    return os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+
+
+def output_path_for(input_path, input_root, output_dir, fmt):
+    """Đường dẫn file đích, giữ nguyên cấu trúc thư mục con so với input_root"""
+    relative = os.path.relpath(input_path, input_root) if input_root else os.path.basename(input_path)
+    stem, ext = os.path.splitext(relative)
+    if fmt:
+        ext = '.' + fmt
+    return os.path.join(output_dir, stem + ext)
+
+
+# ========== WORKER ==========
+
+def _init_worker(adjustments, filter_values, preset, quality):
+    # Ảnh scan rất lớn là hợp lệ trong xử lý hàng loạt
+    Image.MAX_IMAGE_PIXELS = None
+    pipeline = EditPipeline(cache_bytes=_WORKER_CACHE_BYTES)
+    # Song song theo ảnh giữa các process, không chia luồng trong mỗi ảnh
+    pipeline.workers = 1
+    _worker_state['pipeline'] = pipeline
+    _worker_state['edit'] = (adjustments, filter_values, preset)
+    _worker_state['quality'] = quality
+
+
+def _save_result(image, path, quality):
+    fmt = Image.registered_extensions().get(os.path.splitext(path)[1].lower())
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    params = {}
+    if fmt in ('JPEG', 'WEBP'):
+        params['quality'] = quality
+    elif fmt == 'PNG':
+        params['compress_level'] = 6
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Ghi ra file tạm rồi đổi tên để file đích luôn là ảnh hoàn chỉnh khi bị dừng đột ngột
+    temp_path = path + '.part'
+    image.save(temp_path, format=fmt, **params)
+    os.replace(temp_path, path)
+
+
+def process_one(task):
+    """Xử lý một ảnh trong worker, trả về (đường dẫn, số byte đầu vào, lỗi hoặc None)"""
+    input_path, output_path = task
+    try:
+        nbytes = os.path.getsize(input_path)
+        adjustments, filter_values, preset = _worker_state['edit']
+        with Image.open(input_path) as source:
+            source.load()
+            if preset is not None and source.mode != 'RGB':
+                # Các hiệu ứng preset chỉ hỗ trợ ảnh RGB
+                source = source.convert('RGB')
+            elif source.mode not in ('L', 'RGB', 'RGBA'):
+                source = source.convert('RGBA' if 'A' in source.getbands() else 'RGB')
+            result = _worker_state['pipeline'].render_image(source, adjustments,
+                                                            filter_values, preset)
+        _save_result(result, output_path, _worker_state['quality'])
+        return input_path, nbytes, None
+    except Exception as e:
+        return input_path, 0, str(e)
+
+
+# ========== CHẠY HÀNG LOẠT ==========
+
+class ProgressReporter:
+    """In tiến độ và thông lượng (ảnh/s, MB/s)"""
+
+    def __init__(self, total, stream=sys.stderr, interval=1.0):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.bytes_read = 0
+        self.started = time.perf_counter()
+        self.last_report = 0.0
+
+    def update(self, nbytes, error=None):
+        self.done += 1
+        self.bytes_read += nbytes
+        if error is not None:
+            self.failed += 1
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval or self.done == self.total:
+            self.last_report = now
+            self.report()
+
+    def rates(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return self.done / elapsed, self.bytes_read / elapsed / (1024 * 1024)
+
+    def report(self):
+        images_per_s, mb_per_s = self.rates()
+        self.stream.write(f"\r[{self.done}/{self.total}] {images_per_s:.1f} ảnh/s, "
+                          f"{mb_per_s:.1f} MB/s, lỗi: {self.failed}")
+        self.stream.flush()
+
+
+def run_batch(inputs, output_dir, adjustments=None, filter_values=None, preset=None,
+              fmt=None, quality=92, workers=None, input_root=None, overwrite=False,
+              reporter=None, strip_processes=0):
+    """Áp dụng bộ chỉnh sửa cho danh sách ảnh bằng process pool.
+
+    strip_processes > 0: xử lý lần lượt từng ảnh trong process này, chia dải
+    trên strip_processes process qua shared memory thay vì một ảnh mỗi process.
+    Trả về (số ảnh đã xử lý, số ảnh bỏ qua vì đã có, danh sách (đường dẫn, lỗi)).
+    ValueError nếu hai ảnh đầu vào cho cùng một file đích (vd. a.png và a.jpg với fmt).
+    """
+    if isinstance(preset, str):
+        preset = PRESETS[preset]
+
+    tasks = []
+    skipped = 0
+    sources = {}
+    for input_path in inputs:
+        output_path = output_path_for(input_path, input_root, output_dir, fmt)
+        key = os.path.normcase(os.path.abspath(output_path))
+        if key in sources:
+            # Không ghi đè lặng lẽ kết quả của ảnh khác
+            raise ValueError(f"{sources[key]} và {input_path} cùng ghi ra {output_path}")
+        sources[key] = input_path
+        if not overwrite and os.path.exists(output_path):
+            skipped += 1
+            continue
+        tasks.append((input_path, output_path))
+
+    if reporter is None:
+        reporter = ProgressReporter(len(tasks))
+    errors = []
+    if not tasks:
+        return 0, skipped, errors
+
+    if strip_processes:
+        _init_worker(adjustments or {}, filter_values or {}, preset, quality)
+        _worker_state['pipeline'].processes = strip_processes
+        for task in tasks:
+            input_path, nbytes, error = process_one(task)
+            if error is not None:
+                errors.append((input_path, error))
+            reporter.update(nbytes, error)
+        return len(tasks) - len(errors), skipped, errors
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    with Pool(workers, initializer=_init_worker,
+              initargs=(adjustments or {}, filter_values or {}, preset, quality),
+              maxtasksperchild=_TASKS_PER_WORKER) as pool:
+        for input_path, nbytes, error in pool.imap_unordered(process_one, tasks):
+            if error is not None:
+                errors.append((input_path, error))
+            reporter.update(nbytes, error)
+    return len(tasks) - len(errors), skipped, errors
+
+
+def _quality(value):
+    quality = int(value)
+    if not 1 <= quality <= 100:
+        raise argparse.ArgumentTypeError(f"phải trong khoảng 1-100: {value}")
+    return quality
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m image_editing.batch',
+        description="Áp dụng một bộ chỉnh sửa đã lưu cho nhiều ảnh")
+    parser.add_argument('input', help="Thư mục hoặc glob (vd. 'photos/*.jpg')")
+    parser.add_argument('-o', '--output', required=True, help="Thư mục lưu kết quả")
+    parser.add_argument('--edit', help="File JSON chứa adjustments/filter_values/preset")
+    parser.add_argument('--preset', choices=sorted(PRESETS), help="Preset áp dụng sau chỉnh sửa")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS,
+                        help="Định dạng đầu ra (mặc định giữ định dạng gốc)")
+    parser.add_argument('--quality', type=_quality, default=92, help="Chất lượng JPEG/WebP (1-100)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="Số process (mặc định bằng số nhân CPU)")
+    parser.add_argument('--strip-processes', type=int, default=0,
+                        help="Xử lý từng ảnh, chia dải trên số process này (cho ảnh rất lớn)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Duyệt cả thư mục con")
+    parser.add_argument('--overwrite', action='store_true',
+                        help="Xử lý lại cả ảnh đã có ở thư mục đích")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    adjustments, filter_values, preset = {}, {}, None
+    if args.edit:
+        adjustments, filter_values, preset = load_edit(args.edit)
+    if args.preset:
+        preset = args.preset
+    if preset is not None and isinstance(preset, str) and preset not in PRESETS:
+        print(f"Preset không tồn tại: {preset}", file=sys.stderr)
+        return 2
+
+    inputs = collect_inputs(args.input, args.recursive)
+    if not inputs:
+        print(f"Không tìm thấy ảnh nào: {args.input}", file=sys.stderr)
+        return 1
+    input_root = args.input if os.path.isdir(args.input) else common_root(inputs)
+
+    started = time.perf_counter()
+    try:
+        processed, skipped, errors = run_batch(
+            inputs, args.output, adjustments, filter_values, preset,
+            fmt=args.format, quality=args.quality, workers=args.workers,
+            input_root=input_root, overwrite=args.overwrite,
+            strip_processes=args.strip_processes)
+    except ValueError as e:
+        print(f"Trùng file đích: {e}", file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - started
+
+    print(file=sys.stderr)
+    print(f"Xong: {processed} ảnh trong {elapsed:.1f}s, bỏ qua {skipped} ảnh đã có, "
+          f"{len(errors)} lỗi", file=sys.stderr)
+    for path, error in errors:
+        print(f"  {path}: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
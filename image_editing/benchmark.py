@@ -0,0 +1,417 @@
+"""
+Benchmark các bộ lọc, preset, AI auto edit, phân tích ảnh và watermark (không cần giao diện)
+
+Cách dùng:
+    python -m image_editing.benchmark
+    python -m image_editing.benchmark --sizes 1,12 -k filter --repeat 3
+    python -m image_editing.benchmark --save-baseline bench.json
+    python -m image_editing.benchmark --baseline bench.json --threshold 0.2
+    python -m image_editing.benchmark --sizes "" --samples-dir "" --frame-source images/
+
+Đầu vào là các ảnh mẫu trong thư mục images/ và ảnh tổng hợp 1/12/24/50 MP.
+Đường xử lý khung của chế độ webcam (đọc → RGB → cắt/thu nhỏ → lọc) được đo
+từng khung trên một nguồn khung (mặc định ảnh tổng hợp tất định, xem
+frame_sources), nên đo được cả trên máy không có camera.
+Mỗi trường hợp báo cáo thời gian trung vị và p95, RSS đỉnh (tăng thêm so với
+trước khi chạy) và dung lượng cấp phát đỉnh (tracemalloc, gồm cả mảng numpy và
+OpenCV). Khi so với baseline, trường hợp chậm hơn hoặc cấp phát nhiều hơn quá
+ngưỡng được coi là hồi quy và lệnh trả về mã lỗi 1.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from image_editing import (analysis, blur, capture, derived, filter_chain, filters, frame_sources,
+                           presets, watermark)
+from image_editing.ingest import IMAGE_EXTENSIONS
+
+DEFAULT_SIZES = (1, 12, 24, 50)
+DEFAULT_SAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'images')
+DEFAULT_THRESHOLD = 0.15
+
+# Đường xử lý khung webcam: nguồn, độ phân giải nguồn, kích thước hiển thị, số khung đo
+DEFAULT_FRAME_SOURCE = 'synthetic'
+DEFAULT_FRAME_SIZE = (1280, 720)
+DEFAULT_DISPLAY_SIZE = (960, 540)
+DEFAULT_FRAMES = 30
+
+# Các chỉ số được so với baseline
+COMPARED_METRICS = ('median_ms', 'alloc_peak_mb')
+
+
+# ========== ẢNH ĐẦU VÀO ==========
+
+def synthetic_image(megapixels, seed=0):
+    """Ảnh RGB tỷ lệ 4:3 giống ảnh chụp: nền chuyển màu, các khối màu, nhiễu nhẹ"""
+    width = int(round((megapixels * 1e6 * 4 / 3) ** 0.5))
+    height = int(round(megapixels * 1e6 / width))
+    rng = np.random.default_rng(seed)
+
+    img_array = np.empty((height, width, 3), dtype=np.uint8)
+    img_array[:, :, 0] = np.linspace(30, 220, width, dtype=np.float32)[None, :]
+    img_array[:, :, 1] = np.linspace(200, 40, height, dtype=np.float32)[:, None]
+    img_array[:, :, 2] = 128
+    scale = max(width, height)
+    for _ in range(40):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        radius = int(rng.integers(scale // 100, scale // 8))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.circle(img_array, center, radius, color, -1)
+    # Nhiễu theo từng hàng để không cần mảng tạm cỡ cả ảnh
+    noise = rng.integers(0, 12, (1, width, 3), dtype=np.uint8)
+    for y in range(0, height, 256):
+        rows = img_array[y:y + 256]
+        cv2.add(rows, np.broadcast_to(np.roll(noise, y, axis=1), rows.shape), dst=rows)
+    return Image.fromarray(img_array)
+
+
+def sample_images(directory=DEFAULT_SAMPLES_DIR):
+    """Danh sách (tên, ảnh RGB) của các ảnh mẫu"""
+    result = []
+    if not os.path.isdir(directory):
+        return result
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        with Image.open(os.path.join(directory, name)) as image:
+            result.append((name, image.convert('RGB')))
+    return result
+
+
+def benchmark_inputs(sizes=DEFAULT_SIZES, samples_dir=DEFAULT_SAMPLES_DIR):
+    """Sinh (tên đầu vào, ảnh); ảnh tổng hợp được tạo lần lượt để chỉ giữ một ảnh lớn"""
+    if samples_dir:
+        for name, image in sample_images(samples_dir):
+            yield name, image
+    for megapixels in sizes:
+        yield f"synthetic-{megapixels}MP", synthetic_image(megapixels)
+
+
+# ========== CÁC TRƯỜNG HỢP ==========
+
+def _watermark_logo():
+    logo = Image.new('RGBA', (400, 200), (255, 255, 255, 0))
+    logo.paste((200, 30, 30, 255), (20, 20, 380, 180))
+    return logo
+
+
+def benchmark_cases():
+    """Danh sách (tên, hàm chuẩn bị) ; hàm chuẩn bị nhận ảnh PIL và trả về hàm không đối số"""
+    cases = []
+
+    for spec in filters.listed_filters().values():
+        def prepare(image, spec=spec):
+            img_array = np.array(image)
+            return lambda: spec.func(img_array, spec.default_intensity)
+        cases.append((f"filter/{spec.func.__name__}", prepare))
+
+    # Năm thao tác pointwise liên tiếp được gộp thành một lượt
+    pointwise_chain = (("Độ Sáng", 1.2), ("Tương Phản", 1.3), ("Đen Trắng", 0.5),
+                       ("Độ Bão Hòa", 1.1), ("Cân Bằng Màu", (1.05, 1.0, 0.95)))
+
+    def prepare_chain(image):
+        img_array = np.array(image)
+        return lambda: filter_chain.apply_chain(img_array, pointwise_chain, workers=1)
+    cases.append(("filter/chain-pointwise-x5", prepare_chain))
+
+    # Chi phí làm mờ không được tăng theo sigma
+    for sigma in (2, 8, 32, 64):
+        def prepare(image, sigma=sigma):
+            img_array = np.array(image)
+            return lambda: blur.gaussian_blur(img_array, sigma)
+        cases.append((f"blur/sigma-{sigma}", prepare))
+
+    for preset_name, preset in presets.PRESETS.items():
+        def prepare(image, preset=preset):
+            return lambda: presets.apply_preset_effects(image, preset)
+        cases.append((f"preset/{preset_name}", prepare))
+
+    cases.append(("ai/auto_edit", lambda image: lambda: analysis.auto_edit(image)))
+
+    face_cascade = analysis.load_face_cascade()
+
+    def prepare_analysis(image):
+        img_array = np.array(image)
+        return lambda: analysis.analyze_image(img_array, face_cascade)
+    cases.append(("ai/analyze_image", prepare_analysis))
+
+    text_params = {'type': "text", 'text': "© Image Editing", 'font_size': 48,
+                   'color': "#ffffff", 'opacity': 0.5}
+    logo = _watermark_logo()
+    image_params = {'type': "image", 'scale': 0.2, 'image_opacity': 0.6}
+    for position in ("bottom-right", "tiled"):
+        params = dict(text_params, position=position)
+        cases.append((f"watermark/text-{position}",
+                      lambda image, params=params:
+                      lambda: watermark.apply_text_watermark(image, params)))
+        params = dict(image_params, position=position)
+        cases.append((f"watermark/image-{position}",
+                      lambda image, params=params:
+                      lambda: watermark.apply_image_watermark(image, params, logo)))
+    return cases
+
+
+def frame_cases():
+    """Danh sách (tên, chuỗi bộ lọc) cho đường xử lý khung webcam"""
+    cases = [("frame/passthrough", ())]
+    for spec in filters.listed_filters().values():
+        cases.append((f"frame/{spec.func.__name__}", ((spec.name, spec.default_intensity),)))
+    return cases
+
+
+# ========== ĐO ==========
+
+def current_rss():
+    """RSS hiện tại (byte); None nếu hệ điều hành không hỗ trợ đọc"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class RssSampler:
+    """Lấy mẫu RSS trong một luồng nền để biết RSS đỉnh của một đoạn code"""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.baseline = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.baseline = current_rss()
+        self.peak = self.baseline
+        if self.baseline is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss()
+            if rss is not None and rss > self.peak:
+                self.peak = rss
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            rss = current_rss()
+            if rss is not None and rss > self.peak:
+                self.peak = rss
+
+    @property
+    def peak_delta(self):
+        if self.baseline is None:
+            return None
+        return self.peak - self.baseline
+
+
+def measure(func, repeat=5, warmup=1, clear_derived=True):
+    """Chạy func nhiều lần; trả về dict thời gian trung vị/p95 (ms), RSS và cấp phát đỉnh (MB).
+
+    clear_derived=False giữ cache biểu diễn suy ra giữa các lần chạy, như vòng
+    lặp webcam thật (mỗi lần là một khung mới trong cùng bộ đệm).
+    """
+    for _ in range(warmup):
+        func()
+
+    # Mỗi lần chạy bắt đầu với cache biểu diễn suy ra trống để đo chi phí thật
+    times = []
+    with RssSampler() as sampler:
+        for _ in range(repeat):
+            if clear_derived:
+                derived.clear()
+            started = time.perf_counter()
+            func()
+            times.append((time.perf_counter() - started) * 1000)
+
+    # Đo cấp phát ở một lần chạy riêng vì tracemalloc làm chậm cấp phát
+    if clear_derived:
+        derived.clear()
+    tracemalloc.start()
+    try:
+        func()
+        _, alloc_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    peak_rss = sampler.peak_delta
+    if peak_rss is None:
+        # Không đọc được RSS hiện tại: dùng RSS đỉnh của cả process
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {
+        'median_ms': float(np.median(times)),
+        'p95_ms': float(np.percentile(times, 95)),
+        'peak_rss_mb': peak_rss / (1024 * 1024),
+        'alloc_peak_mb': alloc_peak / (1024 * 1024),
+        'runs': repeat,
+    }
+
+
+def run_benchmarks(inputs, cases, repeat=5, pattern=None, stream=sys.stderr):
+    """Chạy mọi trường hợp trên mọi đầu vào; kết quả khóa theo 'tên trường hợp@tên đầu vào'"""
+    results = {}
+    for input_name, image in inputs:
+        for case_name, prepare in cases:
+            key = f"{case_name}@{input_name}"
+            if pattern and not fnmatch.fnmatch(key, f"*{pattern}*"):
+                continue
+            func = prepare(image)
+            results[key] = measure(func, repeat)
+            del func
+            if stream is not None:
+                stream.write(format_result(key, results[key]) + "\n")
+                stream.flush()
+    return results
+
+
+def run_frame_benchmarks(source_spec, size=DEFAULT_FRAME_SIZE, display_size=DEFAULT_DISPLAY_SIZE,
+                         frames=DEFAULT_FRAMES, pattern=None, stream=sys.stderr):
+    """Đo từng khung của đường xử lý webcam; mỗi trường hợp mở lại nguồn để bắt đầu từ cùng khung"""
+    results = {}
+    width, height = display_size
+    for case_name, chain in frame_cases():
+        source = frame_sources.open_source(source_spec, size)
+        try:
+            if not source.opened:
+                raise ValueError(f"Không mở được nguồn khung: {source_spec}")
+            key = f"{case_name}@{source.name}"
+            if pattern and not fnmatch.fnmatch(key, f"*{pattern}*"):
+                continue
+            buffers = capture.FrameBuffers()
+            frame = [None]
+
+            def step(source=source, chain=chain, buffers=buffers, frame=frame):
+                ok, frame[0] = source.read(frame[0])
+                if not ok:
+                    raise ValueError(f"Nguồn khung đã hết: {source_spec}")
+                capture.render_frame(capture.to_rgb(frame[0], buffers), width, height, chain,
+                                     buffers)
+
+            # Không xóa cache derived giữa các khung: khung cũ còn trong cache phải tự bị bỏ
+            results[key] = measure(step, frames, clear_derived=False)
+        finally:
+            source.release()
+        if stream is not None:
+            stream.write(format_result(key, results[key]) + "\n")
+            stream.flush()
+    return results
+
+
+def format_result(key, result):
+    return (f"{key:<55} median {result['median_ms']:9.1f} ms  p95 {result['p95_ms']:9.1f} ms  "
+            f"rss +{result['peak_rss_mb']:7.1f} MB  alloc {result['alloc_peak_mb']:7.1f} MB")
+
+
+# ========== BASELINE ==========
+
+def save_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'results': results}, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Danh sách (khóa, chỉ số, baseline, hiện tại) của các chỉ số tăng quá threshold"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in base:
+                continue
+            # Bỏ qua chênh lệch tuyệt đối rất nhỏ (nhiễu đo)
+            if result[metric] > base[metric] * (1 + threshold) and \
+                    result[metric] - base[metric] > 0.5:
+                regressions.append((key, metric, base[metric], result[metric]))
+    return regressions
+
+
+# ========== CLI ==========
+
+def parse_sizes(value):
+    if not value:
+        return ()
+    return tuple(float(v) if '.' in v else int(v) for v in value.split(','))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m image_editing.benchmark',
+        description="Benchmark bộ lọc, preset, AI và watermark")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Kích thước ảnh tổng hợp (MP), cách nhau bởi dấu phẩy; rỗng = không dùng")
+    parser.add_argument('--samples-dir', default=DEFAULT_SAMPLES_DIR,
+                        help="Thư mục ảnh mẫu (rỗng = không dùng)")
+    parser.add_argument('--frame-source', default=DEFAULT_FRAME_SOURCE,
+                        help="Nguồn khung cho đường xử lý webcam: chỉ số camera, file video, "
+                             "thư mục ảnh hoặc synthetic[:seed] (rỗng = không đo)")
+    parser.add_argument('--frame-size', default='x'.join(str(v) for v in DEFAULT_FRAME_SIZE),
+                        help="Độ phân giải khung của nguồn, ví dụ 1920x1080 (rỗng = gốc)")
+    parser.add_argument('--display-size', default='x'.join(str(v) for v in DEFAULT_DISPLAY_SIZE),
+                        help="Kích thước khung hiển thị webcam")
+    parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES,
+                        help="Số khung đo cho mỗi trường hợp webcam")
+    parser.add_argument('-k', '--filter', dest='pattern',
+                        help="Chỉ chạy trường hợp có khóa chứa chuỗi này (hỗ trợ * ?)")
+    parser.add_argument('--repeat', type=int, default=5, help="Số lần đo mỗi trường hợp")
+    parser.add_argument('-o', '--output', help="Lưu kết quả ra file JSON")
+    parser.add_argument('--baseline', help="File baseline JSON để so sánh")
+    parser.add_argument('--save-baseline', help="Lưu kết quả làm baseline mới")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Ngưỡng hồi quy (tỷ lệ, mặc định 0.15 = chậm hơn 15%%)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    Image.MAX_IMAGE_PIXELS = None
+
+    inputs = benchmark_inputs(parse_sizes(args.sizes), args.samples_dir)
+    results = run_benchmarks(inputs, benchmark_cases(), args.repeat, args.pattern)
+    if args.frame_source:
+        results.update(run_frame_benchmarks(args.frame_source,
+                                            frame_sources.parse_size(args.frame_size),
+                                            frame_sources.parse_size(args.display_size),
+                                            args.frames, args.pattern))
+    if not results:
+        print("Không có trường hợp nào được chạy", file=sys.stderr)
+        return 1
+
+    if args.output:
+        save_baseline(args.output, results)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+
+    if args.baseline:
+        regressions = compare(results, load_baseline(args.baseline), args.threshold)
+        for key, metric, before, after in regressions:
+            print(f"HỒI QUY {key} {metric}: {before:.1f} -> {after:.1f} "
+                  f"(+{(after / max(before, 1e-9) - 1) * 100:.0f}%)", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"Không có hồi quy (ngưỡng {args.threshold:.0%})", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
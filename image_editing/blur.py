@@ -0,0 +1,80 @@
+"""
+Gaussian blur có chi phí không phụ thuộc bán kính
+
+Kernel nhỏ (tới MAX_DIRECT_KERNEL) dùng cv2.GaussianBlur chính xác.
+Sigma lớn hơn được xấp xỉ bằng ba lượt box blur liên tiếp: cv2.blur dùng tổng
+trượt nên mỗi pixel tốn một phép cộng và một phép trừ cho mỗi lượt, bất kể độ
+rộng hộp. Độ rộng các hộp được chọn sao cho phương sai tổng bằng sigma² (Kovesi,
+"Fast almost-Gaussian filtering"). Mọi chỗ làm mờ trong pipeline, bộ lọc và
+preset đều đi qua module này.
+"""
+import math
+
+import cv2
+
+# Kernel lớn nhất còn dùng GaussianBlur trực tiếp (chi phí tăng theo kích thước
+# kernel). Box blur đã nhanh hơn từ khoảng 15 pixel, nhưng ngưỡng đặt ở 31 để các
+# kernel cố định của bộ lọc Chi Tiết (17-21) và soft focus (19) giữ kết quả chính xác
+MAX_DIRECT_KERNEL = 31
+
+# Số lượt box blur xấp xỉ Gaussian
+BOX_PASSES = 3
+
+
+def auto_kernel_size(sigma):
+    """Kích thước kernel cv2.GaussianBlur tự chọn cho ảnh 8 bit khi ksize=0"""
+    return int(round(sigma * 6 + 1)) | 1
+
+
+def kernel_sigma(ksize):
+    """Sigma cv2.GaussianBlur tự chọn khi chỉ cho ksize (sigma=0)"""
+    return 0.3 * ((ksize - 1) * 0.5 - 1) + 0.8
+
+
+def box_sizes(sigma, passes=BOX_PASSES):
+    """Độ rộng (lẻ) của các hộp có tổng phương sai gần bằng sigma²"""
+    ideal = math.sqrt(12 * sigma * sigma / passes + 1)
+    lower = int(math.floor(ideal))
+    if lower % 2 == 0:
+        lower -= 1
+    upper = lower + 2
+    # Số hộp dùng độ rộng nhỏ, phần còn lại dùng độ rộng lớn
+    small = int(round((12 * sigma * sigma - passes * lower * lower - 4 * passes * lower - 3 * passes)
+                      / (-4 * lower - 4)))
+    return [lower if i < small else upper for i in range(passes)]
+
+
+def _direct(sigma, ksize):
+    if not ksize:
+        ksize = auto_kernel_size(sigma)
+    return ksize <= MAX_DIRECT_KERNEL, ksize
+
+
+def gaussian_blur(img_array, sigma, ksize=0, out=None):
+    """Làm mờ Gaussian; ksize=0 để tự chọn theo sigma, sigma=0 để suy ra từ ksize.
+
+    Kết quả giống hệt cv2.GaussianBlur khi kernel không vượt MAX_DIRECT_KERNEL,
+    ngược lại là xấp xỉ bằng box blur xếp chồng. out (cùng shape/dtype, khác
+    img_array) nhận kết quả nếu được cho.
+    """
+    direct, ksize = _direct(sigma, ksize)
+    if direct:
+        return cv2.GaussianBlur(img_array, (ksize, ksize), sigma, dst=out)
+    if sigma <= 0:
+        sigma = kernel_sigma(ksize)
+    sizes = box_sizes(sigma)
+    result = cv2.blur(img_array, (sizes[0], sizes[0]), dst=out)
+    for size in sizes[1:]:
+        # cv2.blur xử lý tại chỗ được nên không cần thêm bộ đệm
+        cv2.blur(result, (size, size), dst=result)
+    return result
+
+
+def gaussian_halo(sigma, ksize=0):
+    """Bán kính lân cận (pixel) mà gaussian_blur đọc tới"""
+    direct, ksize = _direct(sigma, ksize)
+    if direct:
+        return ksize // 2
+    if sigma <= 0:
+        sigma = kernel_sigma(ksize)
+    return sum(size // 2 for size in box_sizes(sigma))
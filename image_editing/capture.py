@@ -0,0 +1,194 @@
+"""
+Luồng đọc camera riêng ghi vào vòng bộ đệm khung hình (bỏ khung cũ nhất)
+
+cap.read() chặn tới khi camera có khung mới nên không được gọi trên luồng giao
+diện. CaptureThread đọc liên tục vào một vòng nhỏ các khung cấp phát sẵn; phía
+hiển thị chỉ lấy khung mới nhất (FrameRing.acquire_latest) theo nhịp làm tươi màn
+hình, nên tốc độ đọc camera và độ trễ không phụ thuộc thời gian xử lý bộ lọc. Khung
+chưa kịp hiển thị bị ghi đè (đếm trong dropped).
+
+Nguồn khung là đối tượng có read(image=None) -> (ok, frame) và release(), ví dụ
+cv2.VideoCapture: khung được đọc thẳng vào bộ đệm của vòng khi kích thước khớp.
+
+Phía hiển thị giữ các bộ đệm của mình (ảnh RGB, ảnh đã thu nhỏ, ảnh PIL,
+PhotoImage) trong FrameBuffers; ở trạng thái ổn định không cấp phát gì thêm cho
+mỗi khung và số lần cấp phát được đếm để đo. to_rgb/render_frame là phần xử lý
+khung dùng chung cho giao diện webcam và benchmark.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from image_editing import derived, filter_chain, geometry, tracing
+
+# Số khung trong vòng: một đang ghi, một mới nhất, một đang được hiển thị
+DEFAULT_RING_SIZE = 3
+
+# Chu kỳ lấy khung của luồng giao diện (~60 Hz, nhịp làm tươi màn hình thông dụng)
+DISPLAY_INTERVAL_MS = 16
+
+
+class FrameRing:
+    """Vòng bộ đệm khung hình cho một luồng ghi và một luồng đọc"""
+
+    def __init__(self, size=DEFAULT_RING_SIZE):
+        self.size = max(3, size)
+        self.frames = [None] * self.size
+        self.seqs = [0] * self.size
+        self.latest = None
+        self.reading = None
+        self.seq = 0
+        # seq của khung được lấy ra hiển thị gần nhất
+        self.consumed = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def writable_slot(self):
+        """Ô cũ nhất không phải khung mới nhất và không đang được đọc"""
+        with self.lock:
+            slots = [i for i in range(self.size) if i != self.latest and i != self.reading]
+            slot = min(slots, key=lambda i: self.seqs[i])
+            return slot, self.frames[slot]
+
+    def publish(self, slot, frame):
+        """Đánh dấu ô vừa ghi xong là khung mới nhất"""
+        with self.lock:
+            if self.latest is not None and self.seqs[self.latest] > self.consumed:
+                # Khung mới nhất trước đó chưa được lấy ra hiển thị
+                self.dropped += 1
+            self.seq += 1
+            self.frames[slot] = frame
+            self.seqs[slot] = self.seq
+            self.latest = slot
+
+    def acquire_latest(self, after_seq=0):
+        """(seq, khung) mới nhất nếu mới hơn after_seq, ngược lại None.
+
+        Khung được giữ nguyên cho tới release() nên luồng ghi không ghi đè nó.
+        """
+        with self.lock:
+            if self.latest is None or self.seqs[self.latest] <= after_seq:
+                return None
+            self.reading = self.latest
+            self.consumed = self.seqs[self.reading]
+            return self.seqs[self.reading], self.frames[self.reading]
+
+    def release(self):
+        with self.lock:
+            self.reading = None
+
+
+class CaptureThread:
+    """Đọc khung từ nguồn trên luồng nền vào FrameRing"""
+
+    def __init__(self, source, ring_size=DEFAULT_RING_SIZE):
+        self.source = source
+        self.ring = FrameRing(ring_size)
+        self.failed = False
+        self.frames_read = 0
+        # Số lần nguồn trả về mảng mới thay vì đọc vào bộ đệm của vòng
+        self.allocations = 0
+        self.started = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='image_editing_capture',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def capture_fps(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return self.frames_read / elapsed if elapsed > 0 else 0.0
+
+    def _run(self):
+        while not self._stop.is_set():
+            slot, buffer = self.ring.writable_slot()
+            with tracing.span('capture/read'):
+                ok, frame = self.source.read(buffer) if buffer is not None else self.source.read()
+            if not ok or frame is None:
+                self.failed = True
+                break
+            self.frames_read += 1
+            if frame is not buffer:
+                self.allocations += 1
+            self.ring.publish(slot, frame)
+
+
+class FrameBuffers:
+    """Các đối tượng dùng lại giữa các khung, chỉ tạo lại khi khóa (kích thước) đổi"""
+
+    def __init__(self):
+        self.objects = {}
+        self.allocations = 0
+        self.frames = 0
+
+    def get(self, name, key, factory):
+        known = self.objects.get(name)
+        if known is None or known[0] != key:
+            known = self.objects[name] = (key, factory())
+            self.allocations += 1
+        return known[1]
+
+    def array(self, name, shape, dtype=np.uint8):
+        """Mảng dùng lại; người gọi ghi đè toàn bộ nội dung rồi gọi derived.invalidate"""
+        shape = tuple(shape)
+        buffer = self.get(name, (shape, np.dtype(dtype).str), lambda: np.empty(shape, dtype))
+        # Cùng bộ nhớ, cùng shape qua các khung: khóa của cache derived không đổi nên
+        # phải bỏ các biểu diễn (gray, Laplacian...) tính từ khung trước
+        derived.invalidate(buffer)
+        return buffer
+
+    def clear(self):
+        self.objects.clear()
+
+    def allocations_per_frame(self):
+        return self.allocations / self.frames if self.frames else 0.0
+
+
+# ========== XỬ LÝ KHUNG ==========
+
+def to_rgb(frame, buffers):
+    """Khung BGR của nguồn → RGB trong bộ đệm dùng lại"""
+    frame_rgb = buffers.array('rgb', frame.shape)
+    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame_rgb)
+    derived.invalidate(frame_rgb)
+    return frame_rgb
+
+
+def render_frame(frame_rgb, width, height, chain, buffers, scale=1.0):
+    """Phần nhìn thấy của khung ở kích thước hiển thị (width x height), đã qua chuỗi bộ lọc.
+
+    Cắt và thu nhỏ trước nên bộ lọc chỉ chạy trên các pixel được hiển thị.
+    scale < 1 lọc ở độ phân giải thấp hơn kích thước hiển thị rồi phóng lên.
+    """
+    channels = frame_rgb.shape[2:]
+    work_width = max(1, int(round(width * scale))) if scale < 1 else width
+    work_height = max(1, int(round(height * scale))) if scale < 1 else height
+    with tracing.span('webcam/scale'):
+        scaled = buffers.array('scaled', (work_height, work_width) + channels)
+        visible = geometry.resize_to_fill(frame_rgb, work_width, work_height, out=scaled)
+    if chain:
+        with tracing.span('webcam/filter', filter=chain[0][0], filters=len(chain)):
+            visible = filter_chain.apply_chain(visible, chain)
+    if (work_width, work_height) == (width, height):
+        return visible
+    with tracing.span('webcam/upscale'):
+        display = buffers.array('display', (height, width) + channels)
+        cv2.resize(visible, (width, height), dst=display, interpolation=cv2.INTER_LINEAR)
+        derived.invalidate(display)
+        return display
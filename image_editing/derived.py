@@ -0,0 +1,238 @@
+"""
+Cache các biểu diễn suy ra từ ảnh (gray, HSV, LAB, Laplacian) theo phiên bản ảnh
+
+Nhiều bộ lọc, preset và AI Assistant cùng cần ảnh xám, HSV, LAB hay Laplacian của
+cùng một ảnh (ví dụ khi đổi qua lại giữa các bộ lọc, ảnh đầu vào của công đoạn
+bộ lọc vẫn là một mảng lấy từ StageCache). Mỗi biểu diễn chỉ được tính khi có
+người cần và tối đa một lần cho mỗi phiên bản ảnh:
+
+    from image_editing import derived
+
+    gray = derived.gray(img_array)
+    hsv = derived.hsv(img_array)
+
+Khóa của một phiên bản gồm mảng sở hữu bộ nhớ (base), vị trí dữ liệu, shape,
+strides và số thế hệ của bộ nhớ đó, nên các view giống nhau (ví dụ cùng một dải
+khi chia dải) dùng chung kết quả. Khi bộ nhớ được ghi lại (bộ đệm của pool được
+dùng lại) người ghi gọi invalidate(); khi mảng sở hữu bị giải phóng các mục của
+nó tự bị xóa. Ảnh PIL được coi là không đổi (ứng dụng không sửa ảnh PIL tại chỗ).
+
+Kết quả trả về là mảng chỉ đọc dùng chung; cần sửa thì copy() trước.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+
+def _compute_gray(img_array, get):
+    if img_array.ndim == 2:
+        return img_array
+    return cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+
+
+def _compute_hsv(img_array, get):
+    return cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV)
+
+
+def _compute_lab(img_array, get):
+    return cv2.cvtColor(img_array, cv2.COLOR_RGB2LAB)
+
+
+def _compute_laplacian(img_array, get):
+    return cv2.Laplacian(get('gray'), cv2.CV_64F)
+
+
+# Tên biểu diễn -> hàm tính (ảnh, get); get(tên) lấy biểu diễn khác của cùng ảnh
+CONVERTERS = {
+    'gray': _compute_gray,
+    'hsv': _compute_hsv,
+    'lab': _compute_lab,
+    'laplacian': _compute_laplacian,
+}
+
+
+def _owner(img_array):
+    """Mảng numpy sở hữu bộ nhớ của img_array"""
+    owner = img_array
+    while isinstance(owner.base, np.ndarray):
+        owner = owner.base
+    return owner
+
+
+class _Entry:
+    """Các biểu diễn đã tính của một phiên bản ảnh"""
+
+    def __init__(self, owner_id):
+        self.owner_id = owner_id
+        self.values = {}
+        self.lock = threading.Lock()
+        self.nbytes = 0
+
+
+class DerivedCache:
+    """Cache LRU giới hạn dung lượng cho các biểu diễn suy ra"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        # id(mảng sở hữu) -> (weakref, thế hệ)
+        self.owners = {}
+        # Mảng sở hữu đã bị giải phóng; callback của weakref có thể chạy bất kỳ
+        # lúc nào (kể cả khi đang giữ khóa) nên chỉ ghi lại, dọn ở lần gọi sau
+        self.dead_owners = []
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def _collect_dead(self):
+        while self.dead_owners:
+            owner_id, ref = self.dead_owners.pop()
+            known = self.owners.get(owner_id)
+            if known is not None and known[0] is ref:
+                del self.owners[owner_id]
+                self._drop_entries(owner_id)
+
+    def _drop_entries(self, owner_id):
+        for key in [key for key, entry in self.entries.items() if entry.owner_id == owner_id]:
+            self.total_bytes -= self.entries.pop(key).nbytes
+
+    def _entry_for(self, img_array):
+        """Mục của phiên bản hiện tại của img_array, None nếu không cache được"""
+        owner = _owner(img_array)
+        owner_id = id(owner)
+        with self.lock:
+            self._collect_dead()
+            known = self.owners.get(owner_id)
+            if known is None or known[0]() is not owner:
+                try:
+                    ref = weakref.ref(owner, lambda ref, owner_id=owner_id:
+                                      self.dead_owners.append((owner_id, ref)))
+                except TypeError:
+                    return None
+                self._drop_entries(owner_id)
+                known = (ref, 0)
+                self.owners[owner_id] = known
+            key = (owner_id, known[1], img_array.__array_interface__['data'][0],
+                   img_array.shape, img_array.strides, img_array.dtype.str)
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = _Entry(owner_id)
+            self.entries.move_to_end(key)
+            return entry
+
+    def get(self, img_array, kind):
+        """Biểu diễn kind của img_array, tính nếu chưa có"""
+        entry = self._entry_for(img_array)
+        if entry is None:
+            return CONVERTERS[kind](img_array, lambda other: self.get(img_array, other))
+
+        with entry.lock:
+            value = entry.values.get(kind)
+            if value is not None:
+                return value
+        # Tính ngoài khóa của mục vì biểu diễn này có thể cần biểu diễn khác
+        value = CONVERTERS[kind](img_array, lambda other: self.get(img_array, other))
+        if value is img_array:
+            return value
+        value.setflags(write=False)
+        with entry.lock:
+            if kind in entry.values:
+                return entry.values[kind]
+            entry.values[kind] = value
+            entry.nbytes += value.nbytes
+        with self.lock:
+            self.total_bytes += value.nbytes
+            self._enforce_budget(entry)
+        return value
+
+    def _enforce_budget(self, keep):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, entry = next(iter(self.entries.items()))
+            if entry is keep:
+                self.entries.move_to_end(key)
+                continue
+            del self.entries[key]
+            self.total_bytes -= entry.nbytes
+
+    def invalidate(self, img_array):
+        """Bộ nhớ của img_array sắp bị ghi lại: bỏ mọi biểu diễn đã tính từ nó"""
+        owner_id = id(_owner(img_array))
+        with self.lock:
+            known = self.owners.get(owner_id)
+            if known is None:
+                return
+            self.owners[owner_id] = (known[0], known[1] + 1)
+            self._drop_entries(owner_id)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.owners.clear()
+            del self.dead_owners[:]
+            self.total_bytes = 0
+
+
+_cache = DerivedCache()
+
+# Mảng RGB của ảnh PIL: id(ảnh) -> (weakref, mảng)
+_pil_arrays = {}
+_pil_lock = threading.Lock()
+
+
+# ========== API ==========
+
+def get(img_array, kind):
+    return _cache.get(img_array, kind)
+
+
+def gray(img_array):
+    return _cache.get(img_array, 'gray')
+
+
+def hsv(img_array):
+    return _cache.get(img_array, 'hsv')
+
+
+def lab(img_array):
+    return _cache.get(img_array, 'lab')
+
+
+def laplacian(img_array):
+    """Laplacian (CV_64F) của ảnh xám"""
+    return _cache.get(img_array, 'laplacian')
+
+
+def invalidate(img_array):
+    _cache.invalidate(img_array)
+
+
+def clear():
+    _cache.clear()
+    with _pil_lock:
+        _pil_arrays.clear()
+
+
+def _forget_pil(key, ref):
+    # Không lấy khóa: callback có thể chạy khi khóa đang được giữ
+    known = _pil_arrays.get(key)
+    if known is not None and known[0] is ref:
+        _pil_arrays.pop(key, None)
+
+
+def array_of(image):
+    """Mảng numpy chỉ đọc của ảnh PIL, dùng chung cho mọi lần gọi với cùng ảnh"""
+    key = id(image)
+    with _pil_lock:
+        known = _pil_arrays.get(key)
+        if known is not None and known[0]() is image:
+            return known[1]
+    img_array = np.array(image)
+    img_array.setflags(write=False)
+    ref = weakref.ref(image, lambda ref, key=key: _forget_pil(key, ref))
+    with _pil_lock:
+        _pil_arrays[key] = (ref, img_array)
+    return img_array
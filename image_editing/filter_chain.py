@@ -0,0 +1,136 @@
+"""
+Chuỗi nhiều bộ lọc xếp chồng, gộp các công đoạn theo từng pixel thành một lượt
+
+Chuỗi là tuple các cặp (tên bộ lọc, cường độ) theo thứ tự áp dụng, gồm bộ lọc
+đang chọn trên giao diện rồi tới adjustments['filter_stack']. Các bộ lọc
+pointwise có ma trận affine (đen trắng, độ sáng, tương phản, độ bão hòa, cân
+bằng màu) đứng liền nhau được nhân thành một ma trận 3x4 và áp dụng bằng một lần
+cv2.transform, nên năm thao tác pointwise tốn gần bằng một. Chỉ các bộ lọc không
+gian (blur, Canny, bilateral...) mới cần lượt xử lý riêng.
+
+Khi gộp, giá trị trung gian không bị làm tròn/cắt về 0..255 giữa các thao tác
+nên kết quả có thể lệch vài mức so với áp dụng lần lượt (sai số làm tròn của
+từng bước bị khuếch đại qua các bước sau; khác hơn ở những pixel bị cắt giữa chừng). Một thao tác pointwise đứng riêng vẫn dùng hàm gốc.
+"""
+import numpy as np
+
+from image_editing import filters, process_pool, tiling
+
+
+def build_chain(adjustments, filter_values):
+    """Chuỗi (tên, cường độ) từ bộ lọc đang chọn và filter_stack, bỏ qua tên lạ"""
+    chain = []
+    spec = filters.get_filter(adjustments.get('filter'))
+    if spec is not None:
+        chain.append((spec.name, filter_values.get(spec.name, spec.default_intensity)))
+    for name, intensity in adjustments.get('filter_stack') or ():
+        if filters.get_filter(name) is not None:
+            # Tham số công đoạn phải hashable để làm khóa cache
+            if isinstance(intensity, list):
+                intensity = tuple(intensity)
+            chain.append((name, intensity))
+    return tuple(chain)
+
+
+def scale_kernels(chain, scale):
+    """Chuỗi với kernel của các bộ lọc kernel_scalable thu nhỏ theo scale (0 < scale <= 1)"""
+    if scale >= 1:
+        return chain
+    scaled = []
+    for name, intensity in chain:
+        spec = filters.get_filter(name)
+        if spec.kernel_scalable:
+            lowest = spec.intensity_range[0] if spec.intensity_range else 0
+            intensity = max(lowest, intensity * scale)
+        scaled.append((name, intensity))
+    return tuple(scaled)
+
+
+def chain_halo(chain, roi=False):
+    """Tổng bán kính lân cận của chuỗi; None nếu có bộ lọc cần toàn ảnh"""
+    total = 0
+    for name, intensity in chain:
+        if roi:
+            halo = filters.filter_roi_halo(name, intensity)
+        else:
+            halo = filters.filter_halo(name, intensity)
+        if halo is None:
+            return None
+        total += halo
+    return total
+
+
+def plan_passes(chain):
+    """Chia chuỗi thành các lượt xử lý: ('filter', (tên, cường độ)) hoặc ('fused', các thao tác)"""
+    passes = []
+    run = []
+
+    def flush():
+        if len(run) == 1:
+            passes.append(('filter', run[0]))
+        elif run:
+            passes.append(('fused', tuple(run)))
+        del run[:]
+
+    for name, intensity in chain:
+        if filters.get_filter(name).affine is not None:
+            run.append((name, intensity))
+            continue
+        flush()
+        passes.append(('filter', (name, intensity)))
+    flush()
+    return passes
+
+
+def fused_matrix(ops, means):
+    """Ma trận 3x4 tương đương áp dụng lần lượt các thao tác affine.
+
+    means là trung bình RGB của ảnh đầu vào; trung bình tại từng bước (cho
+    Contrast) được suy ra từ ma trận đã gộp thay vì đọc lại ảnh.
+    """
+    matrix = filters.identity_affine()
+    for name, intensity in ops:
+        current_means = matrix[:, :3] @ means + matrix[:, 3]
+        step = filters.get_filter(name).affine(intensity, current_means)
+        linear = step[:, :3] @ matrix[:, :3]
+        offset = step[:, :3] @ matrix[:, 3] + step[:, 3]
+        matrix = np.hstack([linear, offset[:, np.newaxis]])
+    return matrix
+
+
+def apply_fused(img_array, ops, workers=1):
+    """Áp dụng một nhóm thao tác pointwise trong một lượt"""
+    matrix = fused_matrix(ops, filters.image_means(img_array))
+    if workers <= 1:
+        return filters.apply_affine(img_array, matrix)
+    # Pointwise nên chia dải không cần halo
+    return tiling.map_strips(lambda strip: filters.apply_affine(strip, matrix), img_array, 0,
+                             workers=workers)
+
+
+def apply_single(img_array, filter_name, intensity, workers=1,
+                 tile_threshold=tiling.DEFAULT_TILE_THRESHOLD, processes=0):
+    """Một bộ lọc: chia dải trên nhiều process/luồng hoặc theo ngân sách bộ nhớ khi ảnh lớn"""
+    if processes:
+        return process_pool.apply_filter(img_array, filter_name, intensity, processes)
+    if workers > 1 or (tile_threshold is not None and tiling.should_tile(img_array, tile_threshold)):
+        return tiling.apply_filter_tiled(img_array, filter_name, intensity, workers=workers)
+    return filters.apply_filter(img_array, filter_name, intensity)
+
+
+def apply_chain(img_array, chain, workers=None, tile_threshold=tiling.DEFAULT_TILE_THRESHOLD,
+                processes=None):
+    """Áp dụng chuỗi bộ lọc; workers=None chọn số luồng theo kích thước ảnh.
+
+    processes > 1 chạy các bộ lọc không gian của ảnh lớn trên process pool; các
+    lượt pointwise đã gộp vẫn chạy trên luồng (cv2.transform nhả GIL).
+    """
+    workers = tiling.parallel_workers(img_array, workers)
+    processes = process_pool.use_processes(img_array, processes)
+    for kind, item in plan_passes(chain):
+        if kind == 'fused':
+            img_array = apply_fused(img_array, item, workers)
+        else:
+            img_array = apply_single(img_array, item[0], item[1], workers, tile_threshold,
+                                     processes)
+    return img_array
@@ -0,0 +1,358 @@
+"""
+Các bộ lọc ảnh tối ưu sử dụng OpenCV và NumPy (không phụ thuộc Tkinter)
+"""
+import cv2
+import numpy as np
+
+from image_editing import blur, derived
+from image_editing.tone import LUMA_WEIGHTS, channel_means, color_channels
+
+
+def apply_filter_contour_optimized(img_array, intensity):
+    """Bộ lọc viền tối ưu sử dụng OpenCV"""
+    gray = derived.gray(img_array)
+
+    # Sử dụng Canny edge detection với threshold động
+    low_threshold = max(1, int(50 * (1 / intensity)))
+    high_threshold = max(2, int(150 * (1 / intensity)))
+    edges = cv2.Canny(gray, low_threshold, high_threshold)
+
+    # Chuyển đổi edges thành RGB
+    if len(img_array.shape) == 3:
+        edges_rgb = cv2.cvtColor(edges, cv2.COLOR_GRAY2RGB)
+    else:
+        edges_rgb = edges
+
+    # Blend với ảnh gốc
+    blend_ratio = min(1.0, intensity / 3.0)
+    result = cv2.addWeighted(img_array, 1 - blend_ratio, edges_rgb, blend_ratio, 0)
+    return result
+
+
+def _blur_kernel_size(intensity):
+    kernel_size = int(intensity * 2) * 2 + 1  # Đảm bảo số lẻ
+    # Kernel lớn được xấp xỉ bằng box blur nên không cần giới hạn trên
+    return max(3, kernel_size)
+
+
+def apply_filter_blur_optimized(img_array, intensity):
+    """Bộ lọc làm mờ, chi phí không tăng theo cường độ"""
+    return blur.gaussian_blur(img_array, 0, _blur_kernel_size(intensity))
+
+
+def apply_filter_bw_optimized(img_array, intensity):
+    """Bộ lọc đen trắng tối ưu"""
+    if len(img_array.shape) == 3:
+        gray_rgb = cv2.cvtColor(derived.gray(img_array), cv2.COLOR_GRAY2RGB)
+    else:
+        gray_rgb = img_array
+
+    # Blend với ảnh gốc
+    result = cv2.addWeighted(img_array, 1 - intensity, gray_rgb, intensity, 0)
+    return result
+
+
+def _detail_kernel(intensity):
+    """(kernel_size, sigma) của Gaussian dùng cho unsharp mask"""
+    sigma = max(0.5, intensity * 1.5)
+    kernel_size = int(sigma * 4) * 2 + 1  # Đảm bảo số lẻ
+    kernel_size = max(3, min(kernel_size, 21))  # Giới hạn từ 3 đến 21
+    return kernel_size, sigma
+
+
+def _detail_halo(intensity):
+    kernel_size, sigma = _detail_kernel(intensity)
+    return blur.gaussian_halo(sigma, kernel_size)
+
+
+def apply_filter_detail_optimized(img_array, intensity):
+    """Bộ lọc chi tiết tối ưu sử dụng Unsharp Masking"""
+    # Chuyển sang grayscale để tính toán
+    gray = derived.gray(img_array)
+
+    # Tạo unsharp mask với sigma động
+    kernel_size, sigma = _detail_kernel(intensity)
+    blurred = blur.gaussian_blur(gray, sigma, kernel_size)
+
+    # Unsharp masking
+    unsharp_mask = cv2.addWeighted(gray, 1.0 + intensity * 0.5, blurred, -intensity * 0.5, 0)
+    unsharp_mask = np.clip(unsharp_mask, 0, 255).astype(np.uint8)
+
+    # Áp dụng cho từng kênh màu
+    if len(img_array.shape) == 3:
+        result = img_array.copy().astype(np.float32)
+        gray_float = gray.astype(np.float32) + 1e-5  # Tránh chia cho 0
+        unsharp_float = unsharp_mask.astype(np.float32)
+        enhancement = unsharp_float / gray_float
+
+        for i in range(3):
+            channel = img_array[:, :, i].astype(np.float32)
+            result[:, :, i] = np.clip(channel * enhancement, 0, 255)
+        return result.astype(np.uint8)
+    else:
+        return unsharp_mask
+
+
+def apply_filter_edge_enhance_optimized(img_array, intensity):
+    """Bộ lọc tăng cạnh tối ưu sử dụng Laplacian"""
+    # Laplacian edge detection (của ảnh xám, dùng chung qua cache)
+    laplacian = np.absolute(derived.laplacian(img_array))
+    laplacian = np.uint8(np.clip(laplacian, 0, 255))
+
+    # Chuyển sang RGB
+    if len(img_array.shape) == 3:
+        laplacian_rgb = cv2.cvtColor(laplacian, cv2.COLOR_GRAY2RGB)
+    else:
+        laplacian_rgb = laplacian
+
+    # Blend với ảnh gốc
+    blend_ratio = min(1.0, intensity / 3.0)
+    result = cv2.addWeighted(img_array, 1.0, laplacian_rgb, blend_ratio, 0)
+    return result
+
+
+def _smooth_diameter(intensity):
+    d = int(intensity * 5)  # Diameter
+    return max(1, min(d, 15))  # Giới hạn từ 1 đến 15
+
+
+def apply_filter_smooth_optimized(img_array, intensity):
+    """Bộ lọc làm mịn tối ưu sử dụng Bilateral Filter"""
+    if len(img_array.shape) == 3:
+        d = _smooth_diameter(intensity)
+        return cv2.bilateralFilter(img_array, d, 80, 80)
+    else:
+        return blur.gaussian_blur(img_array, intensity, 5)
+
+
+def apply_filter_emboss_optimized(img_array, intensity):
+    """Bộ lọc làm nổi tối ưu sử dụng Sobel operator - chỉ dùng Sobel x và Sobel y"""
+    gray = derived.gray(img_array)
+
+    # Tính toán Sobel gradients theo cả hai hướng với ksize=5
+    sobel_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=5)  # Sobel x
+    sobel_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=5)  # Sobel y
+
+    # Kết hợp gradients và chuyển về uint8
+    sobel_combined = np.sqrt(sobel_x**2 + sobel_y**2)
+    sobel_normalized = np.clip(sobel_combined, 0, 255).astype(np.uint8)
+
+    # Chuyển sang RGB
+    if len(img_array.shape) == 3:
+        embossed_rgb = cv2.cvtColor(sobel_normalized, cv2.COLOR_GRAY2RGB)
+    else:
+        embossed_rgb = sobel_normalized
+
+    # Blend với ảnh gốc theo intensity
+    blend_ratio = min(1.0, intensity / 3.0)
+    result = cv2.addWeighted(img_array, 1 - blend_ratio, embossed_rgb, blend_ratio, 0)
+    return result
+
+
+# ========== REGISTRY BỘ LỌC ==========
+
+# Tên hiển thị khi không chọn bộ lọc nào
+NO_FILTER = "Không"
+
+
+class FilterSpec:
+    """Khai báo một bộ lọc và các tính chất mà pipeline dựa vào để tối ưu.
+
+    halo là bán kính vùng lân cận (số hàng/cột) mà mỗi pixel kết quả phụ thuộc
+    vào, dạng số hoặc hàm của cường độ. pointwise: mỗi pixel chỉ phụ thuộc chính
+    nó. tile_safe: xử lý theo dải có halo cho kết quả giống hệt. roi_safe: chỉ
+    xử lý vùng cắt (cộng halo) cho kết quả giống hệt.
+
+    affine(intensity, means) (chỉ cho bộ lọc pointwise) trả về ma trận 3x4 của
+    phép biến đổi màu, means là trung bình RGB của ảnh đầu vào; các công đoạn
+    liên tiếp có affine được gộp thành một lượt (xem filter_chain). listed=False
+    cho các thao tác chỉ dùng trong chuỗi bộ lọc, không hiện trong danh sách bộ lọc.
+    kernel_scalable: kích thước kernel tỷ lệ với cường độ (và cường độ chỉ quyết
+    định kernel), nên giảm cường độ là giảm kernel (xem filter_chain.scale_kernels).
+    """
+
+    def __init__(self, name, func, default_intensity=1.0, halo=0, pointwise=False,
+                 tile_safe=True, roi_safe=True, intensity_range=(0.1, 5.0), affine=None,
+                 listed=True, kernel_scalable=False):
+        self.name = name
+        self.func = func
+        self.default_intensity = default_intensity
+        self.halo = halo
+        self.pointwise = pointwise
+        self.tile_safe = tile_safe
+        self.roi_safe = roi_safe
+        self.intensity_range = intensity_range
+        self.affine = affine
+        self.listed = listed
+        self.kernel_scalable = kernel_scalable
+
+    def halo_for(self, intensity):
+        """Bán kính lân cận ở cường độ này, None nếu bộ lọc cần toàn ảnh"""
+        if not self.tile_safe:
+            return None
+        if self.pointwise:
+            return 0
+        return self.halo(intensity) if callable(self.halo) else self.halo
+
+    def __call__(self, img_array, intensity):
+        return self.func(img_array, intensity)
+
+
+# Tên bộ lọc hiển thị trên giao diện -> FilterSpec, theo thứ tự hiển thị
+FILTERS = {}
+
+
+def register_filter(spec):
+    """Đăng ký bộ lọc; bộ lọc mới tự có cache, xử lý theo dải, ROI và gộp công đoạn"""
+    FILTERS[spec.name] = spec
+    return spec
+
+
+def get_filter(filter_name):
+    """FilterSpec theo tên, None với "Không" hoặc tên lạ"""
+    return FILTERS.get(filter_name)
+
+
+def listed_filters():
+    """Các bộ lọc hiện trong danh sách chọn bộ lọc của giao diện"""
+    return {name: spec for name, spec in FILTERS.items() if spec.listed}
+
+
+def default_intensities():
+    """Cường độ mặc định của từng bộ lọc"""
+    return {name: spec.default_intensity for name, spec in listed_filters().items()}
+
+
+# ========== BIẾN ĐỔI MÀU AFFINE (POINTWISE) ==========
+
+def identity_affine():
+    return np.hstack([np.eye(3), np.zeros((3, 1))])
+
+
+def gray_blend_affine(factor):
+    """Image.blend(ảnh xám, ảnh, factor): factor * ảnh + (1 - factor) * luma"""
+    matrix = identity_affine()
+    matrix[:, :3] = factor * np.eye(3) + (1.0 - factor) * np.outer(np.ones(3), LUMA_WEIGHTS)
+    return matrix
+
+
+def brightness_affine(factor, means=None):
+    matrix = identity_affine()
+    matrix[:, :3] *= factor
+    return matrix
+
+
+def contrast_affine(factor, means):
+    """ImageEnhance.Contrast: co giãn quanh độ sáng trung bình (làm tròn như PIL)"""
+    mean = int(float(np.dot(LUMA_WEIGHTS, means)) + 0.5)
+    matrix = identity_affine()
+    matrix[:, :3] *= factor
+    matrix[:, 3] = (1.0 - factor) * mean
+    return matrix
+
+
+def saturation_affine(factor, means=None):
+    return gray_blend_affine(factor)
+
+
+def bw_affine(intensity, means=None):
+    """Như apply_filter_bw_optimized: trộn ảnh với bản xám theo intensity"""
+    return gray_blend_affine(1.0 - intensity)
+
+
+def color_balance_affine(multipliers, means=None):
+    """Nhân từng kênh R, G, B với hệ số riêng (như bước color của preset)"""
+    matrix = identity_affine()
+    matrix[:, :3] = np.diag(np.asarray(multipliers, dtype=np.float64))
+    return matrix
+
+
+def image_means(img_array):
+    """Trung bình R, G, B của ảnh (ảnh xám được coi là R = G = B)"""
+    means = channel_means(img_array)
+    if len(means) == 1:
+        return np.repeat(means, 3)
+    return np.asarray(means[:3], dtype=np.float64)
+
+
+def apply_affine(img_array, matrix):
+    """Áp dụng ma trận màu 3x4 trong một lượt (cv2.transform); kênh alpha giữ nguyên"""
+    channels = color_channels(img_array)
+    if channels == 1:
+        # Ảnh xám: R = G = B = x, lấy độ sáng của kết quả
+        gain = float(np.dot(LUMA_WEIGHTS, matrix[:, :3].sum(axis=1)))
+        offset = float(np.dot(LUMA_WEIGHTS, matrix[:, 3]))
+        return cv2.transform(img_array[:, :, np.newaxis], np.array([[gain, offset]]))
+    if channels == 4:
+        full = np.zeros((4, 5))
+        full[:3, :3] = matrix[:, :3]
+        full[:3, 4] = matrix[:, 3]
+        full[3, 3] = 1.0
+        matrix = full
+    return cv2.transform(img_array, matrix)
+
+
+def affine_filter(affine):
+    """Hàm bộ lọc (img_array, intensity) thực hiện một biến đổi affine riêng lẻ"""
+    def apply(img_array, intensity):
+        return apply_affine(img_array, affine(intensity, image_means(img_array)))
+    return apply
+
+
+register_filter(FilterSpec("Đen Trắng", apply_filter_bw_optimized, pointwise=True,
+                           intensity_range=(0.1, 1.0), affine=bw_affine))
+register_filter(FilterSpec("Làm Mờ", apply_filter_blur_optimized, default_intensity=2.0,
+                           halo=lambda intensity: blur.gaussian_halo(0, _blur_kernel_size(intensity)),
+                           intensity_range=(0.5, 100.0), kernel_scalable=True))
+# Canny nối cạnh (hysteresis) theo thành phần liên thông, không giới hạn bán kính
+register_filter(FilterSpec("Viền", apply_filter_contour_optimized, tile_safe=False,
+                           roi_safe=False))
+register_filter(FilterSpec("Chi Tiết", apply_filter_detail_optimized,
+                           halo=_detail_halo))
+register_filter(FilterSpec("Tăng Cạnh", apply_filter_edge_enhance_optimized,
+                           halo=1))  # Laplacian 3x3
+register_filter(FilterSpec("Làm Mịn", apply_filter_smooth_optimized,
+                           halo=lambda intensity: max(_smooth_diameter(intensity) // 2, 2),
+                           kernel_scalable=True))
+register_filter(FilterSpec("Làm Nổi", apply_filter_emboss_optimized,
+                           halo=2))  # Sobel ksize=5
+
+# Thao tác tone chỉ dùng trong chuỗi bộ lọc
+register_filter(FilterSpec("Độ Sáng", affine_filter(brightness_affine), pointwise=True,
+                           intensity_range=(0.1, 3.0), affine=brightness_affine, listed=False))
+# Contrast cần độ sáng trung bình của cả ảnh nên không xử lý riêng từng dải hay
+# vùng cắt được (khi gộp trong chuỗi, trung bình được tính trước trên cả ảnh)
+register_filter(FilterSpec("Tương Phản", affine_filter(contrast_affine), pointwise=True,
+                           tile_safe=False, roi_safe=False, intensity_range=(0.1, 3.0), affine=contrast_affine,
+                           listed=False))
+register_filter(FilterSpec("Độ Bão Hòa", affine_filter(saturation_affine), pointwise=True,
+                           intensity_range=(0.0, 3.0), affine=saturation_affine, listed=False))
+register_filter(FilterSpec("Cân Bằng Màu", affine_filter(color_balance_affine), pointwise=True,
+                           default_intensity=(1.0, 1.0, 1.0), intensity_range=None,
+                           affine=color_balance_affine, listed=False))
+
+
+def filter_halo(filter_name, intensity):
+    """Bán kính lân cận của bộ lọc khi xử lý theo dải, None nếu cần toàn ảnh"""
+    spec = FILTERS.get(filter_name)
+    if spec is None:
+        return 0
+    return spec.halo_for(intensity)
+
+
+def filter_roi_halo(filter_name, intensity):
+    """Như filter_halo nhưng cho việc chỉ xử lý vùng cắt, None nếu không được"""
+    spec = FILTERS.get(filter_name)
+    if spec is None:
+        return 0
+    if not spec.roi_safe:
+        return None
+    return spec.halo_for(intensity)
+
+
+def apply_filter(img_array, filter_name, intensity):
+    """Áp dụng bộ lọc theo tên; "Không" hoặc tên lạ trả về ảnh gốc"""
+    spec = FILTERS.get(filter_name)
+    if spec is None:
+        return img_array
+    return spec.func(img_array, intensity)
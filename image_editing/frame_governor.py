@@ -0,0 +1,124 @@
+"""
+Điều tiết chất lượng xử lý khung webcam theo ngân sách thời gian mỗi khung
+
+Khi bộ lọc nặng (bilateral Làm Mịn, Sobel Làm Nổi, unsharp Chi Tiết) không kịp
+nhịp, FrameGovernor hạ dần từng bậc: giảm độ phân giải xử lý, giảm kernel của
+các bộ lọc kernel_scalable, rồi chỉ lọc một trong N khung (các khung còn lại
+giữ nguyên kết quả đã hiển thị). Khi thời gian xử lý đủ thấp so với ngân sách,
+các bậc được nâng lại từng bước; bậc vừa vượt ngân sách chỉ được thử lại sau
+RETRY_SECONDS để không dao động giữa hai bậc.
+
+    governor = FrameGovernor(budget_ms=33)
+    if governor.should_process():
+        started = time.perf_counter()
+        ...  # lọc với governor.scale, governor.kernel_scale
+        governor.record((time.perf_counter() - started) * 1000)
+    governor.frame_shown()
+
+Thời gian được đo trung bình trên một cửa sổ khung và chia cho N khi chỉ lọc
+một trong N khung (chi phí trung bình mỗi khung hiển thị).
+"""
+import time
+from collections import deque
+
+DEFAULT_BUDGET_MS = 33.0
+
+# Các bậc (tỷ lệ độ phân giải xử lý, tỷ lệ kernel, lọc một trong N khung) từ tốt nhất
+LEVELS = (
+    (1.0, 1.0, 1),
+    (0.75, 1.0, 1),
+    (0.5, 1.0, 1),
+    (0.5, 0.5, 1),
+    (0.35, 0.5, 1),
+    (0.35, 0.5, 2),
+    (0.25, 0.5, 2),
+    (0.25, 0.5, 3),
+)
+
+# Chỉ nâng bậc khi chi phí trung bình dưới tỷ lệ này của ngân sách (tránh dao động)
+RESTORE_HEADROOM = 0.5
+
+# Bậc vừa vượt ngân sách chỉ được thử lại sau ngần này giây
+RETRY_SECONDS = 5.0
+
+
+class FrameGovernor:
+    """Chọn bậc chất lượng để thời gian xử lý trung bình mỗi khung nằm trong ngân sách"""
+
+    def __init__(self, budget_ms=DEFAULT_BUDGET_MS, window=8, levels=LEVELS,
+                 headroom=RESTORE_HEADROOM, retry_seconds=RETRY_SECONDS):
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.headroom = headroom
+        self.retry_seconds = retry_seconds
+        # bậc -> thời điểm gần nhất bậc đó vượt ngân sách
+        self.overloaded = {}
+        self.level = 0
+        self.counter = 0
+        self.costs = deque(maxlen=window)
+        self.shown = deque(maxlen=30)
+
+    @property
+    def scale(self):
+        return self.levels[self.level][0]
+
+    @property
+    def kernel_scale(self):
+        return self.levels[self.level][1]
+
+    @property
+    def stride(self):
+        return self.levels[self.level][2]
+
+    def reset(self):
+        """Về bậc tốt nhất (ví dụ khi đổi bộ lọc)"""
+        self.level = 0
+        self.counter = 0
+        self.costs.clear()
+        self.overloaded.clear()
+
+    def should_process(self):
+        """Khung này có cần lọc không (False: dùng lại kết quả trước)"""
+        process = self.counter % self.stride == 0
+        self.counter += 1
+        return process
+
+    def record(self, processing_ms):
+        """Ghi thời gian xử lý một khung đã lọc; đổi bậc khi đủ một cửa sổ đo"""
+        self.costs.append(processing_ms / self.stride)
+        if len(self.costs) < self.costs.maxlen:
+            return
+        average = sum(self.costs) / len(self.costs)
+        now = time.perf_counter()
+        if average > self.budget_ms and self.level < len(self.levels) - 1:
+            self.overloaded[self.level] = now
+            self._set_level(self.level + 1)
+        elif average < self.budget_ms * self.headroom and self.level > 0:
+            failed_at = self.overloaded.get(self.level - 1)
+            if failed_at is None or now - failed_at >= self.retry_seconds:
+                self._set_level(self.level - 1)
+
+    def _set_level(self, level):
+        self.level = level
+        self.counter = 0
+        # Đo lại từ đầu ở bậc mới
+        self.costs.clear()
+
+    def frame_shown(self):
+        self.shown.append(time.perf_counter())
+
+    def fps(self):
+        """Số khung hiển thị mỗi giây gần đây"""
+        if len(self.shown) < 2:
+            return 0.0
+        elapsed = self.shown[-1] - self.shown[0]
+        return (len(self.shown) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def status_text(self):
+        """Mô tả thiết lập hiện tại cho giao diện"""
+        parts = [f"{self.fps():.0f} FPS", f"Độ phân giải {self.scale:.0%}"]
+        if self.kernel_scale < 1:
+            parts.append(f"Kernel {self.kernel_scale:.0%}")
+        if self.stride > 1:
+            parts.append(f"Lọc 1/{self.stride} khung")
+        return " · ".join(parts)
@@ -0,0 +1,281 @@
+"""
+Nguồn khung hình cho chế độ webcam: camera, file video, thư mục ảnh, ảnh tổng hợp
+
+Mọi nguồn có cùng giao diện với cv2.VideoCapture mà CaptureThread dùng:
+read(image=None) -> (ok, khung BGR uint8) ghi vào image khi được cho và đúng
+kích thước, release(), cùng thuộc tính opened. size=(rộng, cao) đưa mọi khung về
+đúng độ phân giải đó (cắt giữa để phủ kín, không méo); realtime=True giãn nhịp
+đọc theo fps của nguồn để file và ảnh tổng hợp phát như camera thật (camera tự
+giữ nhịp nên không nhận realtime).
+
+    from image_editing import frame_sources
+
+    source = frame_sources.open_source('images/', size=(1280, 720), realtime=True)
+    source = frame_sources.open_source('synthetic')    # tái lập được, không cần camera
+
+Nguồn mặc định của giao diện lấy từ biến môi trường IMAGE_EDITING_FRAME_SOURCE
+(chỉ số camera, file video, thư mục ảnh hoặc 'synthetic[:seed]') và
+IMAGE_EDITING_FRAME_SIZE (ví dụ 1280x720); không đặt thì dùng camera 0.
+"""
+import abc
+import os
+import time
+
+import cv2
+import numpy as np
+
+from image_editing import geometry
+from image_editing.ingest import IMAGE_EXTENSIONS
+
+# Biến môi trường chọn nguồn khung và độ phân giải mặc định
+FRAME_SOURCE_ENV = 'IMAGE_EDITING_FRAME_SOURCE'
+FRAME_SIZE_ENV = 'IMAGE_EDITING_FRAME_SIZE'
+
+DEFAULT_FPS = 30.0
+SYNTHETIC_SIZE = (1280, 720)
+
+
+class FrameSource(abc.ABC):
+    """Lớp cơ sở: nhịp đọc theo thời gian thực và đưa khung về độ phân giải yêu cầu"""
+
+    name = 'source'
+
+    def __init__(self, size=None, realtime=False, fps=DEFAULT_FPS):
+        self.size = tuple(size) if size else None
+        self.realtime = realtime
+        self.fps = fps or DEFAULT_FPS
+        self.frames = 0
+        self._next_time = None
+        # Khung gốc đọc từ nguồn trước khi đổi kích thước (dùng lại giữa các lần đọc)
+        self._native = None
+
+    @property
+    def opened(self):
+        return True
+
+    @abc.abstractmethod
+    def _read_native(self, image):
+        """(ok, khung) ở độ phân giải gốc, ghi vào image nếu được"""
+
+    def _pace(self):
+        now = time.perf_counter()
+        if self._next_time is None or self._next_time < now:
+            # Chậm hơn nhịp (hoặc lần đầu): không cố đuổi theo các khung đã lỡ
+            self._next_time = now
+        else:
+            time.sleep(self._next_time - now)
+        self._next_time += 1.0 / self.fps
+
+    def read(self, image=None):
+        if self.realtime:
+            self._pace()
+        if self.size is None:
+            ok, frame = self._read_native(image)
+        else:
+            ok, frame = self._read_native(self._native)
+        if not ok or frame is None:
+            return False, None
+        self.frames += 1
+        if self.size is None:
+            return True, frame
+
+        self._native = frame
+        width, height = self.size
+        shape = (height, width) + frame.shape[2:]
+        if image is None or image.shape != shape or image.dtype != frame.dtype:
+            image = None
+        if frame.shape == shape:
+            # Đúng kích thước: vẫn phải chép ra vì bộ đệm gốc được dùng lại ở lần đọc sau
+            if image is None:
+                return True, frame.copy()
+            np.copyto(image, frame)
+            return True, image
+        return True, geometry.resize_to_fill(frame, width, height, out=image)
+
+    def release(self):
+        self._native = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class CaptureSource(FrameSource):
+    """Nguồn đọc qua cv2.VideoCapture (camera hoặc file video)"""
+
+    def __init__(self, cap, name, size=None, realtime=False):
+        fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+        super().__init__(size, realtime, fps if fps and fps > 0 else DEFAULT_FPS)
+        self.name = name
+        self.cap = cap
+
+    @property
+    def opened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def _read_native(self, image):
+        return self.cap.read(image) if image is not None else self.cap.read()
+
+    def release(self):
+        super().release()
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class DeviceSource(CaptureSource):
+    """Camera theo chỉ số thiết bị; camera tự giữ nhịp nên không có realtime"""
+
+    def __init__(self, index=0, size=None):
+        cap = cv2.VideoCapture(index)
+        if size and cap.isOpened():
+            # Yêu cầu camera chụp đúng độ phân giải để khỏi phải đổi kích thước
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        super().__init__(cap, str(index), size)
+
+
+class VideoFileSource(CaptureSource):
+    """File video; loop=True phát lại từ đầu khi hết"""
+
+    def __init__(self, path, size=None, realtime=False, loop=True):
+        super().__init__(cv2.VideoCapture(path), os.path.basename(path), size, realtime)
+        self.loop = loop
+
+    def _read_native(self, image):
+        ok, frame = super()._read_native(image)
+        if not ok and self.loop and self.frames:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = super()._read_native(image)
+        return ok, frame
+
+
+class ImageSequenceSource(FrameSource):
+    """Các ảnh trong một thư mục theo thứ tự tên, mỗi ảnh là một khung"""
+
+    def __init__(self, directory, size=None, realtime=False, fps=DEFAULT_FPS, loop=True):
+        super().__init__(size, realtime, fps)
+        self.name = os.path.basename(os.path.normpath(directory))
+        self.loop = loop
+        self.paths = []
+        if os.path.isdir(directory):
+            self.paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                          if name.lower().endswith(IMAGE_EXTENSIONS)]
+        self.index = 0
+
+    @property
+    def opened(self):
+        return bool(self.paths)
+
+    def _read_native(self, image):
+        while self.paths:
+            if self.index >= len(self.paths):
+                if not self.loop:
+                    return False, None
+                self.index = 0
+            path = self.paths[self.index]
+            self.index += 1
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is not None:
+                return True, frame
+            # Ảnh lỗi: bỏ khỏi danh sách để không đọc lại
+            self.index -= 1
+            del self.paths[self.index]
+        return False, None
+
+
+class SyntheticSource(FrameSource):
+    """Khung tổng hợp tất định: nền chuyển màu có khối màu trôi ngang và một ô sáng di chuyển.
+
+    Cùng seed và cùng số thứ tự khung luôn cho cùng ảnh, nên đo đạc lặp lại được
+    trên máy không có camera.
+    """
+
+    def __init__(self, size=None, realtime=False, fps=DEFAULT_FPS, seed=0):
+        super().__init__(size or SYNTHETIC_SIZE, realtime, fps)
+        self.name = f"synthetic:{seed}"
+        self.seed = seed
+        self.index = 0
+        self.background = self._background(self.size, seed)
+
+    @staticmethod
+    def _background(size, seed):
+        width, height = size
+        rng = np.random.default_rng(seed)
+        background = np.empty((height, width, 3), dtype=np.uint8)
+        background[:, :, 0] = np.linspace(40, 210, width, dtype=np.float32)[None, :]
+        background[:, :, 1] = np.linspace(190, 50, height, dtype=np.float32)[:, None]
+        background[:, :, 2] = 128
+        scale = max(width, height)
+        for _ in range(24):
+            center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+            radius = int(rng.integers(max(1, scale // 60), max(2, scale // 10)))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.circle(background, center, radius, color, -1)
+        noise = rng.integers(0, 10, background.shape, dtype=np.uint8)
+        cv2.add(background, noise, dst=background)
+        return background
+
+    def _read_native(self, image):
+        height, width = self.background.shape[:2]
+        if image is None or image.shape != self.background.shape:
+            image = np.empty_like(self.background)
+        # Nền trôi ngang 4 pixel mỗi khung (hai lần chép lát thay cho np.roll)
+        shift = (self.index * 4) % width
+        image[:, :width - shift] = self.background[:, shift:]
+        image[:, width - shift:] = self.background[:, :shift]
+        # Ô sáng chạy qua lại theo chiều ngang
+        box = max(8, min(width, height) // 8)
+        span = max(1, width - box)
+        x = self.index * 7 % (2 * span)
+        x = x if x < span else 2 * span - x
+        y = (height - box) // 2
+        cv2.rectangle(image, (x, y), (x + box - 1, y + box - 1), (240, 240, 240), -1)
+        self.index += 1
+        return True, image
+
+    def read(self, image=None):
+        # Khung tổng hợp đã đúng kích thước, ghi thẳng vào image
+        if self.realtime:
+            self._pace()
+        ok, frame = self._read_native(image)
+        self.frames += 1
+        return ok, frame
+
+
+# ========== CHỌN NGUỒN ==========
+
+def parse_size(value):
+    """'1280x720' -> (1280, 720); rỗng hoặc None -> None"""
+    if not value:
+        return None
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def default_spec():
+    return os.environ.get(FRAME_SOURCE_ENV) or '0'
+
+
+def default_size():
+    try:
+        return parse_size(os.environ.get(FRAME_SIZE_ENV))
+    except ValueError:
+        return None
+
+
+def open_source(spec=None, size=None, realtime=False):
+    """Tạo nguồn khung từ mô tả: chỉ số camera, 'synthetic[:seed]', thư mục ảnh hoặc file video.
+
+    realtime chỉ áp dụng cho file video, thư mục ảnh và ảnh tổng hợp; camera bỏ qua.
+    """
+    if spec is None:
+        spec = default_spec()
+    if isinstance(spec, int) or str(spec).isdigit():
+        return DeviceSource(int(spec), size)
+    spec = str(spec)
+    if spec == 'synthetic' or spec.startswith('synthetic:'):
+        seed = spec.partition(':')[2]
+        return SyntheticSource(size, realtime, seed=int(seed) if seed else 0)
+    if os.path.isdir(spec):
+        return ImageSequenceSource(spec, size, realtime)
+    return VideoFileSource(spec, size, realtime)
@@ -0,0 +1,207 @@
+"""
+Công đoạn hình học gộp: xoay + lật + cắt trong một lần lấy mẫu
+
+Thay cho chuỗi Image.rotate(expand=True) → transpose → crop (mỗi bước tạo một
+ảnh đầy đủ mới), toàn bộ phép biến đổi được gộp thành một ma trận affine và
+thực hiện bằng một lần cv2.warpAffine ghi thẳng vào ảnh có kích thước vùng cắt.
+Pixel bị cắt bỏ không bao giờ được tính. Hình học (kích thước ảnh xoay, vị trí
+vùng cắt) giống hệt cách PIL tính.
+"""
+import math
+
+import cv2
+import numpy as np
+
+from image_editing import derived
+
+
+def pil_rotation_matrix(width, height, angle):
+    """Ma trận affine (đích → nguồn) và kích thước ảnh của Image.rotate(angle, expand=True)"""
+    radians = -math.radians(angle)
+    a = round(math.cos(radians), 15)
+    b = round(math.sin(radians), 15)
+    d = round(-math.sin(radians), 15)
+    e = round(math.cos(radians), 15)
+    cx, cy = width / 2, height / 2
+    c = a * -cx + b * -cy + cx
+    f = d * -cx + e * -cy + cy
+
+    xs = []
+    ys = []
+    for x, y in ((0, 0), (width, 0), (width, height), (0, height)):
+        xs.append(a * x + b * y + c)
+        ys.append(d * x + e * y + f)
+    new_width = math.ceil(max(xs)) - math.floor(min(xs))
+    new_height = math.ceil(max(ys)) - math.floor(min(ys))
+
+    tx, ty = -(new_width - width) / 2.0, -(new_height - height) / 2.0
+    c, f = a * tx + b * ty + c, d * tx + e * ty + f
+    return np.array([[a, b, c], [d, e, f]], dtype=np.float64), new_width, new_height
+
+
+def crop_rect(width, height, crop_box):
+    """Vùng cắt (left, top, right, bottom) theo pixel từ crop_box chuẩn hóa, None nếu không cắt"""
+    if not crop_box:
+        return None
+    left_norm, top_norm, right_norm, bottom_norm = crop_box
+    left = max(0, min(int(width * left_norm), width - 1))
+    top = max(0, min(int(height * top_norm), height - 1))
+    right = max(left + 1, min(int(width * right_norm), width))
+    bottom = max(top + 1, min(int(height * bottom_norm), height))
+    if right - left >= 2 and bottom - top >= 2:
+        return left, top, right, bottom
+    return None
+
+
+def is_right_angle(rotation):
+    return rotation % 90 == 0
+
+
+def output_size(width, height, rotation):
+    """Kích thước ảnh sau khi xoay (trước khi cắt)"""
+    if rotation % 360 == 0:
+        return width, height
+    if is_right_angle(rotation):
+        return (height, width) if rotation % 180 else (width, height)
+    _, new_width, new_height = pil_rotation_matrix(width, height, -rotation)
+    return new_width, new_height
+
+
+def geometry_matrix(width, height, rotation, flip_horizontal, flip_vertical, crop_box):
+    """Ma trận affine gộp (tọa độ liên tục của ảnh kết quả → ảnh nguồn) và kích thước kết quả"""
+    rotate_matrix, rotated_width, rotated_height = pil_rotation_matrix(width, height, -rotation)
+    rect = crop_rect(rotated_width, rotated_height, crop_box)
+    if rect is None:
+        rect = (0, 0, rotated_width, rotated_height)
+    left, top, right, bottom = rect
+
+    # Kết quả → ảnh đã lật (dịch theo vùng cắt) → ảnh đã xoay (bỏ lật)
+    sx, tx = 1.0, float(left)
+    sy, ty = 1.0, float(top)
+    if flip_horizontal:
+        sx, tx = -1.0, rotated_width - tx
+    if flip_vertical:
+        sy, ty = -1.0, rotated_height - ty
+    to_rotated = np.array([[sx, 0.0, tx], [0.0, sy, ty], [0.0, 0.0, 1.0]])
+    matrix = rotate_matrix @ to_rotated
+    return matrix, right - left, bottom - top
+
+
+def source_region(width, height, rotation, flip_horizontal, flip_vertical, crop_box, margin=0):
+    """Vùng (left, top, right, bottom) của ảnh nguồn chứa mọi pixel mà vùng cắt cần đọc.
+
+    Biến đổi ngược bốn góc vùng cắt qua lật và xoay, lấy khung bao rồi nới thêm
+    margin pixel (bán kính kernel của các công đoạn trước). Trả về None nếu không cắt.
+    """
+    if crop_rect(*output_size(width, height, rotation), crop_box) is None:
+        return None
+    matrix, out_width, out_height = geometry_matrix(width, height, rotation,
+                                                    flip_horizontal, flip_vertical, crop_box)
+    corners = np.array([[0, 0, 1], [out_width, 0, 1],
+                        [out_width, out_height, 1], [0, out_height, 1]], dtype=np.float64)
+    points = corners @ matrix[:2].T
+    # Nới thêm 1 pixel cho sai số làm tròn khi lấy mẫu nearest-neighbour
+    left = max(0, int(math.floor(points[:, 0].min())) - margin - 1)
+    top = max(0, int(math.floor(points[:, 1].min())) - margin - 1)
+    right = min(width, int(math.ceil(points[:, 0].max())) + margin + 1)
+    bottom = min(height, int(math.ceil(points[:, 1].max())) + margin + 1)
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right, bottom
+
+
+def fill_value(img_array, fill):
+    channels = 1 if img_array.ndim == 2 else img_array.shape[2]
+    return (fill,) * channels
+
+
+def _flip_crop(img_array, flip_horizontal, flip_vertical, crop_box):
+    """Lật + cắt không cần lấy mẫu lại: chỉ là cắt lát mảng (view, không sao chép)"""
+    height, width = img_array.shape[:2]
+    rect = crop_rect(width, height, crop_box)
+    if rect is not None:
+        left, top, right, bottom = rect
+        # Vùng cắt trên ảnh đã lật tương ứng vùng đối xứng trên ảnh chưa lật
+        if flip_horizontal:
+            left, right = width - right, width - left
+        if flip_vertical:
+            top, bottom = height - bottom, height - top
+        img_array = img_array[top:bottom, left:right]
+    if flip_horizontal:
+        img_array = img_array[:, ::-1]
+    if flip_vertical:
+        img_array = img_array[::-1]
+    return img_array
+
+
+def warp_geometry(img_array, rotation, flip_horizontal, flip_vertical, crop_box, fill=255,
+                  source_size=None, region_offset=(0, 0)):
+    """Xoay (chiều kim đồng hồ, mở rộng khung, nền trắng) + lật + cắt trong một lần xử lý.
+
+    Lấy mẫu nearest-neighbour giống Image.rotate mặc định. Góc bội của 90 độ được
+    xử lý bằng xoay chỉ số mảng nên không có sai số lấy mẫu.
+
+    Khi img_array chỉ là vùng source_region của ảnh nguồn, source_size là kích
+    thước (rộng, cao) của ảnh nguồn đầy đủ và region_offset là góc trên trái của vùng.
+    """
+    height, width = img_array.shape[:2]
+    if source_size is None:
+        source_size = (width, height)
+    full_image = tuple(source_size) == (width, height) and tuple(region_offset) == (0, 0)
+
+    if full_image and is_right_angle(rotation):
+        turns = int(rotation // 90) % 4
+        # Xoay theo chiều kim đồng hồ turns lần 90 độ
+        rotated = np.rot90(img_array, k=-turns) if turns else img_array
+        return np.ascontiguousarray(_flip_crop(rotated, flip_horizontal, flip_vertical, crop_box))
+
+    matrix, out_width, out_height = geometry_matrix(source_size[0], source_size[1], rotation,
+                                                    flip_horizontal, flip_vertical, crop_box)
+    # PIL lấy pixel nguồn floor(M·(x+0.5, y+0.5)); cv2 INTER_NEAREST lấy round(M'·(x, y))
+    offset = matrix[:2, :2] @ np.array([0.5, 0.5]) - 0.5
+    warp = matrix[:2].copy()
+    warp[:, 2] += offset
+    # Tọa độ trong ảnh nguồn đầy đủ → tọa độ trong vùng
+    warp[0, 2] -= region_offset[0]
+    warp[1, 2] -= region_offset[1]
+    return cv2.warpAffine(img_array, warp, (out_width, out_height),
+                          flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP,
+                          borderMode=cv2.BORDER_CONSTANT,
+                          borderValue=fill_value(img_array, fill))
+
+
+# ========== PHỦ KÍN KHUNG HIỂN THỊ ==========
+
+def fill_source_rect(width, height, target_width, target_height):
+    """Vùng (left, top, right, bottom) của ảnh nguồn còn thấy được khi phóng ảnh
+    phủ kín khung target rồi cắt giữa (như scale_image_to_canvas_fill)"""
+    scale = max(target_width / width, target_height / height)
+    visible_width = min(width, max(1, int(round(target_width / scale))))
+    visible_height = min(height, max(1, int(round(target_height / scale))))
+    left = (width - visible_width) // 2
+    top = (height - visible_height) // 2
+    return left, top, left + visible_width, top + visible_height
+
+
+def resize_to_fill(img_array, target_width, target_height, out=None):
+    """Cắt giữa phần nhìn thấy rồi đổi kích thước về đúng khung target.
+
+    Chỉ các pixel còn hiển thị được lấy mẫu; thu nhỏ dùng INTER_AREA (nhanh, không
+    răng cưa), phóng to dùng INTER_LINEAR. out (cùng kích thước đích) nhận kết quả;
+    các biểu diễn suy ra đã cache cho out bị bỏ vì nội dung của nó đã đổi.
+    """
+    height, width = img_array.shape[:2]
+    left, top, right, bottom = fill_source_rect(width, height, target_width, target_height)
+    visible = img_array[top:bottom, left:right]
+    if (right - left, bottom - top) == (target_width, target_height):
+        if out is None:
+            return visible.copy()
+        out[...] = visible
+        derived.invalidate(out)
+        return out
+    shrinking = right - left > target_width
+    interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+    result = cv2.resize(visible, (target_width, target_height), dst=out, interpolation=interpolation)
+    if out is not None:
+        derived.invalidate(out)
+    return result
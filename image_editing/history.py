@@ -0,0 +1,211 @@
+"""
+Lịch sử hoàn tác theo tham số, giới hạn theo dung lượng bộ nhớ
+
+Phần lớn thao tác (slider, bộ lọc, xoay, lật, cắt) chỉ thay đổi adjustments và
+filter_values nên chỉ cần lưu các dict nhỏ này rồi render lại khi hoàn tác. Ảnh
+chỉ được lưu cho thao tác phá hủy (AI, preset, watermark...) và cho ảnh gốc cũ
+(sau khi resize); các ảnh này được nén rồi ghi ra đĩa khi vượt ngân sách.
+"""
+import copy
+import os
+import shutil
+import tempfile
+import zlib
+
+from PIL import Image
+
+from image_editing.stage_cache import estimate_nbytes
+
+# Dung lượng ước tính của một bước chỉ gồm tham số
+_PARAMS_NBYTES = 2048
+
+
+class PixelSnapshot:
+    """Một ảnh được giữ lại cho lịch sử: nguyên dạng, đã nén hoặc đã ghi ra đĩa"""
+
+    def __init__(self, image):
+        self.image = image
+        self.mode = image.mode
+        self.size = image.size
+        self.compressed = None
+        self.path = None
+
+    @property
+    def nbytes(self):
+        """Dung lượng đang chiếm trong RAM"""
+        if self.image is not None:
+            return estimate_nbytes(self.image)
+        if self.compressed is not None:
+            return len(self.compressed)
+        return 0
+
+    @property
+    def disk_bytes(self):
+        return os.path.getsize(self.path) if self.path else 0
+
+    def compress(self):
+        if self.image is None:
+            return
+        self.compressed = zlib.compress(self.image.tobytes(), 1)
+        self.image = None
+
+    def spill(self, directory):
+        if self.image is not None:
+            self.compress()
+        if self.compressed is None:
+            return
+        fd, self.path = tempfile.mkstemp(suffix='.undo', dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.compressed)
+        self.compressed = None
+
+    def load(self):
+        """Trả về ảnh PIL (giải nén / đọc từ đĩa nếu cần)"""
+        if self.image is not None:
+            return self.image
+        data = self.compressed
+        if data is None:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        return Image.frombytes(self.mode, self.size, zlib.decompress(data))
+
+    def discard(self):
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        self.image = None
+        self.compressed = None
+        self.path = None
+
+
+class EditHistory:
+    """Ngăn xếp hoàn tác có giới hạn dung lượng (RAM và đĩa) thay vì số bước cố định.
+
+    Mỗi bước gồm ảnh gốc (dùng chung giữa các bước có cùng ảnh gốc), tham số
+    chỉnh sửa và ảnh kết quả nếu ảnh đó không tái tạo được từ tham số.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_disk_bytes=2 * 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # 0 = không ghi ra đĩa, bước cũ nhất bị bỏ khi vượt ngân sách RAM
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = []
+        # id(ảnh) -> snapshot của ảnh gốc còn nguyên dạng, để các bước dùng chung
+        self.snapshots = {}
+        self.spill_dir = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _snapshot_for(self, image):
+        """Snapshot dùng chung cho cùng một đối tượng ảnh"""
+        snapshot = self.snapshots.get(id(image))
+        if snapshot is None or snapshot.image is not image:
+            snapshot = PixelSnapshot(image)
+            self.snapshots[id(image)] = snapshot
+        return snapshot
+
+    def push(self, base_image, adjustments, filter_values, edited_image=None, current_image=None):
+        """Thêm một bước; edited_image=None nghĩa là kết quả render lại được từ tham số"""
+        entry = {
+            'base': self._snapshot_for(base_image) if base_image is not None else None,
+            'adjustments': copy.deepcopy(adjustments),
+            'filter_values': copy.deepcopy(filter_values),
+            # Ảnh PIL không bị sửa tại chỗ nên giữ tham chiếu là đủ, không cần sao chép
+            'edited': PixelSnapshot(edited_image) if edited_image is not None else None,
+        }
+        self.entries.append(entry)
+        self.enforce_budget(current_image if current_image is not None else base_image)
+
+    def pop(self):
+        """Lấy bước gần nhất, trả về dict base_image/adjustments/filter_values/edited_image"""
+        if not self.entries:
+            return None
+        entry = self.entries.pop()
+        state = {
+            'base_image': entry['base'].load() if entry['base'] is not None else None,
+            'adjustments': entry['adjustments'],
+            'filter_values': entry['filter_values'],
+            'edited_image': entry['edited'].load() if entry['edited'] is not None else None,
+        }
+        self._release(entry)
+        return state
+
+    def clear(self):
+        self.entries = []
+        for snapshot in self.snapshots.values():
+            snapshot.discard()
+        self.snapshots = {}
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+
+    # ========== NGÂN SÁCH DUNG LƯỢNG ==========
+
+    def _all_snapshots(self):
+        """Các snapshot còn được tham chiếu, từ cũ đến mới, không trùng lặp"""
+        seen = set()
+        result = []
+        for entry in self.entries:
+            for snapshot in (entry['base'], entry['edited']):
+                if snapshot is not None and id(snapshot) not in seen:
+                    seen.add(id(snapshot))
+                    result.append(snapshot)
+        return result
+
+    def memory_bytes(self, current_image=None):
+        """RAM dùng cho lịch sử; ảnh gốc đang mở không tính vì vẫn phải giữ nó"""
+        total = len(self.entries) * _PARAMS_NBYTES
+        for snapshot in self._all_snapshots():
+            if current_image is not None and snapshot.image is current_image:
+                continue
+            total += snapshot.nbytes
+        return total
+
+    def disk_bytes(self):
+        return sum(snapshot.disk_bytes for snapshot in self._all_snapshots())
+
+    def enforce_budget(self, current_image=None):
+        """Nén, ghi ra đĩa rồi mới bỏ bước cũ nhất cho tới khi vừa ngân sách"""
+        while self.memory_bytes(current_image) > self.max_bytes:
+            if self._shrink_oldest(current_image):
+                continue
+            if not self.entries:
+                break
+            self._release(self.entries.pop(0))
+
+    def _shrink_oldest(self, current_image):
+        """Nén (hoặc ghi ra đĩa) ảnh cũ nhất còn chiếm RAM; False nếu không còn gì để làm"""
+        movable = [s for s in self._all_snapshots()
+                   if current_image is None or s.image is not current_image]
+        for snapshot in movable:
+            if snapshot.image is not None:
+                snapshot.compress()
+                return True
+
+        if not self.max_disk_bytes:
+            return False
+        disk_bytes = self.disk_bytes()
+        for snapshot in movable:
+            if snapshot.compressed is None:
+                continue
+            if disk_bytes + len(snapshot.compressed) > self.max_disk_bytes:
+                return False
+            if self.spill_dir is None:
+                self.spill_dir = tempfile.mkdtemp(prefix='image_editing_undo_')
+            snapshot.spill(self.spill_dir)
+            return True
+        return False
+
+    def _release(self, entry):
+        """Giải phóng các ảnh của một bước đã bị bỏ nếu không còn bước nào dùng chung"""
+        alive = {id(snapshot) for snapshot in self._all_snapshots()}
+        for snapshot in (entry['base'], entry['edited']):
+            if snapshot is None or id(snapshot) in alive:
+                continue
+            for key, indexed in list(self.snapshots.items()):
+                if indexed is snapshot:
+                    del self.snapshots[key]
+            snapshot.discard()
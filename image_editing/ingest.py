@@ -0,0 +1,174 @@
+"""
+Nạp ảnh lớn một lần vào bộ đệm raw ánh xạ bộ nhớ (memory-mapped) trên đĩa
+
+Ảnh lớn được giải mã một lần rồi ghi thành file raw trong thư mục cache; các
+lần mở sau (kể cả ở phiên làm việc khác) chỉ cần ánh xạ file đó vào bộ nhớ,
+không phải giải mã lại. Mảng trả về là np.memmap chỉ đọc nên pipeline và bộ xử
+lý theo dải đọc thẳng từ đó, không tạo bản sao. Cache được khóa theo đường dẫn,
+kích thước và thời điểm sửa file, có giới hạn dung lượng và xóa file ít dùng nhất.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Phần mở rộng file ảnh được nhận khi duyệt thư mục (xử lý hàng loạt, benchmark, nguồn khung)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "image_editing")
+
+# Các chế độ màu được lưu nguyên dạng; chế độ khác được chuyển sang RGB/RGBA
+_RAW_MODES = ('L', 'RGB', 'RGBA')
+
+
+class MemmapImageCache:
+    """Cache ảnh đã giải mã dưới dạng file raw + np.memmap"""
+
+    def __init__(self, cache_dir=None, max_bytes=4 * 1024 * 1024 * 1024,
+                 min_pixels=16 * 1000 * 1000):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        # Ảnh nhỏ hơn ngưỡng này giải mã trực tiếp, không cần cache
+        self.min_pixels = min_pixels
+
+    # ========== KHÓA VÀ ĐƯỜNG DẪN ==========
+
+    def cache_key(self, path):
+        stat = os.stat(path)
+        identity = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.raw', base + '.json'
+
+    # ========== ĐỌC / GHI ==========
+
+    def lookup(self, path):
+        """np.memmap của ảnh nếu đã có trong cache, ngược lại None"""
+        raw_path, meta_path = self._paths(self.cache_key(path))
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            array = np.memmap(raw_path, dtype=np.dtype(meta['dtype']), mode='r',
+                              shape=tuple(meta['shape']))
+        except (OSError, ValueError, KeyError):
+            return None
+        # Đánh dấu vừa được dùng để không bị xóa trước
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return array
+
+    def ingest(self, path):
+        """Giải mã ảnh một lần và ghi vào cache, trả về np.memmap chỉ đọc"""
+        key = self.cache_key(path)
+        raw_path, meta_path = self._paths(key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        with Image.open(path) as image:
+            if image.mode not in _RAW_MODES:
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            width, height = image.size
+            channels = len(image.getbands())
+            shape = (height, width) if channels == 1 else (height, width, channels)
+            self.evict(reserve=width * height * channels)
+
+            # Ghi ra file tạm rồi đổi tên để cache không bao giờ chứa file dở dang
+            temp_path = raw_path + '.part'
+            target = np.memmap(temp_path, dtype=np.uint8, mode='w+', shape=shape)
+            target[...] = np.asarray(image)
+            target.flush()
+            del target
+
+        os.replace(temp_path, raw_path)
+        meta = {'path': os.path.abspath(path), 'shape': list(shape), 'dtype': 'uint8'}
+        with open(meta_path + '.part', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.part', meta_path)
+        return np.memmap(raw_path, dtype=np.uint8, mode='r', shape=shape)
+
+    def load_array(self, path):
+        """Mảng pixel của ảnh: np.memmap cho ảnh lớn, mảng thường cho ảnh nhỏ"""
+        cached = self.lookup(path)
+        if cached is not None:
+            return cached
+        with Image.open(path) as image:
+            width, height = image.size
+            if width * height < self.min_pixels:
+                if image.mode not in _RAW_MODES:
+                    image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+                return np.asarray(image)
+        try:
+            return self.ingest(path)
+        except OSError as e:
+            # Không ghi được cache (hết chỗ, không có quyền): giải mã trực tiếp
+            logger.warning("Image cache unavailable, decoding %s directly: %s", path, e)
+            with Image.open(path) as image:
+                if image.mode not in _RAW_MODES:
+                    image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+                return np.asarray(image)
+
+    def open_image(self, path):
+        """Mở ảnh dưới dạng PIL; ảnh lớn được lấy từ cache thay vì giải mã lại.
+
+        Ảnh L/RGBA dùng chung bộ nhớ với memmap; ảnh RGB được PIL chép sang bộ nhớ
+        riêng (PIL lưu RGB 4 byte/pixel) nhưng vẫn không phải giải mã lại.
+        """
+        array = self.load_array(path)
+        if not isinstance(array, np.memmap):
+            return Image.fromarray(array)
+        height, width = array.shape[:2]
+        mode = 'L' if array.ndim == 2 else ('RGBA' if array.shape[2] == 4 else 'RGB')
+        return Image.frombuffer(mode, (width, height), array, 'raw', mode, 0, 1)
+
+    # ========== DỌN CACHE ==========
+
+    def entries(self):
+        """Danh sách (thời điểm dùng gần nhất, số byte, đường dẫn raw, đường dẫn meta)"""
+        result = []
+        if not os.path.isdir(self.cache_dir):
+            return result
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.cache_dir, name)
+            raw_path = meta_path[:-len('.json')] + '.raw'
+            try:
+                used_at = os.path.getmtime(meta_path)
+                nbytes = os.path.getsize(raw_path)
+            except OSError:
+                continue
+            result.append((used_at, nbytes, raw_path, meta_path))
+        return result
+
+    def total_bytes(self):
+        return sum(entry[1] for entry in self.entries())
+
+    def evict(self, reserve=0):
+        """Xóa các ảnh ít được dùng nhất cho tới khi còn chỗ cho reserve byte"""
+        entries = sorted(self.entries())
+        total = sum(entry[1] for entry in entries)
+        for _, nbytes, raw_path, meta_path in entries:
+            if total + reserve <= self.max_bytes:
+                break
+            for file_path in (meta_path, raw_path):
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            total -= nbytes
+
+    def clear(self):
+        for _, _, raw_path, meta_path in self.entries():
+            for file_path in (meta_path, raw_path):
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
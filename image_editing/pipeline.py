@@ -0,0 +1,344 @@
+"""
+Pipeline chỉnh sửa ảnh không phụ thuộc Tkinter
+
+Dùng chung cho giao diện, công cụ xử lý hàng loạt và các script: nhận ảnh nguồn
+cùng bộ tham số chỉnh sửa, trả về ảnh kết quả (PIL hoặc numpy array).
+
+Bên trong pipeline mọi công đoạn làm việc trên một mảng numpy liên tục; ảnh PIL
+chỉ được tạo ở ranh giới hiển thị/lưu file (to_image).
+"""
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from image_editing import (blur, derived, filter_chain, filters, geometry, presets, process_pool,
+                           tiling, tracing)
+from image_editing.stage_cache import StageCache
+from image_editing.tone import apply_tone_ops
+
+# Tham số chỉnh sửa mặc định (ảnh không thay đổi)
+DEFAULT_ADJUSTMENTS = {
+    'brightness': 1.0,
+    'color': 1.0,
+    'contrast': 1.0,
+    'sharpen': 1.0,
+    'blur': 0.0,
+    'rotation': 0.0,
+    'flip_horizontal': False,
+    'flip_vertical': False,
+    'filter': "Không",
+    # Các bộ lọc xếp chồng sau bộ lọc đang chọn: tuple các cặp (tên, cường độ)
+    'filter_stack': (),
+    'crop_box': None,
+}
+
+# Cường độ mặc định của từng bộ lọc (theo registry trong filters)
+DEFAULT_FILTER_VALUES = filters.default_intensities()
+
+
+class EditPipeline:
+    """Chạy chuỗi công đoạn enhance → filter → geometry (xoay, lật, cắt) trên mảng numpy.
+
+    Kết quả trung gian của từng công đoạn được giữ trong StageCache nên render
+    lại với tham số chỉ khác ở công đoạn cuối sẽ không phải chạy lại từ đầu.
+    """
+
+    def __init__(self, cache_bytes=512 * 1024 * 1024):
+        self.stage_cache = StageCache(max_bytes=cache_bytes)
+        self.proxy_source = None
+        # Ảnh từ số pixel này trở lên được lọc theo từng dải (None = luôn xử lý cả ảnh)
+        self.tile_threshold = tiling.DEFAULT_TILE_THRESHOLD
+        # Số luồng cho bộ lọc / preset chia dải (None = số nhân CPU, 1 = tuần tự)
+        self.workers = None
+        # Số process cho bộ lọc / preset chia dải trên ảnh lớn, dùng shared memory
+        # (0 = tắt, chỉ dùng luồng)
+        self.processes = process_pool.default_processes()
+        # Khi cắt ảnh, chỉ xử lý vùng nguồn cần thiết nếu vùng đó nhỏ hơn tỷ lệ này
+        # của ảnh (None = luôn xử lý cả ảnh)
+        self.region_threshold = 0.8
+        # Mảng numpy của ảnh nguồn PIL gần nhất (chỉ chuyển đổi một lần cho mỗi ảnh)
+        self.source_arrays = []
+        # Bộ đệm kết quả dùng lại giữa các lần render khi kết quả không được cache
+        self.buffer_pool = OrderedDict()
+        # Các bộ đệm do pool cấp phát (tham chiếu yếu, theo id)
+        self.pooled = weakref.WeakValueDictionary()
+        self.max_pooled_buffers = 8
+        self.lock = threading.Lock()
+
+    # ========== API CHÍNH ==========
+
+    def render_image(self, source, adjustments=None, filter_values=None, preset=None,
+                     variant=('full',), is_cancelled=None):
+        """Render ảnh nguồn (PIL hoặc numpy array) và trả về ảnh PIL.
+
+        adjustments/filter_values chỉ cần chứa các giá trị khác mặc định; preset
+        (tên trong presets.PRESETS hoặc dict cùng dạng) được áp dụng sau các chỉnh sửa.
+        """
+        result = self.render(source, adjustments, filter_values, preset, variant, is_cancelled)
+        if result is None:
+            return None
+        return self.to_image(result)
+
+    def render(self, source, adjustments=None, filter_values=None, preset=None,
+               variant=('full',), is_cancelled=None):
+        """Như render_image nhưng trả về numpy array.
+
+        Mảng trả về có thể là bộ đệm của pipeline: gọi to_image() hoặc
+        release_buffer() khi dùng xong để lần render sau dùng lại.
+        """
+        if isinstance(preset, str):
+            preset = presets.PRESETS[preset]
+        adj = dict(DEFAULT_ADJUSTMENTS)
+        if adjustments:
+            adj.update(adjustments)
+        values = filters.default_intensities()
+        if filter_values:
+            values.update(filter_values)
+
+        self.stage_cache.bind_source(source)
+        result = self.render_stages(source, adj, values, variant, is_cancelled)
+        if result is None or preset is None:
+            return result
+        with tracing.span('stage/preset'):
+            preset_result = presets.apply_preset_effects(result, preset, self.workers,
+                                                         self.processes)
+        self.release_buffer(result)
+        return preset_result
+
+    # ========== BỘ ĐỆM NUMPY ==========
+
+    def source_array(self, source):
+        """Mảng numpy của ảnh nguồn; ảnh PIL chỉ được chuyển đổi một lần"""
+        if isinstance(source, np.ndarray):
+            return source
+        with self.lock:
+            for image, array in self.source_arrays:
+                if image is source:
+                    return array
+        array = np.asarray(source)
+        with self.lock:
+            # Giữ ảnh gốc và proxy của nó
+            self.source_arrays = self.source_arrays[-1:] + [(source, array)]
+        return array
+
+    def acquire_buffer(self, shape, dtype=np.uint8):
+        """Lấy một bộ đệm cùng kích thước từ pool (hoặc cấp phát mới)"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            buffers = self.buffer_pool.get(key)
+            buffer = buffers.pop() if buffers else None
+        if buffer is not None:
+            # Nội dung cũ sắp bị ghi đè
+            derived.invalidate(buffer)
+            return buffer
+        buffer = np.empty(shape, dtype=dtype)
+        with self.lock:
+            self.pooled[id(buffer)] = buffer
+        return buffer
+
+    def release_buffer(self, buffer):
+        """Trả bộ đệm về pool; mảng không phải của pool được bỏ qua"""
+        if not isinstance(buffer, np.ndarray):
+            return
+        with self.lock:
+            if self.pooled.get(id(buffer)) is not buffer:
+                return
+            key = (buffer.shape, buffer.dtype.str)
+            buffers = self.buffer_pool.setdefault(key, [])
+            if any(b is buffer for b in buffers):
+                return
+            buffers.append(buffer)
+            self.buffer_pool.move_to_end(key)
+            while sum(len(b) for b in self.buffer_pool.values()) > self.max_pooled_buffers:
+                _, old = self.buffer_pool.popitem(last=False)
+                for b in old:
+                    self.pooled.pop(id(b), None)
+
+    def disown_buffer(self, buffer):
+        """Bộ đệm đã được giao cho cache, không được dùng lại nữa"""
+        with self.lock:
+            if self.pooled.get(id(buffer)) is buffer:
+                del self.pooled[id(buffer)]
+
+    def to_image(self, result):
+        """Chuyển kết quả render sang ảnh PIL (ranh giới hiển thị/lưu) và trả bộ đệm về pool"""
+        image = Image.fromarray(result)
+        if getattr(image, 'readonly', 0):
+            # Ảnh L/RGBA dùng chung bộ nhớ với mảng nên bộ đệm không được dùng lại
+            self.disown_buffer(result)
+        else:
+            self.release_buffer(result)
+        return image
+
+    def make_proxy(self, image, target):
+        """Trả về bản thu nhỏ (cạnh dài tối đa target) của ảnh, có cache cho ảnh gần nhất"""
+        if max(image.size) <= target:
+            return image
+
+        # Gọi từ luồng render nền trong khi giao diện có thể xóa cache proxy
+        with self.lock:
+            cached = self.proxy_source
+        if cached is not None and cached[0] is image and cached[1] == target:
+            return cached[2]
+
+        proxy = image.copy()
+        proxy.thumbnail((target, target), Image.Resampling.LANCZOS)
+        with self.lock:
+            self.proxy_source = (image, target, proxy)
+        return proxy
+
+    def clear_proxy(self):
+        """Bỏ bản thu nhỏ đã cache (ví dụ khi đổi kích thước proxy)"""
+        with self.lock:
+            self.proxy_source = None
+
+    # ========== CÁC CÔNG ĐOẠN ==========
+
+    def get_stages(self, adj, filter_values, source, kernel_scale=1.0):
+        """Danh sách công đoạn (tên, tham số, hàm xử lý) theo đúng thứ tự pipeline.
+
+        source là mảng numpy của ảnh nguồn. kernel_scale < 1 (ảnh proxy) thu nhỏ bán
+        kính blur và kernel của các bộ lọc kernel_scalable theo cùng tỷ lệ với ảnh.
+        """
+        chain = filter_chain.build_chain(adj, filter_values)
+        blur_radius = adj['blur']
+        if kernel_scale < 1:
+            chain = filter_chain.scale_kernels(chain, kernel_scale)
+            blur_radius *= kernel_scale
+        source_size = (source.shape[1], source.shape[0])
+        region = self.plan_region(source_size, adj, chain, blur_radius)
+        region_offset = region[:2] if region else (0, 0)
+        # Contrast trên một vùng vẫn phải dùng độ sáng trung bình của cả ảnh
+        mean_reference = source if region else None
+
+        def enhance_stage(image, *params):
+            return self.apply_enhance_stage(image, *params, mean_reference=mean_reference)
+
+        return [
+            ('region', (region,), self.apply_region_stage),
+            ('enhance', (adj['brightness'], adj['color'], adj['contrast'],
+                         adj['sharpen'], blur_radius), enhance_stage),
+            ('filter', (chain,), self.apply_filter_stage),
+            ('geometry', (adj['rotation'], adj['flip_horizontal'], adj['flip_vertical'],
+                          adj.get('crop_box'), source_size, region_offset),
+             self.apply_geometry_stage),
+        ]
+
+    def plan_region(self, size, adj, chain, blur_radius):
+        """Vùng ảnh nguồn mà vùng cắt cần (đã gồm halo của blur/sharpen/chuỗi bộ lọc), None = cả ảnh"""
+        if not adj.get('crop_box') or self.region_threshold is None:
+            return None
+        halo = filter_chain.chain_halo(chain, roi=True)
+        if halo is None:
+            # Bộ lọc phụ thuộc toàn ảnh
+            return None
+        if adj['sharpen'] != 1.0:
+            halo += 1
+        if blur_radius > 0:
+            halo += blur.gaussian_halo(blur_radius)
+
+        width, height = size
+        region = geometry.source_region(width, height, adj['rotation'], adj['flip_horizontal'],
+                                        adj['flip_vertical'], adj['crop_box'], margin=halo)
+        if region is None:
+            return None
+        left, top, right, bottom = region
+        if (right - left) * (bottom - top) > self.region_threshold * width * height:
+            return None
+        return region
+
+    def render_stages(self, source, adj, filter_values, variant=('full',), is_cancelled=None,
+                      kernel_scale=1.0):
+        """Chạy pipeline, dùng lại kết quả đã cache của các công đoạn không đổi.
+
+        source là ảnh PIL hoặc mảng numpy; kết quả luôn là mảng numpy (có thể là
+        bộ đệm của pool, xem to_image). kernel_scale: tỷ lệ của source so với ảnh
+        gốc khi source là proxy (xem get_stages).
+        """
+        source = self.source_array(source)
+        stages = self.get_stages(adj, filter_values, source, kernel_scale)
+
+        keys = []
+        key = (variant,)
+        for name, params, _ in stages:
+            key = key + ((name, params),)
+            keys.append(key)
+
+        # Tìm công đoạn sâu nhất đã có trong cache
+        result = source
+        start = 0
+        for index in range(len(stages) - 1, -1, -1):
+            cached = self.stage_cache.get(keys[index])
+            if cached is not None:
+                result = cached
+                start = index + 1
+                break
+
+        # Bộ đệm trung gian không được cache, trả lại pool khi render xong
+        scratch = []
+        for index in range(start, len(stages)):
+            # Bỏ dở nếu đã có yêu cầu render mới hơn
+            if is_cancelled is not None and is_cancelled():
+                for buffer in scratch:
+                    self.release_buffer(buffer)
+                return None
+            name, params, stage_func = stages[index]
+            with tracing.span('stage/' + name, variant=variant[0]):
+                stage_result = stage_func(result, *params)
+            # Công đoạn không thay đổi ảnh thì không cần lưu thêm bản sao
+            if stage_result is not result:
+                if self.stage_cache.put(keys[index], stage_result):
+                    self.disown_buffer(stage_result)
+                else:
+                    scratch.append(stage_result)
+            result = stage_result
+
+        for buffer in scratch:
+            if buffer is not result:
+                self.release_buffer(buffer)
+        return result if result is not source else source.copy()
+
+    def apply_region_stage(self, img_array, region):
+        if region is None:
+            return img_array
+        left, top, right, bottom = region
+        # Chỉ là view của mảng nguồn, không sao chép
+        return img_array[top:bottom, left:right]
+
+    def apply_enhance_stage(self, img_array, brightness, color, contrast, sharpen, blur_radius,
+                            mean_reference=None):
+        result = img_array
+        if (brightness, color, contrast, sharpen) != (1.0, 1.0, 1.0, 1.0):
+            out = self.acquire_buffer(img_array.shape, img_array.dtype)
+            result = apply_tone_ops(img_array, [('brightness', brightness), ('color', color),
+                                                ('contrast', contrast), ('sharpness', sharpen)],
+                                    mean_reference, out=out)
+            if result is not out:
+                self.release_buffer(out)
+        if blur_radius > 0:
+            out = self.acquire_buffer(result.shape, result.dtype)
+            blurred = blur.gaussian_blur(result, blur_radius, out=out)
+            if result is not img_array:
+                self.release_buffer(result)
+            result = blurred
+        return result
+
+    def apply_filter_stage(self, img_array, chain):
+        if not chain:
+            return img_array
+        # Ảnh lớn: chia dải trên nhiều luồng, bộ nhớ tạm của bộ lọc chỉ bằng
+        # một dải cho mỗi luồng thay vì cả ảnh
+        return filter_chain.apply_chain(img_array, chain, self.workers, self.tile_threshold,
+                                        self.processes)
+
+    def apply_geometry_stage(self, img_array, rotation, flip_horizontal, flip_vertical, crop_box,
+                             source_size, region_offset):
+        """Xoay + lật + cắt trong một lần lấy mẫu, chỉ tính các pixel nằm trong vùng cắt"""
+        if rotation == 0.0 and not flip_horizontal and not flip_vertical and not crop_box:
+            return img_array
+        return geometry.warp_geometry(img_array, rotation, flip_horizontal, flip_vertical,
+                                      crop_box, source_size=source_size,
+                                      region_offset=region_offset)
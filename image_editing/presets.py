@@ -0,0 +1,352 @@
+"""
+Định nghĩa preset và các hiệu ứng của preset (không phụ thuộc Tkinter)
+"""
+import cv2
+import numpy as np
+
+from image_editing import blur, derived, process_pool, tiling
+from image_editing.tone import apply_tone_ops, enhance_image
+
+# Bán kính ảnh hưởng dùng khi chia dải cho các hiệu ứng có kernel lân cận.
+SOFT_FOCUS_SIGMA = 3
+SOFT_FOCUS_HALO = blur.gaussian_halo(SOFT_FOCUS_SIGMA)
+
+
+# Định nghĩa các preset
+PRESETS = {
+    'Vintage': {
+        'description': 'Hiệu ứng cổ điển với tone màu vàng nâu',
+        'brightness': 0.95,
+        'contrast': 1.1,
+        'saturation': 0.85,
+        'color': (1.0, 0.9, 0.8),  # RGB multipliers
+        'vignette': 0.3,
+        'grain': 0.1,
+        'sepia': 0.3
+    },
+    'Noir': {
+        'description': 'Ảnh đen trắng cổ điển film noir',
+        'brightness': 0.9,
+        'contrast': 1.3,
+        'saturation': 0.0,  # Black & white
+        'color': (1.0, 1.0, 1.0),
+        'vignette': 0.4,
+        'grain': 0.15,
+        'high_contrast': True
+    },
+    'Cinematic': {
+        'description': 'Hiệu ứng điện ảnh với màu xanh đặc trưng',
+        'brightness': 0.9,
+        'contrast': 1.25,
+        'saturation': 1.1,
+        'color': (0.9, 1.0, 1.2),  # Tăng blue, giảm red
+        'vignette': 0.25,
+        'blacks': 0.1,  # Tăng màu đen
+        'cinematic_lut': True
+    },
+    'Warm Sunshine': {
+        'description': 'Ánh nắng ấm áp vàng cam',
+        'brightness': 1.15,
+        'contrast': 1.1,
+        'saturation': 1.2,
+        'color': (1.3, 1.1, 0.9),  # Tăng đỏ và vàng
+        'vignette': 0.1,
+        'glow': 0.2
+    },
+    'Cool Blue': {
+        'description': 'Tone màu xanh mát lạnh',
+        'brightness': 1.05,
+        'contrast': 1.15,
+        'saturation': 0.95,
+        'color': (0.8, 0.9, 1.3),  # Tăng xanh dương
+        'vignette': 0.2,
+        'temperature': -20  # Lạnh hơn
+    },
+    'Retro 80s': {
+        'description': 'Phong cách những năm 80 với màu neon',
+        'brightness': 1.1,
+        'contrast': 1.3,
+        'saturation': 1.4,
+        'color': (1.2, 0.9, 1.3),  # Tăng hồng và xanh
+        'grain': 0.08,
+        'glitch': 0.05,
+        'vibrant': True
+    },
+    'Moody Dark': {
+        'description': 'Tâm trạng u tối với tone tối',
+        'brightness': 0.7,
+        'contrast': 1.4,
+        'saturation': 0.8,
+        'color': (0.9, 0.9, 1.0),
+        'vignette': 0.5,
+        'shadows': 0.3,
+        'moody': True
+    },
+    'Spring Bloom': {
+        'description': 'Mùa xuân với màu pastel và hoa',
+        'brightness': 1.2,
+        'contrast': 1.0,
+        'saturation': 1.3,
+        'color': (1.1, 1.3, 0.9),  # Tăng xanh lá
+        'vibrance': 0.3,
+        'bloom': 0.15
+    },
+    'Autumn Gold': {
+        'description': 'Mùa thu vàng rực',
+        'brightness': 1.05,
+        'contrast': 1.2,
+        'saturation': 1.25,
+        'color': (1.4, 1.1, 0.7),  # Vàng cam
+        'vignette': 0.15,
+        'warmth': 0.4
+    },
+    'Urban Grunge': {
+        'description': 'Hiệu ứng đô thị với tone xám và hạt',
+        'brightness': 0.85,
+        'contrast': 1.35,
+        'saturation': 0.7,
+        'color': (1.0, 0.95, 0.9),
+        'grain': 0.2,
+        'texture': 0.1,
+        'grunge': True
+    },
+    'Dreamy Soft': {
+        'description': 'Hiệu ứng mơ màng nhẹ nhàng',
+        'brightness': 1.1,
+        'contrast': 0.9,
+        'saturation': 0.8,
+        'color': (1.05, 1.0, 1.1),
+        'blur': 0.05,
+        'glow': 0.3,
+        'soft_focus': True
+    },
+    'HDR Pro': {
+        'description': 'HDR mạnh với chi tiết cao',
+        'brightness': 1.0,
+        'contrast': 1.5,
+        'saturation': 1.15,
+        'color': (1.0, 1.0, 1.0),
+        'clarity': 0.4,
+        'sharpen': 1.3,
+        'hdr': True
+    }
+}
+
+
+def _map_effect(func, img_array, halo, args, workers=None, processes=None, with_rows=False):
+    """Chạy hiệu ứng func(dải, *args) theo dải trên process pool nếu được bật, ngược lại trên luồng"""
+    if process_pool.use_processes(img_array, processes):
+        return process_pool.map_strips(func, img_array, halo, args, processes, with_rows)
+    return tiling.map_parallel(lambda strip, *rows: func(strip, *rows, *args), img_array, halo,
+                               workers, with_rows=with_rows)
+
+
+def apply_preset_effects(image, preset, workers=None, processes=None):
+    """Áp dụng các hiệu ứng của preset lên ảnh PIL hoặc numpy array, trả về numpy array.
+
+    workers là số luồng cho các hiệu ứng chia dải (None = số nhân CPU); processes
+    > 1 chuyển các hiệu ứng chia dải sang process pool (xem process_pool).
+    """
+    # 1. Điều chỉnh brightness, contrast, saturation
+    brightness = preset.get('brightness', 1.0)
+    contrast = preset.get('contrast', 1.0)
+    saturation = preset.get('saturation', 1.0)
+
+    # Áp dụng bằng engine tone gộp một lượt
+    ops = [('brightness', brightness), ('contrast', contrast), ('color', saturation)]
+    if isinstance(image, np.ndarray):
+        img_array = apply_tone_ops(image, ops)
+    else:
+        img_array = np.array(enhance_image(image, ops))
+
+    # 2. Điều chỉnh màu sắc (color balance)
+    color_mult = preset.get('color', (1.0, 1.0, 1.0))
+    if len(img_array.shape) == 3:
+        img_array = img_array.astype(np.float32)
+        img_array[:, :, 0] = np.clip(img_array[:, :, 0] * color_mult[0], 0, 255)
+        img_array[:, :, 1] = np.clip(img_array[:, :, 1] * color_mult[1], 0, 255)
+        img_array[:, :, 2] = np.clip(img_array[:, :, 2] * color_mult[2], 0, 255)
+        img_array = img_array.astype(np.uint8)
+
+    # 3. Vignette effect
+    vignette = preset.get('vignette', 0.0)
+    if vignette > 0 and len(img_array.shape) == 3:
+        img_array = apply_vignette(img_array, vignette, workers, processes)
+
+    # 4. Grain effect
+    grain = preset.get('grain', 0.0)
+    if grain > 0:
+        img_array = apply_grain(img_array, grain, processes)
+
+    # 5. Sepia (cho vintage)
+    sepia = preset.get('sepia', 0.0)
+    if sepia > 0 and len(img_array.shape) == 3:
+        img_array = apply_sepia(img_array, sepia, workers, processes)
+
+    # 6. Hiệu ứng đặc biệt theo preset
+    if preset.get('cinematic_lut', False):
+        img_array = apply_cinematic_lut(img_array)
+
+    if preset.get('soft_focus', False):
+        img_array = apply_soft_focus(img_array, workers, processes)
+
+    if preset.get('grunge', False):
+        img_array = apply_grunge_effect(img_array)
+
+    if preset.get('hdr', False):
+        img_array = apply_hdr_effect(img_array)
+
+    return img_array
+
+
+def apply_vignette(img_array, strength=0.3, workers=None, processes=None):
+    """Áp dụng hiệu ứng vignette (tối góc ảnh)"""
+    return _map_effect(_vignette, img_array, 0, (strength, img_array.shape[0]), workers,
+                       processes, with_rows=True)
+
+
+def _vignette(img_array, row0, strength, height):
+    """Vignette cho các hàng row0.. của ảnh cao height"""
+    h, w = height, img_array.shape[1]
+
+    # Tạo mask vignette (ellipse)
+    X, Y = np.ogrid[row0:row0 + img_array.shape[0], :w]
+    center_x, center_y = w // 2, h // 2
+    radius_x, radius_y = w / 2, h / 2
+
+    # Tính khoảng cách từ mỗi pixel đến tâm
+    mask = ((X - center_y) / radius_y) ** 2 + ((Y - center_x) / radius_x) ** 2
+    mask = np.clip(1 - mask * strength, 0, 1)
+
+    # Áp dụng mask cho từng channel
+    if len(img_array.shape) == 3:
+        mask = mask[:, :, np.newaxis]
+        result = (img_array.astype(np.float32) * mask).astype(np.uint8)
+    else:
+        result = (img_array.astype(np.float32) * mask).astype(np.uint8)
+
+    return result
+
+
+def apply_grain(img_array, strength=0.1, processes=None):
+    """Thêm grain/film noise"""
+    # Nhiễu ngẫu nhiên nên chia dải trên process không làm kết quả kém đi; trên
+    # luồng thì giữ một lượt để chuỗi số ngẫu nhiên không phụ thuộc thứ tự luồng
+    if process_pool.use_processes(img_array, processes):
+        return process_pool.map_strips(_grain, img_array, 0, (strength,), processes)
+    return _grain(img_array, strength)
+
+
+def _grain(img_array, strength):
+    noise = np.random.randn(*img_array.shape) * 255 * strength
+    result = np.clip(img_array.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+    return result
+
+
+def apply_sepia(img_array, strength=0.5, workers=None, processes=None):
+    """Áp dụng hiệu ứng sepia"""
+    if len(img_array.shape) != 3:
+        return img_array
+    return _map_effect(_sepia, img_array, 0, (strength,), workers, processes)
+
+
+def _sepia(img_array, strength):
+    # Sepia matrix
+    sepia_filter = np.array([
+        [0.393, 0.769, 0.189],
+        [0.349, 0.686, 0.168],
+        [0.272, 0.534, 0.131]
+    ])
+
+    # Blend với ảnh gốc theo strength
+    sepia_result = img_array.dot(sepia_filter.T)
+    sepia_result = np.clip(sepia_result, 0, 255)
+
+    result = (img_array * (1 - strength) + sepia_result * strength).astype(np.uint8)
+    return result
+
+
+def apply_cinematic_lut(img_array):
+    """Áp dụng LUT cinematic (teal & orange)"""
+    if len(img_array.shape) != 3:
+        return img_array
+
+    # Tăng contrast và saturation
+    l, a, b = cv2.split(derived.lab(img_array))
+
+    # Tăng contrast cho L channel
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+    l = clahe.apply(l)
+
+    # Điều chỉnh màu teal & orange
+    a = a.astype(np.float32)
+    b = b.astype(np.float32)
+
+    # Tăng màu cam (giảm xanh dương, tăng vàng)
+    b = np.clip(b * 1.1, 0, 255)
+    a = np.clip(a * 0.9, 0, 255)
+
+    lab = cv2.merge((l, a.astype(np.uint8), b.astype(np.uint8)))
+    result = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
+
+    return result
+
+
+def apply_soft_focus(img_array, workers=None, processes=None):
+    """Hiệu ứng soft focus/dreamy"""
+    if len(img_array.shape) != 3:
+        return img_array
+    return _map_effect(_soft_focus, img_array, SOFT_FOCUS_HALO, (), workers, processes)
+
+
+def _soft_focus(img_array):
+    # Làm mờ nhẹ
+    blurred = blur.gaussian_blur(img_array, SOFT_FOCUS_SIGMA)
+
+    # Blend với ảnh gốc
+    alpha = 0.7
+    result = cv2.addWeighted(img_array, alpha, blurred, 1 - alpha, 0)
+
+    return result
+
+
+def apply_grunge_effect(img_array):
+    """Hiệu ứng urban grunge"""
+    if len(img_array.shape) != 3:
+        return img_array
+
+    # Tăng contrast
+    l, a, b = cv2.split(derived.lab(img_array))
+    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
+    l = clahe.apply(l)
+    lab = cv2.merge((l, a, b))
+
+    result = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
+    result = cv2.cvtColor(result, cv2.COLOR_RGB2HSV)
+    result = cv2.cvtColor(result, cv2.COLOR_HSV2RGB)
+
+    return result
+
+
+def apply_hdr_effect(img_array):
+    """Hiệu ứng HDR mạnh (chạy trên cả ảnh, không chia dải)"""
+    if len(img_array.shape) != 3:
+        return img_array
+
+    # Tone mapping để tăng dynamic range
+    l, a, b = cv2.split(derived.lab(img_array))
+
+    # CLAHE mạnh
+    clahe = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(8,8))
+    l = clahe.apply(l)
+
+    # Tăng saturation
+    lab = cv2.merge((l, a, b))
+    result = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
+
+    # Local contrast enhancement. Bộ lọc đệ quy (domain transform) của detailEnhance
+    # lan truyền theo cả hàng/cột nên không có halo nào cho kết quả chia dải giống
+    # hệt; chạy một lần trên cả ảnh như CLAHE ở trên
+    result = cv2.detailEnhance(result, sigma_s=10, sigma_r=0.15)
+
+    return result
@@ -0,0 +1,182 @@
+"""
+Xử lý theo dải trên nhiều process, ảnh nguồn và kết quả nằm trong shared memory
+
+Luồng (tiling.map_strips) chỉ chạy song song ở những đoạn nhả GIL; các phép
+toán numpy cấp Python như vòng lặp từng kênh của bộ lọc Chi Tiết hay phép nhân
+float của vignette/grain vẫn bị GIL giới hạn. Ở đây ảnh nguồn được chép một lần
+vào một block multiprocessing.shared_memory, kết quả được cấp phát trong một
+block khác; mỗi process chỉ nhận mô tả (tên block, shape, dtype), vị trí dải và
+tham số, tự ghi dải kết quả vào block đích. Không ảnh nào bị pickle.
+
+Tắt mặc định. Bật bằng EditPipeline.processes = N, tham số --strip-processes của
+công cụ hàng loạt, hoặc biến môi trường IMAGE_EDITING_PROCESSES=N. Hàm xử lý dải
+phải là hàm cấp module (pickle được theo tên) và trả về ảnh cùng shape/dtype.
+"""
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from image_editing import filters, tiling, tracing
+
+# Biến môi trường chứa số process mặc định (0 hoặc không đặt = tắt)
+PROCESSES_ENV = 'IMAGE_EDITING_PROCESSES'
+
+# Ảnh nhỏ hơn ngưỡng này xử lý trong process hiện tại (chi phí chép và gửi dải lớn hơn lợi ích)
+PROCESS_MIN_PIXELS = 4 * 1024 * 1024
+
+_pool = None
+_pool_processes = 0
+_pool_lock = threading.Lock()
+
+
+class SharedArray:
+    """Mảng numpy nằm trong một block shared memory"""
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+        if self.owner:
+            nbytes = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)
+
+    @classmethod
+    def from_array(cls, img_array):
+        shared = cls(img_array.shape, img_array.dtype)
+        shared.array[...] = img_array
+        return shared
+
+    @classmethod
+    def attach(cls, descriptor):
+        name, shape, dtype = descriptor
+        return cls(shape, dtype, name)
+
+    @property
+    def descriptor(self):
+        return self.shm.name, self.shape, self.dtype.str
+
+    def close(self):
+        """Đóng block (và xóa nếu là block do process này tạo); mảng không dùng được nữa"""
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def detach(self):
+        """Trả về mảng; block được giải phóng khi mảng (và mọi view của nó) không còn dùng"""
+        img_array = self.array
+        self.array = None
+        if self.owner:
+            # Trên POSIX bộ nhớ vẫn còn tới khi bỏ ánh xạ, chỉ tên bị xóa
+            self.shm.unlink()
+            self.owner = False
+        weakref.finalize(img_array, self.shm.close)
+        return img_array
+
+
+# ========== PROCESS POOL ==========
+
+def default_processes():
+    try:
+        return max(0, int(os.environ.get(PROCESSES_ENV, '0')))
+    except ValueError:
+        return 0
+
+
+def get_pool(processes):
+    """Process pool dùng chung; tạo lại khi số process thay đổi"""
+    global _pool, _pool_processes
+    with _pool_lock:
+        if _pool is None or _pool_processes != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: không fork process đang có luồng giao diện / thread pool
+            _pool = ProcessPoolExecutor(max_workers=processes,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_processes = processes
+        return _pool
+
+
+def shutdown():
+    global _pool, _pool_processes
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+        _pool_processes = 0
+
+
+def use_processes(img_array, processes=None, min_pixels=PROCESS_MIN_PIXELS):
+    """Số process nên dùng cho ảnh này (0 = xử lý trong process hiện tại)"""
+    if processes is None:
+        processes = default_processes()
+    if processes <= 1 or img_array.shape[0] * img_array.shape[1] < min_pixels:
+        return 0
+    return processes
+
+
+# ========== CHIA DẢI ==========
+
+def _run_strip(func, args, source, target, strip, with_rows):
+    """Chạy trong process con: xử lý một dải của block nguồn, ghi vào block đích"""
+    y0, y1, in0, in1 = strip
+    src = SharedArray.attach(source)
+    dst = SharedArray.attach(target)
+    try:
+        if with_rows:
+            result = func(src.array[in0:in1], in0, *args)
+        else:
+            result = func(src.array[in0:in1], *args)
+        dst.array[y0:y1] = result[y0 - in0:y1 - in0]
+        # Bỏ mọi tham chiếu tới bộ nhớ chung trước khi đóng block
+        del result
+    finally:
+        src.close()
+        dst.close()
+
+
+def map_strips(func, img_array, halo, args=(), processes=None, with_rows=False):
+    """Như tiling.map_strips nhưng mỗi dải chạy trên một process: func(dải, *args).
+
+    with_rows=True gọi func(dải, hàng đầu của dải trong ảnh, *args) cho hiệu ứng
+    phụ thuộc vị trí. Kết quả là mảng trong shared memory, tự giải phóng khi
+    không còn được dùng.
+    """
+    processes = processes or default_processes() or tiling.default_workers()
+    strip_rows = tiling.parallel_strip_rows(img_array, halo, processes)
+    strips = list(tiling.iter_strips(img_array.shape[0], strip_rows, halo))
+    with tracing.span('process/map_strips', strips=len(strips), processes=processes):
+        source = SharedArray.from_array(img_array)
+        target = SharedArray(img_array.shape, img_array.dtype)
+        try:
+            pool = get_pool(processes)
+            futures = [pool.submit(_run_strip, func, args, source.descriptor, target.descriptor,
+                                   strip, with_rows)
+                       for strip in strips]
+            # Chờ mọi dải xong (kể cả khi có dải lỗi) rồi mới đóng các block
+            wait(futures)
+            for future in futures:
+                # Lỗi trong process con được ném lại ở đây
+                future.result()
+        except BaseException:
+            target.close()
+            raise
+        finally:
+            source.close()
+    return target.detach()
+
+
+def apply_filter(img_array, filter_name, intensity, processes=None):
+    """Như filters.apply_filter nhưng chia dải trên nhiều process (bộ lọc cần toàn ảnh chạy tại chỗ)"""
+    halo = filters.filter_halo(filter_name, intensity)
+    if halo is None:
+        return filters.apply_filter(img_array, filter_name, intensity)
+    return map_strips(filters.apply_filter, img_array, halo, (filter_name, intensity), processes)
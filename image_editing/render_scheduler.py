@@ -0,0 +1,127 @@
+"""
+Bộ lập lịch render nền: chỉ render yêu cầu mới nhất, bỏ qua các yêu cầu cũ
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class RenderScheduler:
+    """Gộp các yêu cầu render từ slider và chạy yêu cầu mới nhất trên thread riêng.
+
+    Kết quả được trả về main thread của Tk qua root.after; kết quả của yêu cầu
+    đã cũ (có yêu cầu mới hơn hoặc đã bị hủy) sẽ bị bỏ qua. Lỗi khi render được
+    ghi log và chuyển về main thread theo cùng cách, qua on_error(exception).
+    """
+
+    def __init__(self, root, render_func, on_done, history_size=120, on_error=None):
+        self.root = root
+        self.render_func = render_func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.pending = None
+        self.in_flight = None
+        self.worker = None
+        self.running = True
+        self.dropped = 0
+        # Độ trễ từ lúc nhận input đến lúc ảnh hiện lên canvas (giây)
+        self.latencies = deque(maxlen=history_size)
+        self.last_latency = None
+
+    def request(self, job):
+        """Đưa một yêu cầu render vào hàng đợi, thay thế yêu cầu đang chờ"""
+        with self.condition:
+            self.generation += 1
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = (self.generation, job, time.perf_counter())
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, daemon=True)
+                self.worker.start()
+            self.condition.notify()
+
+    def cancel(self):
+        """Hủy yêu cầu đang chờ và làm cũ yêu cầu đang render"""
+        with self.condition:
+            self.generation += 1
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = None
+
+    def is_busy(self):
+        with self.condition:
+            return self.pending is not None or self.in_flight is not None
+
+    def is_stale(self, generation):
+        return generation != self.generation
+
+    def shutdown(self):
+        with self.condition:
+            self.running = False
+            self.pending = None
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                generation, job, requested_at = self.pending
+                self.pending = None
+                self.in_flight = generation
+
+            error = None
+            try:
+                result = self.render_func(job, lambda: self.is_stale(generation))
+            except Exception as e:
+                logger.exception("Render error")
+                error = e
+                result = None
+
+            with self.condition:
+                self.in_flight = None
+                if error is None and (result is None or self.is_stale(generation)):
+                    self.dropped += 1
+                    continue
+            try:
+                if error is not None:
+                    self.root.after(0, lambda g=generation, e=error: self._deliver_error(g, e))
+                else:
+                    self.root.after(0, lambda g=generation, r=result, t=requested_at:
+                                    self._deliver(g, r, t))
+            except RuntimeError:
+                # Cửa sổ Tk đã bị đóng
+                return
+
+    def _deliver(self, generation, result, requested_at):
+        """Chạy trên main thread: cập nhật ảnh nếu kết quả vẫn còn mới nhất"""
+        if self.is_stale(generation):
+            self.dropped += 1
+            return
+        self.on_done(result)
+        self.last_latency = time.perf_counter() - requested_at
+        self.latencies.append(self.last_latency)
+
+    def _deliver_error(self, generation, error):
+        """Chạy trên main thread: báo lỗi nếu không có yêu cầu mới hơn thay thế"""
+        if self.is_stale(generation):
+            self.dropped += 1
+            return
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def latency_stats(self):
+        """Trả về (trung vị, p95) độ trễ input-to-pixels tính bằng mili giây"""
+        if not self.latencies:
+            return None
+        values = sorted(self.latencies)
+        median = values[len(values) // 2]
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        return median * 1000.0, p95 * 1000.0
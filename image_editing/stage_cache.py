@@ -0,0 +1,76 @@
+"""
+Cache kết quả trung gian theo từng công đoạn của pipeline chỉnh sửa ảnh
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def estimate_nbytes(image):
+    """Ước lượng dung lượng bộ nhớ (byte) của ảnh PIL hoặc numpy array"""
+    if isinstance(image, np.ndarray):
+        return image.nbytes
+    width, height = image.size
+    return width * height * len(image.getbands())
+
+
+class StageCache:
+    """Cache LRU có giới hạn dung lượng cho ảnh sau mỗi công đoạn.
+
+    Khóa của mỗi công đoạn gồm tham số của công đoạn đó và tất cả công đoạn
+    trước nó, nên thay đổi một slider chỉ làm mất hiệu lực các công đoạn phía sau.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, max_entry_fraction=0.5):
+        self.max_bytes = max_bytes
+        # Một ảnh lớn hơn tỷ lệ này của ngân sách sẽ không được cache
+        self.max_entry_fraction = max_entry_fraction
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.source = None
+        self.hits = 0
+        self.misses = 0
+        # Cache được dùng chung giữa main thread và thread render nền
+        self.lock = threading.RLock()
+
+    def bind_source(self, source):
+        """Gắn cache với ảnh nguồn; đổi ảnh nguồn sẽ xóa toàn bộ cache"""
+        with self.lock:
+            if source is not self.source:
+                self.clear()
+                self.source = source
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, image):
+        """Lưu ảnh vào cache; trả về False nếu ảnh quá lớn để cache"""
+        nbytes = estimate_nbytes(image)
+        if nbytes > self.max_bytes * self.max_entry_fraction:
+            return False
+        with self.lock:
+            if key in self.entries:
+                self.current_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (image, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes and self.entries:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+            self.source = None
+
+    def __len__(self):
+        return len(self.entries)
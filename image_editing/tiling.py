@@ -0,0 +1,156 @@
+"""
+Xử lý ảnh theo từng dải ngang có vùng chồng lấn (halo), tuần tự hoặc song song
+
+Mỗi dải được mở rộng thêm `halo` hàng ở trên và dưới bằng dữ liệu thật của ảnh,
+xử lý như một ảnh nhỏ rồi cắt bỏ phần halo. Với halo không nhỏ hơn bán kính
+kernel, kết quả giống hệt xử lý cả ảnh, còn các mảng tạm (float32/float64) của
+bộ lọc chỉ lớn bằng một dải thay vì cả ảnh.
+
+Các dải độc lập với nhau nên có thể chạy trên nhiều luồng: OpenCV (và phần lớn
+phép toán numpy trên mảng lớn) nhả GIL trong lúc tính nên các luồng chạy song
+song thật trên nhiều nhân.
+"""
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from image_editing import filters
+
+# Dung lượng đầu vào tối đa của một dải (byte)
+DEFAULT_STRIP_BYTES = 32 * 1024 * 1024
+
+# Ảnh có số pixel từ ngưỡng này trở lên mới cần xử lý theo dải
+DEFAULT_TILE_THRESHOLD = 16 * 1000 * 1000
+
+# Ảnh nhỏ hơn ngưỡng này xử lý trên một luồng (chi phí chia dải lớn hơn lợi ích)
+PARALLEL_MIN_PIXELS = 512 * 1024
+
+# Số dải cho mỗi luồng để cân bằng tải khi các dải xử lý nhanh chậm khác nhau
+STRIPS_PER_WORKER = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# ========== THREAD POOL ==========
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def get_executor():
+    """Thread pool dùng chung cho mọi xử lý song song theo dải"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=default_workers(),
+                                           thread_name_prefix='image_editing_strip')
+        return _executor
+
+
+def parallel_workers(img_array, workers=None, min_pixels=PARALLEL_MIN_PIXELS):
+    """Số luồng nên dùng cho ảnh này (1 = xử lý tuần tự)"""
+    if workers is None:
+        workers = default_workers()
+    if workers <= 1 or img_array.shape[0] * img_array.shape[1] < min_pixels:
+        return 1
+    return workers
+
+
+# ========== CHIA DẢI ==========
+
+
+def strip_rows_for(img_array, strip_bytes=DEFAULT_STRIP_BYTES, halo=0):
+    """Số hàng của mỗi dải sao cho một dải (kể cả halo) vừa ngân sách strip_bytes"""
+    row_bytes = max(1, img_array[0].nbytes)
+    rows = strip_bytes // row_bytes - 2 * halo
+    # Dải quá mỏng so với halo thì tốn công xử lý lại phần chồng lấn
+    return max(rows, 4 * halo, 16)
+
+
+def iter_strips(height, strip_rows, halo):
+    """Sinh (y0, y1, in0, in1): dải kết quả [y0, y1) và vùng đầu vào [in0, in1) cần đọc"""
+    for y0 in range(0, height, strip_rows):
+        y1 = min(y0 + strip_rows, height)
+        yield y0, y1, max(0, y0 - halo), min(height, y1 + halo)
+
+
+def parallel_strip_rows(img_array, halo, workers):
+    """Số hàng mỗi dải khi chạy song song: đủ dải cho mọi luồng, vẫn trong ngân sách bộ nhớ"""
+    rows = math.ceil(img_array.shape[0] / (workers * STRIPS_PER_WORKER))
+    return min(strip_rows_for(img_array, halo=halo), max(rows, 4 * halo, 16))
+
+
+def map_strips(func, img_array, halo, strip_rows=None, out=None, workers=1, with_rows=False):
+    """Áp dụng func (ảnh -> ảnh cùng kích thước) theo từng dải có halo.
+
+    Kết quả được ghi thẳng vào mảng out (cấp phát một lần) nên bộ nhớ tạm
+    tối đa chỉ bằng một dải cho mỗi luồng. workers > 1 xử lý các dải trên
+    thread pool dùng chung; mỗi dải ghi vào phần riêng của out nên không có đường nối.
+    with_rows=True gọi func(dải, hàng đầu của dải trong ảnh) cho hiệu ứng phụ thuộc vị trí.
+    """
+    height = img_array.shape[0]
+    if strip_rows is None:
+        if workers > 1:
+            strip_rows = parallel_strip_rows(img_array, halo, workers)
+        else:
+            strip_rows = strip_rows_for(img_array, halo=halo)
+    strips = list(iter_strips(height, strip_rows, halo))
+    target = [out]
+    target_lock = threading.Lock()
+
+    def run(strip):
+        y0, y1, in0, in1 = strip
+        if with_rows:
+            strip_result = func(img_array[in0:in1], in0)
+        else:
+            strip_result = func(img_array[in0:in1])
+        # Dải xong đầu tiên cấp phát kết quả (biết kiểu dữ liệu / số kênh)
+        with target_lock:
+            if target[0] is None:
+                target[0] = np.empty(img_array.shape[:2] + strip_result.shape[2:],
+                                     dtype=strip_result.dtype)
+        target[0][y0:y1] = strip_result[y0 - in0:y1 - in0]
+
+    if workers > 1 and len(strips) > 1:
+        # list() để lỗi trong luồng được ném lại ở đây
+        list(get_executor().map(run, strips))
+    else:
+        for strip in strips:
+            run(strip)
+    return target[0]
+
+
+def map_parallel(func, img_array, halo, workers=None, out=None, with_rows=False):
+    """map_strips với số luồng tự chọn theo kích thước ảnh"""
+    return map_strips(func, img_array, halo, out=out,
+                      workers=parallel_workers(img_array, workers), with_rows=with_rows)
+
+
+def should_tile(img_array, threshold=DEFAULT_TILE_THRESHOLD):
+    return img_array.shape[0] * img_array.shape[1] >= threshold
+
+
+def apply_filter_tiled(img_array, filter_name, intensity, strip_rows=None, out=None, workers=1):
+    """Như filters.apply_filter nhưng xử lý theo dải; kết quả giống hệt bản xử lý cả ảnh.
+
+    Bộ lọc phụ thuộc toàn ảnh (halo None) được xử lý một lần trên cả ảnh.
+    """
+    if filters.get_filter(filter_name) is None:
+        return img_array
+    halo = filters.filter_halo(filter_name, intensity)
+    if halo is None:
+        return filters.apply_filter(img_array, filter_name, intensity)
+    return map_strips(lambda strip: filters.apply_filter(strip, filter_name, intensity),
+                      img_array, halo, strip_rows, out, workers)
+
+
+def apply_filter_parallel(img_array, filter_name, intensity, workers=None):
+    """Như filters.apply_filter nhưng chia dải trên nhiều luồng khi ảnh đủ lớn"""
+    workers = parallel_workers(img_array, workers)
+    if workers == 1 and not should_tile(img_array):
+        return filters.apply_filter(img_array, filter_name, intensity)
+    return apply_filter_tiled(img_array, filter_name, intensity, workers=workers)
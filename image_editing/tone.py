@@ -0,0 +1,250 @@
+"""
+Engine chỉnh tone/màu gộp một lượt thay cho chuỗi ImageEnhance của PIL
+
+Brightness và Contrast là ánh xạ 1 chiều trên từng kênh nên được gộp thành một
+bảng LUT; Color là một lần trộn với ảnh xám bằng cv2.addWeighted; Sharpness là
+một kernel 3x3 duy nhất. Từng thao tác riêng lẻ khớp ImageEnhance trong phạm vi
+±1 LSB (Brightness, Contrast khớp chính xác). Khi xếp chồng nhiều thao tác, sai số
+±1 của Color/Sharpness bị các hệ số Contrast/Sharpness phía sau khuếch đại: đo trên
+ảnh mẫu với hệ số trong khoảng thanh trượt (0-2) lệch tối đa 5 mức.
+"""
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance
+
+# Hệ số độ sáng (luma) giống PIL khi chuyển RGB sang "L"
+LUMA_WEIGHTS = np.array([19595, 38470, 7471], dtype=np.float64) / 65536.0
+
+# Kernel ImageFilter.SMOOTH của PIL
+SMOOTH_KERNEL = np.array([[1, 1, 1],
+                          [1, 5, 1],
+                          [1, 1, 1]], dtype=np.float32) / 13.0
+
+_RAMP = np.arange(256, dtype=np.float32)
+
+# Số pixel tối đa được lấy mẫu khi tính độ sáng trung bình cho Contrast
+MEAN_SAMPLES = 1000000
+
+# Độ lệch để cv2 (làm tròn) cho kết quả giống PIL (cắt phần thập phân)
+_TRUNCATE_BIAS = -0.4999
+
+
+def is_supported(img_array):
+    """Engine hỗ trợ ảnh uint8 dạng L, RGB hoặc RGBA"""
+    if img_array.dtype != np.uint8:
+        return False
+    return img_array.ndim == 2 or (img_array.ndim == 3 and img_array.shape[2] in (3, 4))
+
+
+def blend_lut(degenerate, factor):
+    """LUT của Image.blend(degenerate, image, factor) cho một giá trị degenerate cố định"""
+    degenerate = np.float32(degenerate)
+    values = degenerate + np.float32(factor) * (_RAMP - degenerate)
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+
+def brightness_lut(factor):
+    return blend_lut(0, factor)
+
+
+def contrast_lut(mean, factor):
+    return blend_lut(mean, factor)
+
+
+def saturate(img_array, factor, out=None):
+    """ImageEnhance.Color: trộn từng pixel với độ sáng (luma) của chính nó"""
+    channels = color_channels(img_array)
+    if channels == 4:
+        alpha = img_array[:, :, 3].copy()
+        gray = cv2.cvtColor(img_array, cv2.COLOR_RGBA2GRAY)
+        degenerate = cv2.cvtColor(gray, cv2.COLOR_GRAY2RGBA)
+    else:
+        gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+        degenerate = cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
+    result = cv2.addWeighted(img_array, factor, degenerate, 1.0 - factor, _TRUNCATE_BIAS, dst=out)
+    if channels == 4:
+        result[:, :, 3] = alpha
+    return result
+
+
+def color_channels(img_array):
+    return 1 if img_array.ndim == 2 else img_array.shape[2]
+
+
+def mean_sample(image, max_samples=MEAN_SAMPLES):
+    """Lưới pixel đều (mỗi step hàng/cột) dùng để tính giá trị trung bình của ảnh lớn.
+
+    Nhận numpy array hoặc ảnh PIL; với ảnh PIL chỉ các hàng được lấy mẫu mới được
+    chép ra nên không cần chuyển cả ảnh sang numpy.
+    """
+    if isinstance(image, np.ndarray):
+        width, height = image.shape[1], image.shape[0]
+    else:
+        width, height = image.size
+    step = max(1, int(np.ceil(np.sqrt(width * height / max_samples))))
+    if step == 1:
+        return np.asarray(image)
+    if isinstance(image, np.ndarray):
+        return np.ascontiguousarray(image[::step, ::step])
+    rows = [np.asarray(image.crop((0, y, width, y + 1)))[0, ::step]
+            for y in range(0, height, step)]
+    return np.ascontiguousarray(np.stack(rows))
+
+
+def channel_means(img_array, lut=None, max_samples=MEAN_SAMPLES):
+    """Giá trị trung bình từng kênh màu của ảnh sau khi qua LUT (không cần áp dụng LUT).
+
+    Ảnh lớn được lấy mẫu theo lưới đều, đủ chính xác để làm tròn giá trị trung bình
+    dùng cho Contrast.
+    """
+    channels = min(color_channels(img_array), 3)
+    img_array = mean_sample(img_array, max_samples)
+    pixel_count = img_array.shape[0] * img_array.shape[1]
+
+    if lut is None:
+        return np.array(cv2.mean(img_array)[:channels])
+
+    means = []
+    for c in range(channels):
+        hist = cv2.calcHist([img_array], [c], None, [256], [0, 256]).ravel()
+        means.append(float(np.dot(hist, lut[c].astype(np.float64))) / pixel_count)
+    return np.array(means)
+
+
+def luma_mean(means):
+    """Độ sáng trung bình (như ImageStat trên ảnh "L") từ trung bình các kênh"""
+    if len(means) == 1:
+        return float(means[0])
+    return float(np.dot(means, LUMA_WEIGHTS))
+
+
+def _expand_lut(lut, channels):
+    """Mở rộng LUT 1 kênh thành bảng riêng cho từng kênh (kênh alpha giữ nguyên)"""
+    if lut.ndim == 2:
+        return lut
+    table = np.empty((max(channels, 1), 256), dtype=np.uint8)
+    table[:] = lut
+    if channels == 4:
+        table[3] = np.arange(256, dtype=np.uint8)
+    return table
+
+
+def _compose(first, second):
+    """LUT tương đương với áp dụng first rồi second"""
+    if first is None:
+        return second
+    return np.take_along_axis(second, first.astype(np.intp), axis=1)
+
+
+def sharpen(img_array, factor, out=None):
+    """ImageEnhance.Sharpness bằng một lần filter2D với kernel gộp"""
+    kernel = (1.0 - factor) * SMOOTH_KERNEL
+    kernel[1, 1] += factor
+    result = cv2.filter2D(img_array, -1, kernel, dst=out, delta=_TRUNCATE_BIAS,
+                          borderType=cv2.BORDER_REPLICATE)
+    # PIL giữ nguyên viền 1 pixel của ảnh khi lọc 3x3
+    result[0, :] = img_array[0, :]
+    result[-1, :] = img_array[-1, :]
+    result[:, 0] = img_array[:, 0]
+    result[:, -1] = img_array[:, -1]
+    if color_channels(img_array) == 4:
+        result[:, :, 3] = img_array[:, :, 3]
+    return result
+
+
+def apply_tone_ops(img_array, ops, mean_reference=None, out=None):
+    """Áp dụng chuỗi thao tác tone theo thứ tự với số lượt xử lý ảnh ít nhất.
+
+    ops là danh sách (tên, hệ số) với tên thuộc 'brightness', 'color',
+    'contrast', 'sharpness'. Các thao tác LUT liên tiếp được gộp thành một bảng
+    duy nhất; chỉ Color và Sharpness mới cần một lượt riêng.
+
+    mean_reference là ảnh đầy đủ (PIL hoặc array) khi img_array chỉ là một vùng
+    của nó: độ sáng trung bình cho Contrast khi đó được tính trên ảnh đầy đủ để
+    vùng cho kết quả giống hệt phần tương ứng của ảnh xử lý toàn bộ.
+
+    out là mảng cùng kích thước để ghi kết quả (tái sử dụng giữa các lần render).
+    """
+    channels = color_channels(img_array)
+    buffer = img_array
+    owned = False
+    lut = None
+    # Mẫu lưới của ảnh tham chiếu, được áp dụng cùng các thao tác theo từng pixel
+    sample = mean_sample(mean_reference) if mean_reference is not None else None
+
+    def flush(buffer, owned, lut, dst=None):
+        if lut is None:
+            return buffer, owned
+        table = _expand_lut(lut, channels)
+        if channels in (1, 3) and (table == table[0]).all():
+            # Cùng một bảng cho mọi kênh: LUT 1 kênh nhanh hơn nhiều
+            table = table[0]
+        else:
+            table = table.T.reshape(1, 256, channels).copy()
+        if owned:
+            cv2.LUT(buffer, table, dst=buffer)
+            return buffer, True
+        return cv2.LUT(buffer, table, dst=dst), True
+
+    for name, factor in ops:
+        if factor == 1.0:
+            continue
+        if name == 'brightness':
+            lut = _compose(lut, _expand_lut(brightness_lut(factor), channels))
+        elif name == 'contrast':
+            if sample is not None:
+                mean = int(luma_mean(channel_means(sample, lut, max_samples=sample.size)) + 0.5)
+            else:
+                mean = int(luma_mean(channel_means(buffer, lut)) + 0.5)
+            lut = _compose(lut, _expand_lut(contrast_lut(mean, factor), channels))
+        elif name == 'color':
+            if channels == 1:
+                continue
+            buffer, owned = flush(buffer, owned, lut, out)
+            if sample is not None:
+                sample = saturate(flush(sample, False, lut)[0], factor)
+            lut = None
+            buffer = saturate(buffer, factor, out=buffer if owned else out)
+            owned = True
+        elif name == 'sharpness':
+            buffer, owned = flush(buffer, owned, lut, out)
+            if sample is not None:
+                # Kernel làm nét có tổng bằng 1 nên hầu như không đổi giá trị trung bình
+                sample = flush(sample, False, lut)[0]
+            lut = None
+            buffer = sharpen(buffer, factor, out=None if owned else out)
+            owned = True
+        else:
+            raise ValueError(f"Unknown tone operation: {name}")
+
+    buffer, owned = flush(buffer, owned, lut, out)
+    if owned:
+        return buffer
+    if out is not None and out.shape == buffer.shape:
+        np.copyto(out, buffer)
+        return out
+    return buffer.copy()
+
+
+def apply_tone(img_array, brightness=1.0, color=1.0, contrast=1.0, sharpness=1.0):
+    """Tương đương Brightness → Color → Contrast → Sharpness của ImageEnhance"""
+    return apply_tone_ops(img_array, [('brightness', brightness), ('color', color),
+                                      ('contrast', contrast), ('sharpness', sharpness)])
+
+
+def enhance_image(image, ops, mean_reference=None):
+    """Áp dụng chuỗi tone lên ảnh PIL; chế độ màu không hỗ trợ dùng lại ImageEnhance"""
+    if image.mode in ('L', 'RGB', 'RGBA'):
+        return Image.fromarray(apply_tone_ops(np.asarray(image), ops, mean_reference))
+
+    enhancers = {
+        'brightness': ImageEnhance.Brightness,
+        'color': ImageEnhance.Color,
+        'contrast': ImageEnhance.Contrast,
+        'sharpness': ImageEnhance.Sharpness,
+    }
+    result = image
+    for name, factor in ops:
+        if factor != 1.0:
+            result = enhancers[name](result).enhance(factor)
+    return result
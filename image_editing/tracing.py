@@ -0,0 +1,191 @@
+"""
+Ghi vết (tracing) các đoạn xử lý nóng, xuất ra định dạng Chrome trace / Perfetto
+
+Cách dùng:
+    from image_editing import tracing
+
+    with tracing.span('stage/enhance', width=4000):
+        ...
+
+    @tracing.traced('update_images')
+    def update_images(self): ...
+
+Bật bằng tracing.enable() rồi tracing.export('trace.json'), hoặc đặt biến môi
+trường IMAGE_EDITING_TRACE=trace.json để bật từ lúc khởi động và tự xuất khi
+thoát. Mở file bằng chrome://tracing hoặc https://ui.perfetto.dev.
+
+Khi tắt, span() chỉ trả về một đối tượng rỗng dùng chung nên chi phí gần như
+bằng không. Khi bật, mỗi span ghi một sự kiện vào ring buffer có kích thước cố
+định: chỉ số ghi lấy từ itertools.count (nguyên tử trong CPython) nên các
+luồng ghi song song không cần khóa; sự kiện cũ nhất bị ghi đè khi đầy.
+"""
+import atexit
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+DEFAULT_CAPACITY = 65536
+
+# Biến môi trường chứa đường dẫn file trace để bật tracing khi khởi động
+TRACE_ENV = 'IMAGE_EDITING_TRACE'
+
+_enabled = False
+_buffer = None
+_thread_names = {}
+_pid = os.getpid()
+
+
+class TraceBuffer:
+    """Ring buffer các sự kiện (name, ts_us, dur_us, tid, args)"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.events = [None] * capacity
+        self.counter = itertools.count()
+
+    def record(self, event):
+        self.events[next(self.counter) % self.capacity] = event
+
+    def snapshot(self):
+        """Các sự kiện hiện có, theo thời điểm bắt đầu"""
+        events = [event for event in list(self.events) if event is not None]
+        events.sort(key=lambda event: event[1])
+        return events
+
+
+def _now_us():
+    return time.perf_counter_ns() // 1000
+
+
+class _NullSpan:
+    """Span rỗng dùng khi tracing tắt"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = _now_us()
+        buffer = _buffer
+        if buffer is None:
+            return False
+        if exc_type is not None:
+            self.args = dict(self.args or {}, error=exc_type.__name__)
+        thread = threading.current_thread()
+        _thread_names[thread.ident] = thread.name
+        buffer.record((self.name, self.start, end - self.start, thread.ident, self.args))
+        return False
+
+    def set(self, **args):
+        """Thêm thông tin cho span (hiện trong mục args của trace)"""
+        self.args = dict(self.args or {}, **args)
+
+
+# ========== API ==========
+
+def span(name, **args):
+    """Context manager đo một đoạn code"""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, args or None)
+
+
+def traced(name=None):
+    """Decorator đo mỗi lần gọi hàm"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable(capacity=DEFAULT_CAPACITY):
+    global _enabled, _buffer
+    if _buffer is None or _buffer.capacity != capacity:
+        _buffer = TraceBuffer(capacity)
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def clear():
+    global _buffer
+    if _buffer is not None:
+        _buffer = TraceBuffer(_buffer.capacity)
+
+
+def events():
+    """Danh sách sự kiện (name, ts_us, dur_us, tid, args) đã ghi"""
+    return _buffer.snapshot() if _buffer is not None else []
+
+
+# ========== XUẤT FILE ==========
+
+def chrome_trace():
+    """Dict theo định dạng Trace Event của Chrome (Perfetto đọc được trực tiếp)"""
+    trace_events = []
+    for tid, thread_name in list(_thread_names.items()):
+        trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': _pid, 'tid': tid,
+                             'args': {'name': thread_name}})
+    for name, ts, dur, tid, args in events():
+        event = {'name': name, 'cat': name.split('/', 1)[0], 'ph': 'X',
+                 'ts': ts, 'dur': dur, 'pid': _pid, 'tid': tid}
+        if args:
+            event['args'] = {key: value if isinstance(value, (int, float, str, bool)) else str(value)
+                             for key, value in args.items()}
+        trace_events.append(event)
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+
+def export(path):
+    """Ghi trace ra file JSON, trả về số sự kiện đã ghi"""
+    trace = chrome_trace()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f)
+    return sum(1 for event in trace['traceEvents'] if event['ph'] == 'X')
+
+
+def _configure_from_env():
+    path = os.environ.get(TRACE_ENV)
+    if not path:
+        return
+    enable()
+    atexit.register(export, path)
+
+
+_configure_from_env()
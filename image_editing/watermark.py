@@ -0,0 +1,154 @@
+"""
+Đóng dấu watermark chữ hoặc ảnh (không phụ thuộc Tkinter)
+
+params có dạng giống hộp thoại watermark của giao diện: 'type' ("text" hoặc
+"image"), 'position', 'color', 'opacity', và 'text'/'font_size' cho chữ hoặc
+'image_path'/'scale'/'image_opacity' cho ảnh.
+"""
+from PIL import Image, ImageDraw, ImageFont
+
+# Các vị trí đặt watermark hỗ trợ
+POSITIONS = ("top-left", "top-center", "top-right", "middle-left", "center", "middle-right",
+             "bottom-left", "bottom-center", "bottom-right", "tiled", "diagonal")
+
+
+def apply_watermark(image, params):
+    """Áp dụng watermark lên ảnh"""
+    if params['type'] == "text":
+        return apply_text_watermark(image, params)
+    else:
+        return apply_image_watermark(image, params)
+
+
+def load_font(font_size):
+    """Font cho watermark chữ: Arial, DejaVuSans hoặc font mặc định của PIL"""
+    for name in ("arial.ttf", "DejaVuSans.ttf"):
+        try:
+            return ImageFont.truetype(name, font_size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def apply_text_watermark(image, params):
+    """Áp dụng text watermark"""
+    # Tạo bản copy
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+
+    overlay = Image.new('RGBA', image.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+
+    # Tìm font
+    font = load_font(params['font_size'])
+
+    # Tính toán text size
+    text_bbox = draw.textbbox((0, 0), params['text'], font=font)
+    text_width = text_bbox[2] - text_bbox[0]
+    text_height = text_bbox[3] - text_bbox[1]
+
+    # Tính toán vị trí
+    positions = calculate_position(image.size, (text_width, text_height), params['position'])
+
+    # Chuyển hex color sang RGBA với opacity
+    hex_color = params['color'].lstrip('#')
+    rgb = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+    rgba = rgb + (int(255 * params['opacity']),)
+
+    # Vẽ text ở tất cả vị trí
+    for pos in positions:
+        draw.text(pos, params['text'], font=font, fill=rgba)
+
+    # Composite với ảnh gốc
+    return Image.alpha_composite(image, overlay)
+
+
+def apply_image_watermark(image, params, watermark=None):
+    """Áp dụng image watermark; watermark là ảnh PIL, mặc định mở từ params['image_path']"""
+    if watermark is None:
+        if not params.get('image_path'):
+            return image
+        # Mở watermark image
+        watermark = Image.open(params['image_path'])
+
+    # Convert to RGBA nếu cần (luôn là bản sao vì thumbnail sửa tại chỗ)
+    if watermark.mode != 'RGBA':
+        watermark = watermark.convert('RGBA')
+    else:
+        watermark = watermark.copy()
+
+    # Scale watermark
+    scale = params.get('scale', 0.5)
+    new_width = int(image.width * scale)
+    new_height = int(image.height * scale)
+    watermark.thumbnail((new_width, new_height), Image.Resampling.LANCZOS)
+
+    # Apply opacity
+    if params.get('image_opacity', 1.0) < 1.0:
+        alpha = watermark.split()[3]
+        alpha = alpha.point(lambda p: p * params['image_opacity'])
+        watermark.putalpha(alpha)
+
+    # Tính toán vị trí
+    positions = calculate_position(image.size, watermark.size, params['position'])
+
+    # Tạo overlay
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+
+    overlay = Image.new('RGBA', image.size, (0, 0, 0, 0))
+
+    # Paste watermark vào các vị trí
+    for pos in positions:
+        overlay.paste(watermark, pos, watermark)
+
+    # Composite với ảnh gốc
+    return Image.alpha_composite(image, overlay)
+
+
+def calculate_position(image_size, watermark_size, position):
+    """Tính toán vị trí đặt watermark"""
+    img_width, img_height = image_size
+    wm_width, wm_height = watermark_size
+
+    positions = []
+
+    if position == "top-right":
+        positions.append((img_width - wm_width - 10, 10))
+    elif position == "top-center":
+        positions.append(((img_width - wm_width) // 2, 10))
+    elif position == "top-left":
+        positions.append((10, 10))
+    elif position == "middle-left":
+        positions.append((10, (img_height - wm_height) // 2))
+    elif position == "center":
+        positions.append(((img_width - wm_width) // 2,
+                          (img_height - wm_height) // 2))
+    elif position == "middle-right":
+        positions.append((img_width - wm_width - 10,
+                          (img_height - wm_height) // 2))
+    elif position == "bottom-left":
+        positions.append((10, img_height - wm_height - 10))
+    elif position == "bottom-center":
+        positions.append(((img_width - wm_width) // 2,
+                          img_height - wm_height - 10))
+    elif position == "bottom-right":
+        positions.append((img_width - wm_width - 10,
+                          img_height - wm_height - 10))
+    elif position == "tiled":
+        # Tiled pattern
+        spacing_x = wm_width + 20
+        spacing_y = wm_height + 20
+        for x in range(0, img_width, spacing_x):
+            for y in range(0, img_height, spacing_y):
+                positions.append((x, y))
+    elif position == "diagonal":
+        # Diagonal pattern
+        spacing = max(wm_width, wm_height) + 50
+        for i in range(0, max(img_width, img_height) * 2, spacing):
+            x = i - wm_width
+            y = i - wm_height
+            if x < img_width and y < img_height:
+                positions.append((x, y))
+
+    return positions
@@ -0,0 +1,31 @@
+"""
+Kiểm tra đường xử lý khung webcam (chạy: python -m pytest tests)
+"""
+import numpy as np
+import pytest
+
+from image_editing import capture
+
+
+def _frame(seed):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('filter_name', ["Đen Trắng", "Viền", "Chi Tiết", "Tăng Cạnh", "Làm Nổi"])
+@pytest.mark.parametrize('scale', [1.0, 0.5])
+def test_reused_buffers_render_each_frame(filter_name, scale):
+    """Khung thứ hai qua cùng FrameBuffers phải giống render từ đầu, không dùng lại gray/Laplacian cũ"""
+    chain = ((filter_name, 1.0),)
+    first = _frame(0)
+    second = 255 - first
+
+    buffers = capture.FrameBuffers()
+    capture.render_frame(capture.to_rgb(first, buffers), 160, 120, chain, buffers, scale)
+    reused = capture.render_frame(capture.to_rgb(second, buffers), 160, 120, chain, buffers,
+                                  scale).copy()
+
+    fresh_buffers = capture.FrameBuffers()
+    fresh = capture.render_frame(capture.to_rgb(second, fresh_buffers), 160, 120, chain,
+                                 fresh_buffers, scale)
+    np.testing.assert_array_equal(reused, fresh)